@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from src.dspy_graph_rag.logging_utils import setup_logger
+
+logger = setup_logger('answer_cache')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    id INTEGER PRIMARY KEY,
+    context_hash TEXT NOT NULL,
+    question TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    fields TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS answers_context_hash ON answers (context_hash);
+CREATE INDEX IF NOT EXISTS answers_last_used_at ON answers (last_used_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def context_hash(context):
+    """Hash of the set of passage texts, independent of their order."""
+    digest = hashlib.sha256()
+    for text in sorted({passage["text"] for passage in context}):
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+class SemanticAnswerCache:
+    """
+    SQLite-backed cache of generated answers, shared across process restarts.
+
+    An entry is reused for a new question when it was generated from the same
+    set of context passages and its question embedding has a cosine similarity
+    of at least `similarity_threshold` with the new one. Entries older than
+    `max_age` seconds are ignored and purged, the least recently used entries
+    are evicted beyond `max_entries`, and the whole cache is dropped when it
+    is consulted with a different graph version or embedder.
+    """
+
+    def __init__(self, path, embedder, similarity_threshold=0.92, max_entries=10000, max_age=7 * 24 * 3600.0):
+        logger.info(f"Initializing SemanticAnswerCache at {path} with threshold={similarity_threshold}, "
+                    f"max_entries={max_entries}, max_age={max_age}s")
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._path = path
+        self._embedder = embedder
+        self._similarity_threshold = similarity_threshold
+        self._max_entries = max_entries
+        self._max_age = max_age
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+        with self._lock, self._conn:
+            self._check_meta("embedder", embedder.name)
+
+    # --- Internal helpers (caller must hold the lock) ---
+
+    def _check_meta(self, key, value):
+        """Drops every entry if the stored meta value differs from `value`, then records it."""
+        value = json.dumps(value)
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        if row is not None and row[0] == value:
+            return
+        if row is not None:
+            dropped = self._conn.execute("DELETE FROM answers").rowcount
+            if dropped:
+                logger.info(f"Answer cache {key} changed ({row[0]} -> {value}), dropped {dropped} entries")
+                self._invalidations += 1
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _embed(self, question):
+        return np.asarray(self._embedder.embed([question])[0], dtype=np.float32)
+
+    # --- Public API ---
+
+    def get(self, question, context, graph_version=None):
+        """
+        Looks up an answer for a similar question over the same context.
+
+        Returns:
+            dict: The cached prediction fields, or None on a miss
+        """
+        embedding = self._embed(question)
+        key = context_hash(context)
+        now = time.time()
+        with self._lock, self._conn:
+            self._check_meta("graph_version", graph_version)
+            rows = self._conn.execute(
+                "SELECT id, embedding, fields FROM answers WHERE context_hash = ? AND created_at >= ?",
+                (key, now - self._max_age)
+            ).fetchall()
+            if not rows:
+                self._misses += 1
+                return None
+            vectors = np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+            norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(embedding) or 1.0)
+            norms[norms == 0] = 1.0
+            similarities = (vectors @ embedding) / norms
+            best = int(np.argmax(similarities))
+            if similarities[best] < self._similarity_threshold:
+                self._misses += 1
+                logger.debug(f"Closest cached question has similarity {similarities[best]:.3f}, below threshold")
+                return None
+            self._conn.execute(
+                "UPDATE answers SET last_used_at = ?, hits = hits + 1 WHERE id = ?", (now, rows[best][0])
+            )
+            self._hits += 1
+            logger.info(f"Answer cache hit (similarity {similarities[best]:.3f})")
+            return json.loads(rows[best][2])
+
+    def put(self, question, context, fields, graph_version=None):
+        """
+        Stores the prediction fields generated for the question and context.
+
+        Args:
+            question (str): The question
+            context (list[dict]): Passages the answer was generated from
+            fields (dict): JSON-serializable prediction fields, e.g. reasoning and answer
+            graph_version (int, optional): Graph version the context was retrieved at
+        """
+        embedding = self._embed(question)
+        now = time.time()
+        with self._lock, self._conn:
+            self._check_meta("graph_version", graph_version)
+            self._conn.execute(
+                "INSERT INTO answers (context_hash, question, embedding, fields, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (context_hash(context), question, embedding.tobytes(), json.dumps(fields), now, now)
+            )
+            self._evict(now)
+
+    def _evict(self, now):
+        # Caller must hold the lock
+        expired = self._conn.execute("DELETE FROM answers WHERE created_at < ?", (now - self._max_age,)).rowcount
+        overflow = self._conn.execute(
+            "DELETE FROM answers WHERE id IN ("
+            "SELECT id FROM answers ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)",
+            (self._max_entries,)
+        ).rowcount
+        self._evictions += expired + overflow
+        if expired or overflow:
+            logger.debug(f"Answer cache evicted {expired} expired and {overflow} least recently used entries")
+
+    def clear(self):
+        """Drops every cached answer."""
+        with self._lock, self._conn:
+            if self._conn.execute("DELETE FROM answers").rowcount:
+                self._invalidations += 1
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def stats(self):
+        """
+        Returns the cache counters for this process.
+
+        Returns:
+            dict: hits, misses, evictions, invalidations, size, max_entries and hit_rate
+        """
+        with self._lock:
+            size = self._conn.execute("SELECT count(*) FROM answers").fetchone()[0]
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+                "size": size,
+                "max_entries": self._max_entries,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+            }
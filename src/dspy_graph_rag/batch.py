@@ -0,0 +1,145 @@
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from src.dspy_graph_rag.logging_utils import setup_logger
+
+logger = setup_logger('batch')
+
+class TokenBucket:
+    """
+    Asyncio token-bucket rate limiter.
+
+    Tokens are added at `rate` per second up to `capacity`; acquire() waits
+    until enough tokens are available. Callers are served in arrival order.
+    """
+
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self._rate = rate
+        self._capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self._capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens=1):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate)
+                self._updated_at = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self._rate)
+
+def read_questions(stream):
+    """
+    Parses JSONL questions.
+
+    Each line is an object with a "question" key (other keys, such as an id,
+    are echoed into the result) or a bare JSON string. Blank lines are skipped.
+
+    Yields:
+        dict: The parsed record, or one with an "error" key for invalid lines
+    """
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield {"line": line_number, "error": f"Invalid JSON: {e}"}
+            continue
+        if isinstance(record, str):
+            record = {"question": record}
+        if not isinstance(record, dict) or not isinstance(record.get("question"), str):
+            yield {"line": line_number, "error": "Expected an object with a 'question' string"}
+            continue
+        yield record
+
+async def answer_questions(program, records, output, concurrency=8, rate=None):
+    """
+    Answers questions concurrently and writes JSONL results as they complete.
+
+    Args:
+        program: dspy.Module whose acall(question) returns a prediction with `answer`
+        records (iterable): Records from read_questions; read lazily, so stdin
+            can be streamed
+        output: Text stream the results are written to, one JSON object per line
+        concurrency (int): Maximum questions in flight
+        rate (float, optional): Maximum questions started per second
+
+    Returns:
+        dict: Throughput summary; "questions" counts the questions asked and
+            "errors" those that failed, invalid input lines are counted
+            separately as "invalid"
+    """
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    bucket = TokenBucket(rate) if rate else None
+    latencies = []
+    errors = 0
+    invalid = 0
+    started = time.monotonic()
+
+    def write(result):
+        output.write(json.dumps(result, ensure_ascii=False) + "\n")
+        output.flush()
+
+    async def produce():
+        iterator = iter(records)
+        while True:
+            # Reading may block (e.g. on stdin), keep it off the event loop
+            record = await asyncio.to_thread(next, iterator, None)
+            if record is None:
+                break
+            await queue.put(record)
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def work():
+        nonlocal errors, invalid
+        while True:
+            record = await queue.get()
+            if record is None:
+                return
+            if "error" in record:
+                invalid += 1
+                write(record)
+                continue
+            if bucket is not None:
+                await bucket.acquire()
+            request_started = time.monotonic()
+            result = dict(record)
+            try:
+                prediction = await program.acall(record["question"])
+                result["answer"] = prediction.answer
+            except Exception as e:
+                logger.error(f"Failed to answer {record['question']!r}: {e}")
+                result["error"] = str(e)
+                errors += 1
+            latency = time.monotonic() - request_started
+            result["latency_ms"] = round(latency * 1000, 1)
+            latencies.append(latency)
+            write(result)
+
+    logger.info(f"Answering questions with concurrency={concurrency}, rate={rate or 'unlimited'}/s")
+    await asyncio.gather(produce(), *(work() for _ in range(concurrency)))
+
+    elapsed = time.monotonic() - started
+    summary = {
+        "questions": len(latencies),
+        "errors": errors,
+        "invalid": invalid,
+        "elapsed_s": round(elapsed, 3),
+        "questions_per_s": round(len(latencies) / elapsed, 3) if elapsed > 0 else 0.0,
+    }
+    if latencies:
+        p50, p95, p99 = (round(float(p), 1) for p in np.percentile(np.asarray(latencies) * 1000, [50, 95, 99]))
+        summary.update(latency_p50_ms=p50, latency_p95_ms=p95, latency_p99_ms=p99)
+    logger.info(f"Batch complete: {summary}")
+    return summary
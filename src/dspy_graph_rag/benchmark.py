@@ -0,0 +1,391 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import dspy
+import numpy as np
+from dotenv import load_dotenv
+
+from src.dspy_graph_rag.data_loader import (
+    bump_graph_version, create_fulltext_index, refresh_passages, reset_graph, store_concept_embeddings
+)
+from src.dspy_graph_rag.embeddings import get_embedder
+from src.dspy_graph_rag.inverted_index import InvertedIndex
+from src.dspy_graph_rag.logging_utils import setup_logger
+from src.dspy_graph_rag.rag_pipeline import RETRIEVAL_MODES, GraphRAG, Neo4jRetriever, get_neo4j_driver
+from src.dspy_graph_rag.schema import ensure_constraints
+from src.dspy_graph_rag.snapshot import SnapshotRetriever, export_snapshot
+from src.dspy_graph_rag.tracing import Tracer
+
+logger = setup_logger('benchmark')
+
+# Retrieval modes benchmarked by default: every Neo4jRetriever mode plus the snapshot retriever
+BENCHMARK_MODES = RETRIEVAL_MODES + ("snapshot",)
+
+# Domain vocabulary, most frequent first; sampled with a Zipf distribution
+VOCABULARY = """
+the retrieval model prompt module graph query context language system data pipeline optimization
+answer DSPy RAG vector index search knowledge signature program embedding evaluation metric training
+example teleprompter chain thought reasoning predictor retriever passage document token latency
+cache score ranking node relationship concept compiler few-shot demonstration instruction tuning
+generation completion memory throughput batch stream schema constraint fallback hybrid fulltext
+lexical semantic similarity cosine neighborhood traversal path entity attribute label property
+transaction session driver cluster shard replica benchmark baseline regression accuracy recall
+precision assertion constraint module composition modular maintenance debugging transparency
+adapter format parser output input field validation pipeline orchestration agent tool planning
+decomposition subquery merge fusion rerank filter aggregate summary abstraction interface framework
+""".split()
+
+# Relationship types in the sample graph with how often they appear relative to each other
+RELATIONSHIP_TYPES = {
+    "PROVIDES": 3, "IMPLEMENTS": 3, "DIFFERS_FROM": 1, "IMPROVES_UPON": 1, "USES": 4, "ENABLES": 3,
+    "INCLUDES": 2, "EXTENDS": 2, "IMPROVES": 2, "AFFECTS": 1, "FACILITATES": 1,
+}
+
+# --- Synthetic graph ---
+
+def parse_size(value):
+    """Parses node counts such as "1000", "1k", "100k" or "1m"."""
+    value = value.strip().lower()
+    multiplier = {"k": 1000, "m": 1000000}.get(value[-1:], 1)
+    return int(float(value.rstrip("km")) * multiplier)
+
+def generate_graph(num_nodes, seed=0, mean_degree=4.0, degree_exponent=2.5, median_words=20):
+    """
+    Generates a synthetic Concept graph.
+
+    Text lengths follow a log-normal distribution around `median_words`
+    (the sample concepts have 15-25 words) and words a Zipf distribution over
+    VOCABULARY. Relationships come from a Chung-Lu model whose expected
+    degrees follow a power law with `degree_exponent`, giving the few hubs
+    and long tail of real knowledge graphs.
+
+    Returns:
+        tuple: (concepts as [(name, text)], relationships as [(source, type, target)])
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = np.asarray(VOCABULARY)
+    word_weights = 1.0 / np.arange(1, len(vocabulary) + 1) ** 1.1
+    word_weights /= word_weights.sum()
+
+    name_words = rng.choice(len(vocabulary), size=(num_nodes, 2), p=word_weights)
+    names = [
+        f"{vocabulary[a].title()} {vocabulary[b].title()} {i}" for i, (a, b) in enumerate(name_words)
+    ]
+    lengths = np.clip(rng.lognormal(np.log(median_words), 0.5, size=num_nodes).astype(np.int64), 5, 200)
+    words = rng.choice(len(vocabulary), size=int(lengths.sum()), p=word_weights)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    concepts = []
+    for i, name in enumerate(names):
+        text = " ".join(vocabulary[words[offsets[i]:offsets[i + 1]]])
+        concepts.append((name, text[0].upper() + text[1:] + "."))
+
+    weights = (np.arange(1, num_nodes + 1)) ** (-1.0 / (degree_exponent - 1))
+    rng.shuffle(weights)
+    weights /= weights.sum()
+    num_edges = int(num_nodes * mean_degree / 2)
+    sources = rng.choice(num_nodes, size=num_edges, p=weights)
+    targets = rng.choice(num_nodes, size=num_edges, p=weights)
+    keep = sources != targets
+    pairs = np.unique(np.stack([sources[keep], targets[keep]], axis=1), axis=0)
+    type_names = list(RELATIONSHIP_TYPES)
+    type_weights = np.asarray(list(RELATIONSHIP_TYPES.values()), dtype=np.float64)
+    types = rng.choice(len(type_names), size=len(pairs), p=type_weights / type_weights.sum())
+    relationships = [(names[s], type_names[t], names[d]) for (s, d), t in zip(pairs, types)]
+    logger.info(f"Generated {num_nodes} concepts and {len(relationships)} relationships (seed {seed})")
+    return concepts, relationships
+
+def generate_queries(concepts, num_queries, seed=0):
+    """
+    Generates benchmark questions about the synthetic concepts.
+
+    The mix covers definition and comparison questions that hit the primary
+    match, phrase lookups, and questions with no match that exercise the
+    fallback path.
+    """
+    rng = np.random.default_rng(seed + 1)
+    queries = []
+    for kind in rng.choice(4, size=num_queries, p=[0.4, 0.3, 0.2, 0.1]):
+        name, text = concepts[rng.integers(len(concepts))]
+        if kind == 0:
+            queries.append(f"What is {name}?")
+        elif kind == 1:
+            other = concepts[rng.integers(len(concepts))][0]
+            queries.append(f"How does {name} differ from {other}?")
+        elif kind == 2:
+            words = text.rstrip(".").split()
+            start = rng.integers(max(1, len(words) - 3))
+            queries.append(f"What are {' '.join(words[start:start + 3])}?")
+        else:
+            queries.append(f"What is the zyxwv {rng.integers(1000000)} qwerty?")
+    return queries
+
+def load_graph(driver, concepts, relationships, batch_size=10000):
+    """Replaces the Concept graph with the given concepts and relationships."""
+    with driver.session() as session:
+        logger.info("Clearing existing concepts")
+        reset_graph(session, batch_size=batch_size, label="Concept")
+        ensure_constraints(session)
+        for start in range(0, len(concepts), batch_size):
+            rows = [{"name": name, "text": text} for name, text in concepts[start:start + batch_size]]
+            session.run("UNWIND $rows AS row CREATE (:Concept {name: row.name, text: row.text})", {"rows": rows})
+        logger.info(f"Created {len(concepts)} concepts")
+        by_type = {}
+        for source, rel_type, target in relationships:
+            by_type.setdefault(rel_type, []).append({"source": source, "target": target})
+        for rel_type, rows in by_type.items():
+            for start in range(0, len(rows), batch_size):
+                # Relationship types cannot be parameters; they come from RELATIONSHIP_TYPES
+                session.run(
+                    "UNWIND $rows AS row "
+                    "MATCH (a:Concept {name: row.source}) MATCH (b:Concept {name: row.target}) "
+                    f"CREATE (a)-[:{rel_type}]->(b)",
+                    {"rows": rows[start:start + batch_size]}
+                )
+        logger.info(f"Created {len(relationships)} relationships")
+
+# --- Measurement ---
+
+def current_rss_mb():
+    """Resident set size of this process in MiB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KiB elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def stub_lm():
+    """An LM that answers instantly, so only the pipeline around the LM call is measured."""
+    return dspy.utils.DummyLM(itertools.repeat({"reasoning": "Benchmark.", "answer": "Benchmark answer."}))
+
+def build_retriever(driver, mode, k, embedder, snapshot_dir, tracer):
+    if mode == "snapshot":
+        return SnapshotRetriever(snapshot_dir, k=k)
+    inverted_index = InvertedIndex.build(driver) if mode == "inverted" else None
+    return Neo4jRetriever(
+        driver, k=k, mode=mode, embedder=embedder if mode in ("vector", "hybrid") else None,
+        inverted_index=inverted_index, tracer=tracer
+    )
+
+def benchmark_mode(driver, mode, queries, k=3, embedder=None, snapshot_dir=None, warmup=20):
+    """
+    Answers every query with a stub LM and measures one retrieval mode.
+
+    Returns:
+        dict: Latency percentiles (retrieval and end to end), queries per
+            second, memory and the per-stage latency breakdown
+    """
+    logger.info(f"Benchmarking retrieval mode '{mode}' over {len(queries)} queries")
+    rss_before = current_rss_mb()
+    tracer = Tracer(max_spans=0)
+    started = time.perf_counter()
+    retriever = build_retriever(driver, mode, k, embedder, snapshot_dir, tracer)
+    build_s = time.perf_counter() - started
+    rag = GraphRAG(neo4j_driver=driver, k=k, retriever=retriever, tracer=tracer)
+
+    with dspy.context(lm=stub_lm()):
+        for query in queries[:warmup]:
+            rag(query)
+        tracer.reset()
+        started = time.perf_counter()
+        for query in queries:
+            rag(query)
+        elapsed = time.perf_counter() - started
+
+    histograms = tracer.histograms()
+    retrieval = histograms["retrieve"]
+    end_to_end = histograms["graphrag"]
+    return {
+        "mode": mode,
+        "queries": len(queries),
+        "build_s": round(build_s, 3),
+        "elapsed_s": round(elapsed, 3),
+        "qps": round(len(queries) / elapsed, 2) if elapsed > 0 else 0.0,
+        "retrieval_p50_ms": round(retrieval.percentile(50) / 1000, 3),
+        "retrieval_p95_ms": round(retrieval.percentile(95) / 1000, 3),
+        "retrieval_p99_ms": round(retrieval.percentile(99) / 1000, 3),
+        "end_to_end_p50_ms": round(end_to_end.percentile(50) / 1000, 3),
+        "end_to_end_p95_ms": round(end_to_end.percentile(95) / 1000, 3),
+        "end_to_end_p99_ms": round(end_to_end.percentile(99) / 1000, 3),
+        "rss_mb": round(current_rss_mb(), 1),
+        "rss_delta_mb": round(current_rss_mb() - rss_before, 1),
+        "stages": tracer.to_json(),
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run_benchmark(driver, sizes, modes=BENCHMARK_MODES, num_queries=500, seed=0, k=3, embedder_spec="hashing",
+                  output_dir="output/benchmarks", load=True):
+    """
+    Runs the benchmark for every graph size and retrieval mode.
+
+    Results are written as one JSON file per run (with run metadata and the
+    per-stage breakdown) and appended to results.csv, one row per size and
+    mode, so runs on different commits can be compared.
+
+    Returns:
+        dict: The run results
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    embedder = get_embedder(embedder_spec) if embedder_spec else None
+    run = {
+        "commit": git_commit(),
+        "started_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "k": k,
+        "embedder": embedder.name if embedder else None,
+        "results": [],
+    }
+    for size in sizes:
+        concepts, relationships = generate_graph(size, seed=seed)
+        queries = generate_queries(concepts, num_queries, seed=seed)
+        if load:
+            load_graph(driver, concepts, relationships)
+            with driver.session() as session:
+                create_fulltext_index(session)
+                if embedder is not None:
+                    store_concept_embeddings(session, embedder)
+                refresh_passages(session)
+                bump_graph_version(session)
+        del concepts, relationships
+        with tempfile.TemporaryDirectory() as snapshot_dir:
+            if "snapshot" in modes:
+                export_snapshot(driver, snapshot_dir)
+            for mode in modes:
+                if mode == "vector" and embedder is None:
+                    logger.warning("Skipping 'vector' mode: no embedder")
+                    continue
+                result = benchmark_mode(driver, mode, queries, k=k, embedder=embedder, snapshot_dir=snapshot_dir)
+                result["nodes"] = size
+                run["results"].append(result)
+                logger.info(f"{size} nodes, {mode}: p50={result['retrieval_p50_ms']}ms "
+                            f"p95={result['retrieval_p95_ms']}ms p99={result['retrieval_p99_ms']}ms "
+                            f"qps={result['qps']} rss={result['rss_mb']}MiB")
+
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    json_path = os.path.join(output_dir, f"benchmark_{stamp}_{run['commit']}.json")
+    with open(json_path, "w") as f:
+        json.dump(run, f, indent=2)
+    csv_path = os.path.join(output_dir, "results.csv")
+    columns = ["commit", "started_at", "nodes", "mode", "queries", "build_s", "qps", "retrieval_p50_ms",
+               "retrieval_p95_ms", "retrieval_p99_ms", "end_to_end_p50_ms", "end_to_end_p95_ms",
+               "end_to_end_p99_ms", "rss_mb", "rss_delta_mb"]
+    new_file = not os.path.exists(csv_path)
+    with open(csv_path, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+        if new_file:
+            writer.writeheader()
+        for result in run["results"]:
+            writer.writerow({**result, "commit": run["commit"], "started_at": run["started_at"]})
+    logger.info(f"Benchmark results written to {json_path} and {csv_path}")
+    return run
+
+def compare_runs(baseline, current, tolerance=0.1):
+    """
+    Compares two benchmark runs.
+
+    Returns:
+        list[str]: Descriptions of (nodes, mode) pairs whose retrieval p95
+            grew or QPS dropped by more than `tolerance`
+    """
+    baseline_results = {(r["nodes"], r["mode"]): r for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        before = baseline_results.get((result["nodes"], result["mode"]))
+        if before is None:
+            continue
+        label = f"{result['nodes']} nodes, {result['mode']}"
+        if before["retrieval_p95_ms"] and result["retrieval_p95_ms"] > before["retrieval_p95_ms"] * (1 + tolerance):
+            regressions.append(f"{label}: retrieval p95 {before['retrieval_p95_ms']}ms -> {result['retrieval_p95_ms']}ms")
+        if before["qps"] and result["qps"] < before["qps"] * (1 - tolerance):
+            regressions.append(f"{label}: qps {before['qps']} -> {result['qps']}")
+    return regressions
+
+def main(sizes, modes, num_queries, seed, output_dir, load, baseline_path=None):
+    """Connects to Neo4j, runs the benchmark and optionally compares it with a baseline run."""
+    load_dotenv()
+    try:
+        driver = get_neo4j_driver()
+    except Exception as e:
+        logger.error(f"Failed to connect to Neo4j: {e}")
+        return 1
+    try:
+        run = run_benchmark(driver, sizes, modes, num_queries=num_queries, seed=seed, output_dir=output_dir, load=load)
+    finally:
+        driver.close()
+        logger.info("Neo4j connection closed")
+    if baseline_path:
+        with open(baseline_path) as f:
+            regressions = compare_runs(json.load(f), run)
+        for regression in regressions:
+            logger.warning(f"Regression: {regression}")
+        if regressions:
+            return 1
+        logger.info("No regressions against baseline")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark GraphRAG retrieval on synthetic Concept graphs.")
+    parser.add_argument(
+        "--sizes",
+        type=str,
+        default="1k",
+        help="Comma-separated graph sizes, e.g. '1k,100k,1m'."
+    )
+    parser.add_argument(
+        "--modes",
+        type=str,
+        default=",".join(BENCHMARK_MODES),
+        help="Comma-separated retrieval modes to benchmark."
+    )
+    parser.add_argument("--queries", type=int, default=500, help="Queries per size and mode.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the graph and query generators.")
+    parser.add_argument("-o", "--output", type=str, default="output/benchmarks", help="Directory for result files.")
+    parser.add_argument(
+        "--no-load",
+        action="store_true",
+        help="Benchmark the graph already in the database (generated earlier with the same size and seed)."
+    )
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        default=None,
+        help="Benchmark JSON from an earlier run; exit non-zero if retrieval p95 or QPS regressed by more than 10%%."
+    )
+    parser.add_argument(
+        "--yes",
+        action="store_true",
+        help="Confirm that the benchmark may replace the Concept graph in the configured database."
+    )
+    args = parser.parse_args()
+
+    if not args.yes and not args.no_load:
+        parser.error("the benchmark replaces the Concept graph in the configured database; pass --yes to confirm")
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = set(modes) - set(BENCHMARK_MODES)
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(sorted(unknown))}")
+    sys.exit(main([parse_size(size) for size in args.sizes.split(",")], modes, args.queries, args.seed,
+                  args.output, not args.no_load, args.baseline))
@@ -0,0 +1,568 @@
+import argparse
+import csv
+import gzip
+import json
+import random
+import re
+import sys
+import threading
+import time
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from neo4j.exceptions import DriverError, Neo4jError
+
+from src.dspy_graph_rag.data_loader import (
+    RELATED_TYPES, bump_graph_version, content_hash, create_fulltext_index, refresh_passages,
+    refresh_passages_for_relationships, store_concept_embeddings
+)
+from src.dspy_graph_rag.embeddings import get_embedder
+from src.dspy_graph_rag.logging_utils import setup_logger
+from src.dspy_graph_rag.rag_pipeline import get_neo4j_driver
+from src.dspy_graph_rag.schema import ensure_constraints
+
+logger = setup_logger('bulk_loader')
+
+# --- Input model ---
+
+Concept = namedtuple("Concept", ["name", "text"])
+Relationship = namedtuple("Relationship", ["source", "type", "target"])
+
+# Relationship types are interpolated into Cypher (they cannot be parameters)
+RELATIONSHIP_TYPE_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+def _open_text(path):
+    if path == "-":
+        return sys.stdin
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+def _read_records(path):
+    """Yields dicts from a JSONL or CSV file (optionally gzipped), chosen by extension."""
+    base = path[:-3] if path.endswith(".gz") else path
+    stream = _open_text(path)
+    try:
+        if base.endswith(".csv"):
+            yield from csv.DictReader(stream)
+            return
+        for line_number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_number}: invalid JSON: {e}") from None
+            if not isinstance(record, dict):
+                raise ValueError(f"{path}:{line_number}: expected a JSON object")
+            yield record
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+def read_concepts(path):
+    """
+    Streams concepts from JSONL ({"name", "text"} per line) or CSV (name,text header).
+
+    Yields:
+        Concept
+    """
+    for record in _read_records(path):
+        name = record.get("name")
+        if not name:
+            raise ValueError(f"{path}: concept without a name: {record}")
+        yield Concept(str(name), str(record.get("text") or ""))
+
+def read_relationships(path):
+    """
+    Streams relationships from JSONL ({"source", "type", "target"} per line) or CSV (same header).
+
+    Yields:
+        Relationship
+    """
+    for record in _read_records(path):
+        source, rel_type, target = record.get("source"), record.get("type"), record.get("target")
+        if not source or not target:
+            raise ValueError(f"{path}: relationship without a source or target: {record}")
+        if not rel_type or not RELATIONSHIP_TYPE_PATTERN.match(rel_type):
+            raise ValueError(f"{path}: invalid relationship type {rel_type!r}")
+        yield Relationship(str(source), rel_type, str(target))
+
+def concept_hash(concept):
+    return content_hash(concept.name, concept.text)
+
+def relationship_hash(relationship):
+    # A relationship has no properties of its own, so its hash identifies it
+    return content_hash(relationship.source, relationship.type, relationship.target)
+
+def batched(iterable, size):
+    """Yields lists of up to `size` items without materializing the iterable."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# --- Writing ---
+
+WRITE_CONCEPTS = """
+UNWIND $rows AS row
+MERGE (c:Concept {name: row.name})
+SET c.text = row.text, c.content_hash = row.hash, c.passage = null
+RETURN count(*) AS written
+"""
+
+DELETE_CONCEPTS = """
+UNWIND $rows AS row
+MATCH (c:Concept {name: row.name})
+DETACH DELETE c
+RETURN count(*) AS written
+"""
+
+STORED_CONCEPT_HASHES = "MATCH (c:Concept) RETURN c.name AS name, c.content_hash AS hash"
+
+# Concepts whose passage names one of $names, other than those concepts themselves
+RELATED_NEIGHBORS = """
+UNWIND $names AS name
+MATCH (c:Concept {name: name})-[r]-(neighbor:Concept)
+WHERE type(r) IN $related_types AND NOT neighbor.name IN $names
+RETURN DISTINCT neighbor.name AS name
+"""
+
+STORED_RELATIONSHIPS = "MATCH (a:Concept)-[r]->(b:Concept) RETURN a.name AS source, type(r) AS type, b.name AS target"
+
+def write_relationships_query(rel_type):
+    return (
+        "UNWIND $rows AS row "
+        "MATCH (a:Concept {name: row.source}) "
+        "MATCH (b:Concept {name: row.target}) "
+        f"MERGE (a)-[r:`{rel_type}`]->(b) "
+        "SET r.content_hash = row.hash "
+        "RETURN count(*) AS written"
+    )
+
+def delete_relationships_query(rel_type):
+    return (
+        "UNWIND $rows AS row "
+        f"MATCH (a:Concept {{name: row.source}})-[r:`{rel_type}`]->(b:Concept {{name: row.target}}) "
+        "DELETE r "
+        "RETURN count(*) AS written"
+    )
+
+class LoadProgress:
+    """Thread-safe row counters, logged at most every `log_interval` seconds."""
+
+    def __init__(self, log_interval=5.0):
+        self._log_interval = log_interval
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._logged_at = self._started
+        self.counts = defaultdict(int)
+
+    def add(self, **counts):
+        with self._lock:
+            for key, value in counts.items():
+                self.counts[key] += value
+            now = time.monotonic()
+            if now - self._logged_at < self._log_interval:
+                return
+            self._logged_at = now
+            snapshot = dict(self.counts)
+        elapsed = now - self._started
+        rows = snapshot.get("concepts", 0) + snapshot.get("relationships", 0)
+        logger.info(f"Progress: {snapshot} in {elapsed:.0f}s ({rows / elapsed:,.0f} rows/s)")
+
+    def summary(self):
+        with self._lock:
+            elapsed = time.monotonic() - self._started
+            summary = dict(self.counts)
+        rows = summary.get("concepts", 0) + summary.get("relationships", 0)
+        summary.update(elapsed_s=round(elapsed, 1), rows_per_s=round(rows / elapsed, 1) if elapsed > 0 else 0.0)
+        return summary
+
+class BulkLoader:
+    """
+    Writes streamed concepts and relationships in batched UNWIND transactions.
+
+    Batches are written by `workers` sessions in parallel, each batch in its
+    own transaction, with at most 2 * workers batches buffered so arbitrarily
+    large inputs are streamed. Batches failing with a retryable error
+    (deadlocks, leader switches, lost connections) are retried with
+    exponential backoff up to `max_retries` times. Writes are MERGEs, so
+    re-running a load is safe.
+    """
+
+    def __init__(self, driver, batch_size=10000, workers=4, max_retries=5, database=None, log_interval=5.0):
+        if batch_size <= 0 or workers <= 0:
+            raise ValueError("batch_size and workers must be positive")
+        self._driver = driver
+        self._batch_size = batch_size
+        self._workers = workers
+        self._max_retries = max_retries
+        self._database = database
+        self.progress = LoadProgress(log_interval)
+        self._concept_workers = workers
+
+    def _session(self):
+        return self._driver.session(database=self._database) if self._database else self._driver.session()
+
+    def ensure_schema(self):
+        """
+        Makes Concept names unique so MERGE is an index lookup and safe across parallel writers.
+
+        When the constraint cannot be created (duplicate names already
+        exist), a plain index is used instead and concepts are written by a
+        single session, since concurrent MERGEs without a constraint can
+        create duplicates. See schema.ensure_constraints.
+        """
+        with self._session() as session:
+            if not ensure_constraints(session):
+                logger.warning("Concept names are not unique-constrained, writing concepts serially")
+                self._concept_workers = 1
+
+    def _write(self, query, rows):
+        """Runs one batch in its own transaction, retrying retryable failures."""
+        for attempt in range(self._max_retries + 1):
+            try:
+                with self._session() as session:
+                    with session.begin_transaction() as tx:
+                        written = tx.run(query, {"rows": rows}).single()["written"]
+                        tx.commit()
+                return written, attempt
+            except (Neo4jError, DriverError) as e:
+                if not e.is_retryable() or attempt == self._max_retries:
+                    raise
+                delay = min(30.0, 0.1 * 2 ** attempt) * (0.5 + random.random())
+                logger.warning(f"Retrying batch of {len(rows)} rows in {delay:.2f}s after: {e}")
+                time.sleep(delay)
+
+    def _run_parallel(self, tasks, workers):
+        """Runs (query, rows, on_done) tasks on `workers` threads, pulling lazily from `tasks`."""
+        slots = threading.BoundedSemaphore(workers * 2)
+        errors = []
+
+        def run(query, rows, on_done):
+            try:
+                if not errors:
+                    on_done(*self._write(query, rows))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                slots.release()
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk-writer") as pool:
+            for task in tasks:
+                slots.acquire()
+                if errors:
+                    slots.release()
+                    break
+                pool.submit(run, *task)
+        if errors:
+            raise errors[0]
+
+    def load_concepts(self, concepts):
+        """Writes concepts (MERGE by name, setting text)."""
+        def tasks():
+            for batch in batched(concepts, self._batch_size):
+                rows = [{"name": c.name, "text": c.text, "hash": concept_hash(c)} for c in batch]
+
+                def on_done(written, retries):
+                    self.progress.add(concepts=written, concept_batches=1, retries=retries)
+
+                yield WRITE_CONCEPTS, rows, on_done
+
+        self._run_parallel(tasks(), self._concept_workers)
+
+    def load_relationships(self, relationships):
+        """Writes relationships whose endpoints exist (MERGE); others are counted as skipped."""
+        def tasks():
+            for batch in batched(relationships, self._batch_size):
+                by_type = defaultdict(list)
+                for relationship in batch:
+                    by_type[relationship.type].append({
+                        "source": relationship.source,
+                        "target": relationship.target,
+                        "hash": relationship_hash(relationship),
+                    })
+                for rel_type, rows in by_type.items():
+
+                    def on_done(written, retries, submitted=len(rows)):
+                        self.progress.add(relationships=written, relationships_skipped=submitted - written,
+                                          relationship_batches=1, retries=retries)
+
+                    yield write_relationships_query(rel_type), rows, on_done
+
+        self._run_parallel(tasks(), self._workers)
+
+    def delete_concepts(self, names):
+        """Detach-deletes concepts by name."""
+        def tasks():
+            for batch in batched(names, self._batch_size):
+
+                def on_done(written, retries):
+                    self.progress.add(concepts_removed=written, retries=retries)
+
+                yield DELETE_CONCEPTS, [{"name": name} for name in batch], on_done
+
+        self._run_parallel(tasks(), self._workers)
+
+    def delete_relationships(self, relationships):
+        """Deletes relationships by endpoints and type."""
+        def tasks():
+            for batch in batched(relationships, self._batch_size):
+                by_type = defaultdict(list)
+                for relationship in batch:
+                    by_type[relationship.type].append({"source": relationship.source, "target": relationship.target})
+                for rel_type, rows in by_type.items():
+
+                    def on_done(written, retries):
+                        self.progress.add(relationships_removed=written, retries=retries)
+
+                    yield delete_relationships_query(rel_type), rows, on_done
+
+        self._run_parallel(tasks(), self._workers)
+
+    def finalize(self, embedder=None, materialize_passages=True):
+        """Creates the full-text index, optionally embeds concepts, refreshes passages and bumps the graph version."""
+        with self._session() as session:
+            create_fulltext_index(session)
+            if embedder is not None:
+                store_concept_embeddings(session, embedder)
+            if materialize_passages:
+                refresh_passages(session, batch_size=max(500, self._batch_size // 10))
+            bump_graph_version(session)
+
+    def load(self, concepts, relationships=(), embedder=None, materialize_passages=True):
+        """
+        Loads concepts, then relationships, then finalizes the graph.
+
+        Returns:
+            dict: Row counts, retries, elapsed seconds and rows per second
+        """
+        self.ensure_schema()
+        logger.info(f"Loading concepts (batch size {self._batch_size}, {self._concept_workers} writers)")
+        self.load_concepts(concepts)
+        logger.info(f"Loading relationships (batch size {self._batch_size}, {self._workers} writers)")
+        self.load_relationships(relationships)
+        self.finalize(embedder, materialize_passages)
+        summary = self.progress.summary()
+        logger.info(f"Bulk load complete: {summary}")
+        return summary
+
+    def _related_neighbors(self, names):
+        """Returns the concepts linked to `names` by a RELATED_TYPES relationship, outside `names`."""
+        neighbors = set()
+        with self._session() as session:
+            for batch in batched(names, self._batch_size):
+                neighbors.update(record["name"] for record in session.run(
+                    RELATED_NEIGHBORS, {"names": batch, "related_types": RELATED_TYPES}
+                ))
+        return sorted(neighbors)
+
+    def sync(self, concepts, relationships=None, embedder=None, materialize_passages=True):
+        """
+        Incrementally reconciles the graph with the input, which describes the complete graph.
+
+        Every Concept and loaded relationship stores a `content_hash`. Only
+        new or changed concepts are written and only relationships that are
+        new are created; concepts and relationships missing from the input
+        are deleted. Passages and embeddings are refreshed for the affected
+        concepts only, and the graph version is bumped only when something
+        changed, so caches keyed on it stay valid across no-op loads.
+        Concepts without a stored hash (e.g. from load_sample_data) count as
+        changed on the first sync. With `relationships` None, stored
+        relationships are left as they are (apart from those of removed
+        concepts) instead of being reconciled with an empty input.
+
+        Returns:
+            dict: Change summary with per-kind counts ("concepts": added,
+                changed, removed, unchanged; "relationships": added, removed,
+                unchanged, skipped), the new graph version (None when
+                unchanged) and the names of upserted and removed concepts and
+                of concepts whose passage was refreshed, for targeted cache
+                and index invalidation
+        """
+        self.ensure_schema()
+        with self._session() as session:
+            stored_concepts = {record["name"]: record["hash"] for record in session.run(STORED_CONCEPT_HASHES)}
+        logger.info(f"Comparing input with {len(stored_concepts)} stored concepts")
+
+        seen = set()
+        upserted = []
+        concept_counts = {"added": 0, "changed": 0, "removed": 0, "unchanged": 0}
+
+        def changed_concepts():
+            for concept in concepts:
+                if concept.name in seen:
+                    continue
+                seen.add(concept.name)
+                stored_hash = stored_concepts.get(concept.name)
+                if stored_hash == concept_hash(concept):
+                    concept_counts["unchanged"] += 1
+                    continue
+                concept_counts["changed" if concept.name in stored_concepts else "added"] += 1
+                upserted.append(concept.name)
+                yield concept
+
+        self.load_concepts(changed_concepts())
+        removed = [name for name in stored_concepts if name not in seen]
+        concept_counts["removed"] = len(removed)
+        del stored_concepts
+
+        relationship_counts = {"added": 0, "removed": 0, "unchanged": 0, "skipped": 0}
+        if relationships is None:
+            stored_relationships = set()
+            relationships = ()
+        else:
+            with self._session() as session:
+                stored_relationships = {
+                    Relationship(record["source"], record["type"], record["target"])
+                    for record in session.run(STORED_RELATIONSHIPS)
+                }
+        wanted = set()
+        new_relationships = []
+        for relationship in relationships:
+            if relationship.source not in seen or relationship.target not in seen:
+                relationship_counts["skipped"] += 1
+            elif relationship not in wanted:
+                wanted.add(relationship)
+                if relationship in stored_relationships:
+                    relationship_counts["unchanged"] += 1
+                else:
+                    new_relationships.append(relationship)
+        relationship_counts["added"] = len(new_relationships)
+        stale_relationships = [relationship for relationship in stored_relationships if relationship not in wanted]
+        relationship_counts["removed"] = len(stale_relationships)
+        del stored_relationships, wanted
+
+        # Relationships between removed concepts go with their DETACH DELETE
+        self.delete_relationships(r for r in stale_relationships if r.source in seen and r.target in seen)
+        self.load_relationships(new_relationships)
+        # Read before the delete: these passages name a removed concept, whether or
+        # not a relationships input was given
+        orphaned = self._related_neighbors(removed) if materialize_passages else []
+        self.delete_concepts(removed)
+
+        changed = bool(upserted or removed or new_relationships or stale_relationships)
+        graph_version = None
+        refreshed = []
+        if changed:
+            with self._session() as session:
+                create_fulltext_index(session)
+                if embedder is not None and upserted:
+                    store_concept_embeddings(session, embedder, names=upserted)
+                if materialize_passages:
+                    batch_size = max(500, self._batch_size // 10)
+                    refresh_passages(session, list(dict.fromkeys(upserted + orphaned)), batch_size=batch_size)
+                    # Neighbors of added or removed edges, including edges of removed concepts
+                    affected = [r for r in new_relationships + stale_relationships
+                                if r.source in seen or r.target in seen]
+                    refresh_passages_for_relationships(session, affected, batch_size=batch_size)
+                    refreshed = sorted(
+                        set(upserted) | set(orphaned)
+                        | {name for r in affected for name in (r.source, r.target) if name in seen}
+                    )
+                graph_version = bump_graph_version(session)
+        else:
+            logger.info("Input matches the stored graph, nothing to change")
+
+        summary = {
+            "concepts": concept_counts,
+            "relationships": relationship_counts,
+            "graph_version": graph_version,
+            "elapsed_s": self.progress.summary()["elapsed_s"],
+            "upserted": upserted,
+            "removed": removed,
+            "refreshed_passages": refreshed,
+        }
+        logger.info(f"Incremental load complete: concepts {concept_counts}, relationships {relationship_counts}")
+        return summary
+
+def main(concepts_path, relationships_path=None, batch_size=10000, workers=4, max_retries=5, embedder_spec=None,
+         materialize_passages=True, incremental=False):
+    """Connects to Neo4j and bulk-loads the given files."""
+    load_dotenv()
+    try:
+        driver = get_neo4j_driver(max_connection_pool_size=workers + 2)
+    except Exception as e:
+        logger.error(f"Failed to connect to Neo4j: {e}")
+        return 1
+    try:
+        embedder = get_embedder(embedder_spec) if embedder_spec else None
+        loader = BulkLoader(driver, batch_size=batch_size, workers=workers, max_retries=max_retries)
+        relationships = read_relationships(relationships_path) if relationships_path else None
+        if incremental:
+            summary = loader.sync(read_concepts(concepts_path), relationships, embedder=embedder,
+                                  materialize_passages=materialize_passages)
+        else:
+            summary = loader.load(read_concepts(concepts_path), relationships or (), embedder=embedder,
+                                  materialize_passages=materialize_passages)
+    except Exception as e:
+        logger.error(f"Bulk load failed: {e}")
+        return 1
+    finally:
+        driver.close()
+        logger.info("Neo4j connection closed")
+    if incremental:
+        # Name lists can be long; the counts are the useful console output
+        summary = {key: value for key, value in summary.items() if not isinstance(value, list)}
+    print(json.dumps(summary, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-load a Concept graph from JSONL or CSV files into Neo4j.")
+    parser.add_argument(
+        "concepts",
+        type=str,
+        help="Concepts file: JSONL with name/text per line or CSV with a name,text header (.gz allowed, '-' for stdin)."
+    )
+    parser.add_argument(
+        "--relationships",
+        type=str,
+        default=None,
+        help="Relationships file: JSONL or CSV with source, type and target (.gz allowed)."
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=10000,
+        help="Rows per UNWIND transaction."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Parallel writer sessions."
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=5,
+        help="Retries per batch on transient errors (deadlocks, leader changes, lost connections)."
+    )
+    parser.add_argument(
+        "--embedder",
+        type=str,
+        default=None,
+        help="Also store Concept embeddings, e.g. 'hashing'."
+    )
+    parser.add_argument(
+        "--skip-passages",
+        action="store_true",
+        help="Do not materialize passages after loading (run data_loader --refresh-passages later)."
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Treat the files as the complete graph: write only new or changed records and delete missing ones. "
+             "Stored relationships are only reconciled when --relationships is given."
+    )
+    args = parser.parse_args()
+
+    sys.exit(main(args.concepts, args.relationships, args.batch_size, args.workers, args.max_retries, args.embedder,
+                  not args.skip_passages, args.incremental))
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict
+
+from src.dspy_graph_rag.logging_utils import setup_logger
+
+logger = setup_logger('cache')
+
+def normalize_query(query):
+    """
+    Normalizes a query so trivially different spellings share a cache entry.
+
+    Args:
+        query (str): Raw query text
+
+    Returns:
+        str: Lowercased query with collapsed whitespace and no trailing punctuation
+    """
+    return " ".join(query.lower().split()).rstrip("?!. ")
+
+class RetrievalCache:
+    """
+    In-process LRU cache for retrieval results.
+
+    Entries are keyed by (namespace, normalized query, k), expire after `ttl`
+    seconds and are evicted least-recently-used once `max_size` is reached.
+    The whole cache is dropped when it is consulted with a graph version that
+    differs from the one its entries were computed against.
+    """
+
+    def __init__(self, max_size=1024, ttl=300.0):
+        logger.info(f"Initializing RetrievalCache with max_size={max_size}, ttl={ttl}s")
+        if max_size <= 0:
+            raise ValueError("max_size must be positive")
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._graph_version = None
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    def _check_version(self, graph_version):
+        # Caller must hold the lock
+        if graph_version != self._graph_version:
+            if self._entries:
+                logger.info(f"Graph version changed ({self._graph_version} -> {graph_version}), "
+                            f"dropping {len(self._entries)} cached results")
+                self._invalidations += 1
+                self._entries.clear()
+            self._graph_version = graph_version
+
+    def get(self, query, k, graph_version=None, namespace=""):
+        """Returns a copy of the cached passages, or None on a miss."""
+        key = (namespace, normalize_query(query), k)
+        with self._lock:
+            self._check_version(graph_version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            passages, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+        return [dict(passage) for passage in passages]
+
+    def put(self, query, k, passages, graph_version=None, namespace=""):
+        """Stores passages for the query, evicting the least recently used entries if full."""
+        key = (namespace, normalize_query(query), k)
+        with self._lock:
+            self._check_version(graph_version)
+            self._entries[key] = ([dict(passage) for passage in passages], time.monotonic() + self._ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self):
+        """Drops every cached entry."""
+        with self._lock:
+            if self._entries:
+                self._invalidations += 1
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict: hits, misses, evictions, expirations, invalidations, size,
+                max_size and hit_rate
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "invalidations": self._invalidations,
+                "size": len(self._entries),
+                "max_size": self._max_size,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,253 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import dspy
+from dotenv import load_dotenv
+from dspy.evaluate.metrics import f1_score
+
+from src.dspy_graph_rag.batch import read_questions
+from src.dspy_graph_rag.cache import RetrievalCache
+from src.dspy_graph_rag.embeddings import get_embedder
+from src.dspy_graph_rag.logging_utils import setup_logger
+from src.dspy_graph_rag.rag_pipeline import RETRIEVAL_MODES, GraphRAG, get_neo4j_driver
+from src.dspy_graph_rag.snapshot import SnapshotRetriever
+
+logger = setup_logger('compile')
+
+# Where `compile` saves the tuned program and main.py looks for it at startup
+COMPILED_PROGRAM_PATH = "output/compiled_graphrag.json"
+LM_CACHE_DIR = "output/lm_cache"
+
+OPTIMIZERS = ("bootstrap", "mipro")
+
+def load_examples(path):
+    """
+    Reads labelled questions for optimization.
+
+    The file is JSONL in the batch input format (see batch.read_questions)
+    where every record also has an "answer" string.
+
+    Returns:
+        list[dspy.Example]: Examples with `question` as the input field
+    """
+    examples = []
+    with open(path, encoding="utf-8") as f:
+        for record in read_questions(f):
+            if "error" in record:
+                logger.warning(f"Skipping line {record['line']} of {path}: {record['error']}")
+                continue
+            if not isinstance(record.get("answer"), str):
+                logger.warning(f"Skipping unlabelled question {record['question']!r} in {path}")
+                continue
+            examples.append(dspy.Example(question=record["question"], answer=record["answer"]).with_inputs("question"))
+    logger.info(f"Loaded {len(examples)} labelled questions from {path}")
+    return examples
+
+def answer_f1(example, prediction, trace=None, threshold=0.5):
+    """
+    Token F1 between the predicted and labelled answer.
+
+    While bootstrapping demos (`trace` is set) it returns whether the F1
+    reaches `threshold`, so only reasonably correct traces become demos.
+    """
+    score = f1_score(prediction.answer or "", example.answer)
+    return score >= threshold if trace is not None else score
+
+def build_optimizer(name, metric, num_threads=8, max_bootstrapped_demos=4, max_labeled_demos=4, num_candidates=8):
+    """Builds a DSPy optimizer that evaluates its candidate programs on `num_threads` threads."""
+    if name == "bootstrap":
+        # Tunes few-shot demos: random demo subsets, each scored on the validation set
+        return dspy.BootstrapFewShotWithRandomSearch(
+            metric=metric, max_bootstrapped_demos=max_bootstrapped_demos, max_labeled_demos=max_labeled_demos,
+            num_candidate_programs=num_candidates, num_threads=num_threads,
+        )
+    if name == "mipro":
+        # Tunes instructions and demos together
+        return dspy.MIPROv2(
+            metric=metric, max_bootstrapped_demos=max_bootstrapped_demos, max_labeled_demos=max_labeled_demos,
+            auto=None, num_candidates=num_candidates, num_threads=num_threads,
+        )
+    raise ValueError(f"Unknown optimizer '{name}', expected one of {OPTIMIZERS}")
+
+def evaluate(program, devset, metric=answer_f1, num_threads=8):
+    """Returns the mean metric of `program` over `devset`, as a percentage."""
+    result = dspy.Evaluate(devset=devset, metric=metric, num_threads=num_threads, display_progress=False)(program)
+    return float(getattr(result, "score", result))
+
+def compile_program(program, trainset, valset=None, optimizer="bootstrap", num_threads=8, num_candidates=8):
+    """
+    Optimizes a GraphRAG program on labelled examples.
+
+    Args:
+        program (GraphRAG): The program to optimize; it is not modified
+        trainset (list[dspy.Example]): Examples demos are bootstrapped from
+        valset (list[dspy.Example], optional): Examples candidates are scored
+            on; defaults to the trainset
+        optimizer (str): One of OPTIMIZERS
+        num_threads (int): Threads candidate programs are evaluated on
+        num_candidates (int): Candidate programs to try
+
+    Returns:
+        tuple: (compiled program, report dict with baseline and compiled scores)
+    """
+    valset = valset or trainset
+    started = time.monotonic()
+    baseline = evaluate(program, valset, num_threads=num_threads)
+    logger.info(f"Baseline score: {baseline:.1f}")
+    teleprompter = build_optimizer(optimizer, answer_f1, num_threads=num_threads, num_candidates=num_candidates)
+    if optimizer == "mipro":
+        compiled = teleprompter.compile(program, trainset=trainset, valset=valset, num_trials=num_candidates * 2,
+                                        requires_permission_to_run=False)
+    else:
+        compiled = teleprompter.compile(program, trainset=trainset, valset=valset)
+    score = evaluate(compiled, valset, num_threads=num_threads)
+    logger.info(f"Compiled score: {score:.1f}")
+    report = {
+        "optimizer": optimizer,
+        "train_examples": len(trainset),
+        "validation_examples": len(valset),
+        "baseline_score": round(baseline, 2),
+        "compiled_score": round(score, 2),
+        "elapsed_s": round(time.monotonic() - started, 1),
+        "demos": {name: len(predictor.demos) for name, predictor in compiled.named_predictors()},
+    }
+    return compiled, report
+
+def save_compiled(program, path=COMPILED_PROGRAM_PATH):
+    """Saves the demos and instructions of a compiled program as JSON."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    program.save(path)
+    logger.info(f"Saved compiled program to {path}")
+
+def load_compiled(program, path=COMPILED_PROGRAM_PATH):
+    """
+    Loads the demos and instructions saved by `compile` into `program`.
+
+    Returns:
+        bool: Whether a compiled program was found and loaded
+    """
+    if not path or not os.path.exists(path):
+        return False
+    program.load(path)
+    logger.info(f"Loaded compiled program from {path}")
+    return True
+
+def main(trainset_path, valset_path=None, output_path=COMPILED_PROGRAM_PATH, optimizer="bootstrap",
+         retrieval_mode="contains", embedder_spec=None, snapshot_dir=None, num_threads=8, num_candidates=8,
+         lm_cache_dir=LM_CACHE_DIR):
+    """Configures DSPy, optimizes GraphRAG on a labelled question set and saves the result."""
+    load_dotenv(override=True)
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if not openai_api_key:
+        logger.error("OpenAI API key not found in .env file")
+        return 1
+    llm_model = os.environ.get("LLM_MODEL") or "gpt-3.5-turbo"
+    openai_kwargs = {"api_key": openai_api_key}
+    if os.getenv("OPENAI_API_BASE"):
+        openai_kwargs["api_base"] = os.getenv("OPENAI_API_BASE")
+    # Candidates share most of their LM calls (same questions, overlapping demos), so
+    # responses are cached on disk; an interrupted or repeated run replays them for free
+    dspy.configure_cache(enable_disk_cache=True, enable_memory_cache=True, disk_cache_dir=lm_cache_dir)
+    dspy.configure(lm=dspy.LM("openai/" + llm_model, cache=True, **openai_kwargs))
+    logger.info(f"Optimizing with {llm_model}, LM cache in {lm_cache_dir}")
+
+    trainset = load_examples(trainset_path)
+    valset = load_examples(valset_path) if valset_path else None
+    if not trainset:
+        logger.error(f"No labelled questions in {trainset_path}")
+        return 1
+
+    neo4j_driver = None
+    retriever = None
+    try:
+        if snapshot_dir:
+            retriever = SnapshotRetriever(snapshot_dir, k=3)
+        else:
+            neo4j_driver = get_neo4j_driver()
+        embedder = get_embedder(embedder_spec) if embedder_spec else None
+        # Every candidate retrieves for the same questions, so retrieval results are cached too
+        program = GraphRAG(neo4j_driver, k=3, retrieval_mode=retrieval_mode, embedder=embedder, retriever=retriever,
+                           retrieval_cache=RetrievalCache(max_size=max(1024, 4 * len(trainset)), ttl=24 * 3600))
+        compiled, report = compile_program(program, trainset, valset, optimizer=optimizer, num_threads=num_threads,
+                                           num_candidates=num_candidates)
+        save_compiled(compiled, output_path)
+    except Exception as e:
+        logger.error(f"Compilation failed: {e}")
+        return 1
+    finally:
+        if neo4j_driver:
+            neo4j_driver.close()
+    print(json.dumps(report, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Optimize the GraphRAG program on labelled questions and save it.")
+    parser.add_argument(
+        "trainset",
+        type=str,
+        help="JSONL file of {\"question\": ..., \"answer\": ...} records."
+    )
+    parser.add_argument(
+        "--valset",
+        type=str,
+        default=None,
+        help="JSONL file candidates are scored on (defaults to the trainset)."
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default=COMPILED_PROGRAM_PATH,
+        help="Where to save the compiled program; main.py loads it from here."
+    )
+    parser.add_argument(
+        "--optimizer",
+        choices=OPTIMIZERS,
+        default="bootstrap",
+        help="bootstrap: random search over few-shot demos; mipro: instructions and demos (more LM calls)."
+    )
+    parser.add_argument(
+        "--retrieval-mode",
+        choices=RETRIEVAL_MODES,
+        default="contains",
+        help="Retrieval mode used while optimizing; use the one production runs with."
+    )
+    parser.add_argument(
+        "--embedder",
+        type=str,
+        default=None,
+        help="Embedder for vector or hybrid retrieval, e.g. 'hashing'."
+    )
+    parser.add_argument(
+        "--snapshot",
+        type=str,
+        default=None,
+        help="Retrieve from a graph snapshot directory instead of Neo4j."
+    )
+    parser.add_argument(
+        "--num-threads",
+        type=int,
+        default=8,
+        help="Threads candidate programs are evaluated on."
+    )
+    parser.add_argument(
+        "--num-candidates",
+        type=int,
+        default=8,
+        help="Candidate programs to evaluate."
+    )
+    parser.add_argument(
+        "--lm-cache-dir",
+        type=str,
+        default=LM_CACHE_DIR,
+        help="Directory of the on-disk LM response cache."
+    )
+    args = parser.parse_args()
+
+    sys.exit(main(args.trainset, args.valset, args.output, args.optimizer, args.retrieval_mode, args.embedder,
+                  args.snapshot, args.num_threads, args.num_candidates, args.lm_cache_dir))
@@ -0,0 +1,189 @@
+import re
+import threading
+
+from src.dspy_graph_rag.logging_utils import setup_logger
+
+logger = setup_logger('context_packer')
+
+# "name (related: a, b): text" or "name: text", as rendered by the retrievers
+PASSAGE_PATTERN = re.compile(r"^(?P<name>[^:(]+?)(?: \(related: (?P<related>[^)]*)\))?: (?P<body>.*)$", re.DOTALL)
+
+# Token approximation used when tiktoken is not installed
+APPROX_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+class _ApproxTokenizer:
+    """Counts words and punctuation marks, a rough stand-in for a BPE tokenizer."""
+
+    name = "approx"
+
+    def count(self, text):
+        return len(APPROX_TOKEN_PATTERN.findall(text))
+
+    def truncate(self, text, max_tokens):
+        if max_tokens <= 0:
+            return ""
+        for i, match in enumerate(APPROX_TOKEN_PATTERN.finditer(text)):
+            if i == max_tokens:
+                return text[:match.start()].rstrip()
+        return text
+
+class _TiktokenTokenizer:
+    def __init__(self, model):
+        import tiktoken
+
+        try:
+            self._encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            self._encoding = tiktoken.get_encoding("cl100k_base")
+        self.name = self._encoding.name
+
+    def count(self, text):
+        return len(self._encoding.encode(text))
+
+    def truncate(self, text, max_tokens):
+        tokens = self._encoding.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        return self._encoding.decode(tokens[:max(max_tokens, 0)]).rstrip()
+
+def get_tokenizer(model=None):
+    """
+    Returns a tokenizer for the target model.
+
+    Uses tiktoken when it is installed and its encoding can be loaded (with
+    cl100k_base for models it does not know), and a word/punctuation
+    approximation otherwise.
+    """
+    if model:
+        try:
+            # LiteLLM-style model names carry a provider prefix, e.g. "openai/gpt-4o"
+            return _TiktokenTokenizer(model.split("/")[-1])
+        except ImportError:
+            logger.warning("tiktoken is not installed, approximating token counts")
+        except Exception as e:
+            # tiktoken downloads encodings on first use, which fails offline
+            logger.warning(f"Could not load a tiktoken encoding for {model}, approximating token counts: {e}")
+    return _ApproxTokenizer()
+
+class ContextPacker:
+    """
+    Packs retrieved passages into a token budget before generation.
+
+    Passages are expected best first. Exact duplicates are dropped, and
+    passages about the same concept (e.g. surfaced with different `related:`
+    lists, or once rendered and once by a fallback) are merged into the
+    highest-ranked one with the union of their related concepts. Passages are
+    then taken in rank order until the budget is spent; the first passage that
+    does not fit is truncated if at least `min_passage_tokens` remain, and
+    everything ranked below it is dropped.
+    """
+
+    def __init__(self, max_tokens=1024, model=None, min_passage_tokens=16, tokenizer=None):
+        logger.info(f"Initializing ContextPacker with max_tokens={max_tokens}, model={model}")
+        if max_tokens <= 0:
+            raise ValueError("max_tokens must be positive")
+        self._max_tokens = max_tokens
+        self._min_passage_tokens = min_passage_tokens
+        self._tokenizer = tokenizer or get_tokenizer(model)
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._tokens_in = 0
+        self._tokens_out = 0
+
+    def _merge(self, passages):
+        """Drops duplicate passages and merges passages about the same concept, keeping rank order."""
+        merged = []         # [name or None, related list, body or full text]
+        by_name = {}
+        seen = set()
+        for passage in passages:
+            text = passage["text"]
+            if text is None or text in seen:
+                continue
+            seen.add(text)
+            match = PASSAGE_PATTERN.match(text)
+            if match is None:
+                merged.append([None, [], text])
+                continue
+            name, body = match.group("name"), match.group("body")
+            related = [n for n in (match.group("related") or "").split(", ") if n]
+            entry = by_name.get(name)
+            if entry is not None and entry[2] == body:
+                entry[1].extend(n for n in related if n not in entry[1])
+                continue
+            entry = [name, related, body]
+            by_name.setdefault(name, entry)
+            merged.append(entry)
+        texts = []
+        for name, related, body in merged:
+            if name is None:
+                texts.append(body)
+            elif related:
+                texts.append(f"{name} (related: {', '.join(related)}): {body}")
+            else:
+                texts.append(f"{name}: {body}")
+        return texts
+
+    def pack(self, passages):
+        """
+        Packs passages into the token budget.
+
+        Args:
+            passages (list[dict]): Retrieved passages with a "text" key, best first
+
+        Returns:
+            tuple: (packed passages as [{"text": ...}], report dict with
+                input_passages, output_passages, merged, truncated,
+                input_tokens, output_tokens and tokens_saved)
+        """
+        input_tokens = sum(self._tokenizer.count(p["text"]) for p in passages if p["text"] is not None)
+        texts = self._merge(passages)
+
+        packed = []
+        used = 0
+        truncated = 0
+        for text in texts:
+            tokens = self._tokenizer.count(text)
+            if used + tokens <= self._max_tokens:
+                packed.append(text)
+                used += tokens
+                continue
+            remaining = self._max_tokens - used
+            if remaining >= self._min_passage_tokens:
+                text = self._tokenizer.truncate(text, remaining)
+                packed.append(text)
+                used += self._tokenizer.count(text)
+                truncated += 1
+            break
+
+        report = {
+            "input_passages": len(passages),
+            "output_passages": len(packed),
+            "merged": len(passages) - len(texts),
+            "truncated": truncated,
+            "input_tokens": input_tokens,
+            "output_tokens": used,
+            "tokens_saved": input_tokens - used,
+        }
+        with self._lock:
+            self._requests += 1
+            self._tokens_in += input_tokens
+            self._tokens_out += used
+        logger.info(f"Packed context: {report['output_passages']}/{report['input_passages']} passages, "
+                    f"{used}/{input_tokens} {self._tokenizer.name} tokens ({report['tokens_saved']} saved)")
+        return [{"text": text} for text in packed], report
+
+    def stats(self):
+        """
+        Returns cumulative packing counters.
+
+        Returns:
+            dict: requests, input_tokens, output_tokens, tokens_saved and max_tokens
+        """
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "input_tokens": self._tokens_in,
+                "output_tokens": self._tokens_out,
+                "tokens_saved": self._tokens_in - self._tokens_out,
+                "max_tokens": self._max_tokens,
+            }
@@ -1,16 +1,311 @@
 import os
+import argparse
+import hashlib
+import time
 from neo4j import GraphDatabase
+from neo4j.exceptions import ClientError
 from dotenv import load_dotenv
+from src.dspy_graph_rag.embeddings import get_embedder
 from src.dspy_graph_rag.logging_utils import setup_logger
 
 logger = setup_logger('data_loader')
 
-def load_sample_data(driver):
-    """Loads sample data into Neo4j."""
+# Full-text index over Concept name/text, queried by the retriever's "fulltext" mode
+FULLTEXT_INDEX_NAME = "concept_fulltext"
+
+def create_fulltext_index(session, timeout=300):
+    """Creates the Concept full-text index if missing and waits for it to come online."""
+    logger.info(f"Ensuring full-text index '{FULLTEXT_INDEX_NAME}' exists")
+    session.run(
+        f"CREATE FULLTEXT INDEX {FULLTEXT_INDEX_NAME} IF NOT EXISTS "
+        "FOR (c:Concept) ON EACH [c.name, c.text]"
+    )
+    session.run("CALL db.awaitIndex($name, $timeout)", {"name": FULLTEXT_INDEX_NAME, "timeout": timeout})
+    logger.info(f"Full-text index '{FULLTEXT_INDEX_NAME}' is online")
+
+# Vector index over Concept.embedding, queried by the retriever's "vector" mode
+VECTOR_INDEX_NAME = "concept_embedding"
+
+def create_vector_index(session, dimensions, timeout=300):
+    """
+    Creates the Concept vector index if missing and waits for it to come online.
+
+    Returns:
+        bool: False if the database does not support vector indexes, in which
+            case the retriever falls back to its local NumPy index
+    """
+    logger.info(f"Ensuring vector index '{VECTOR_INDEX_NAME}' exists ({dimensions} dimensions)")
+    try:
+        session.run(
+            f"CREATE VECTOR INDEX {VECTOR_INDEX_NAME} IF NOT EXISTS "
+            "FOR (c:Concept) ON c.embedding "
+            "OPTIONS {indexConfig: {`vector.dimensions`: $dimensions, `vector.similarity_function`: 'cosine'}}",
+            {"dimensions": dimensions}
+        )
+        session.run("CALL db.awaitIndex($name, $timeout)", {"name": VECTOR_INDEX_NAME, "timeout": timeout})
+    except ClientError as e:
+        logger.warning(f"Could not create vector index, retrieval will use a local index instead: {e}")
+        return False
+    logger.info(f"Vector index '{VECTOR_INDEX_NAME}' is online")
+    return True
+
+def store_concept_embeddings(session, embedder, batch_size=256, names=None):
+    """
+    Computes embeddings for every Concept.text in batches and stores them on the nodes.
+
+    Concepts are paged by name, so only one batch is held in memory at a time.
+
+    Args:
+        session: Neo4j session
+        embedder: Object with `name`, `dimensions` and `embed(texts)`
+        batch_size (int): Concepts embedded and written per round trip
+        names (list, optional): Only embed these concepts, e.g. the ones an
+            incremental load changed
+
+    Returns:
+        int: Number of concepts embedded
+    """
+    logger.info(f"Computing concept embeddings with {embedder.name} (batch size {batch_size})")
+    total = 0
+    last_name = None
+    while True:
+        batch = list(session.run(
+            "MATCH (c:Concept) WHERE ($after IS NULL OR c.name > $after) AND ($names IS NULL OR c.name IN $names) "
+            "RETURN c.name AS name, c.text AS text ORDER BY c.name LIMIT $limit",
+            {"after": last_name, "limit": batch_size, "names": names}
+        ))
+        if not batch:
+            break
+        vectors = embedder.embed([record["text"] or "" for record in batch])
+        rows = [{"name": record["name"], "embedding": vector.tolist()} for record, vector in zip(batch, vectors)]
+        session.run(
+            "UNWIND $rows AS row "
+            "MATCH (c:Concept {name: row.name}) "
+            "SET c.embedding = row.embedding, c.embedding_model = $model",
+            {"rows": rows, "model": embedder.name}
+        )
+        total += len(rows)
+        last_name = batch[-1]["name"]
+        logger.debug(f"Embedded {total} concepts so far")
+    logger.info(f"Stored embeddings for {total} concepts")
+    create_vector_index(session, embedder.dimensions)
+    return total
+
+# Relationship types followed when collecting related concepts for a passage
+RELATED_TYPES = ['DIFFERS_FROM', 'IMPROVES_UPON', 'PROVIDES', 'IMPLEMENTS']
+
+# Renders `c` and its `related_concepts` as "name (related: a, b): text"
+PASSAGE_EXPRESSION = """
+    CASE
+        WHEN size(related_concepts) > 0
+        THEN c.name + ' (related: ' + substring(reduce(s = '', n IN related_concepts | s + ', ' + n), 2) + '): ' + c.text
+        ELSE c.name + ': ' + c.text
+    END
+"""
+
+# Stores the rendered passage and related-concept list of every matched `c`
+MATERIALIZE_PASSAGES = f"""
+OPTIONAL MATCH (c)-[r]-(related:Concept)
+WHERE type(r) IN $related_types
+WITH c, collect(DISTINCT related.name) AS related_concepts
+SET c.related_concepts = related_concepts, c.passage = {PASSAGE_EXPRESSION}
+RETURN count(c) AS refreshed, max(c.name) AS last_name
+"""
+
+def refresh_passages(session, names=None, batch_size=500):
+    """
+    Materializes Concept passages so the retriever does not render them per query.
+
+    Each concept gets `passage` ("name (related: a, b): text") and
+    `related_concepts` properties, written in batches.
+
+    Args:
+        session: Neo4j session
+        names (iterable, optional): Concepts to refresh; None refreshes every concept
+        batch_size (int): Concepts refreshed per round trip
+
+    Returns:
+        int: Number of concepts refreshed
+    """
+    total = 0
+    if names is None:
+        logger.info(f"Materializing passages for all concepts (batch size {batch_size})")
+        last_name = None
+        while True:
+            record = session.run(
+                "MATCH (c:Concept) WHERE $after IS NULL OR c.name > $after "
+                "WITH c ORDER BY c.name LIMIT $limit" + MATERIALIZE_PASSAGES,
+                {"after": last_name, "limit": batch_size, "related_types": RELATED_TYPES}
+            ).single()
+            if not record or not record["refreshed"]:
+                break
+            total += record["refreshed"]
+            last_name = record["last_name"]
+            logger.debug(f"Materialized {total} passages so far")
+    else:
+        names = list(dict.fromkeys(names))
+        for start in range(0, len(names), batch_size):
+            record = session.run(
+                "UNWIND $names AS name MATCH (c:Concept {name: name})" + MATERIALIZE_PASSAGES,
+                {"names": names[start:start + batch_size], "related_types": RELATED_TYPES}
+            ).single()
+            total += record["refreshed"] if record else 0
+    logger.info(f"Materialized passages for {total} concepts")
+    return total
+
+def refresh_passages_for_relationships(session, relationships, batch_size=500):
+    """
+    Refreshes the passages affected by added or removed relationships.
+
+    Only relationships of RELATED_TYPES appear in passages, so only their
+    endpoints are refreshed.
+
+    Args:
+        session: Neo4j session
+        relationships (iterable): (source name, relationship type, target name) tuples
+
+    Returns:
+        int: Number of concepts refreshed
+    """
+    affected = [
+        name
+        for source, rel_type, target in relationships if rel_type in RELATED_TYPES
+        for name in (source, target)
+    ]
+    if not affected:
+        return 0
+    return refresh_passages(session, affected, batch_size=batch_size)
+
+def refresh_stale_passages(session, batch_size=500):
+    """Materializes passages of concepts that have none yet, e.g. ones created by other writers."""
+    names = [record["name"] for record in session.run(
+        "MATCH (c:Concept) WHERE c.passage IS NULL RETURN c.name AS name"
+    )]
+    if not names:
+        return 0
+    return refresh_passages(session, names, batch_size=batch_size)
+
+def content_hash(*fields):
+    """Stable hash of a record's fields, stored as `content_hash` to detect changes between loads."""
+    return hashlib.blake2b("\x1f".join(fields).encode("utf-8"), digest_size=16).hexdigest()
+
+# Singleton node holding the graph version stamp; it survives data reloads so
+# the version keeps increasing and caches can tell that their entries are stale.
+GRAPH_META_LABEL = "GraphMeta"
+
+def bump_graph_version(session):
+    """Increments the graph version stamp and returns the new version."""
+    record = session.run(
+        f"MERGE (m:{GRAPH_META_LABEL} {{key: 'concept_graph'}}) "
+        "SET m.version = coalesce(m.version, 0) + 1, m.updated_at = datetime() "
+        "RETURN m.version AS version"
+    ).single()
+    version = record["version"]
+    logger.info(f"Graph version bumped to {version}")
+    return version
+
+GRAPH_VERSION_QUERY = f"MATCH (m:{GRAPH_META_LABEL} {{key: 'concept_graph'}}) RETURN m.version AS version"
+
+def get_graph_version(session):
+    """Returns the current graph version stamp, or 0 if data was never loaded."""
+    record = session.run(GRAPH_VERSION_QUERY).single()
+    return record["version"] if record else 0
+
+# Each statement deletes up to this many batches, so progress can be reported between statements
+RESET_BATCHES_PER_STATEMENT = 10
+
+def _reset_queries(label=None):
+    """Builds the relationship and node delete statements, for every node or only `label` nodes."""
+    if label is None:
+        relationship_match = "MATCH ()-[r]->()"
+        node_match = f"MATCH (n) WHERE NOT n:{GRAPH_META_LABEL}"
+    else:
+        relationship_match = f"MATCH (:`{label}`)-[r]-() WITH DISTINCT r"
+        node_match = f"MATCH (n:`{label}`)"
+    return (
+        f"{relationship_match}\nWITH r LIMIT $chunk\n"
+        "CALL { WITH r DELETE r } IN TRANSACTIONS OF $batch_size ROWS",
+        f"{node_match}\nWITH n LIMIT $chunk\n"
+        "CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF $batch_size ROWS",
+    )
+
+def drop_schema(session):
+    """
+    Drops every constraint and index except the built-in token lookup indexes.
+
+    Returns:
+        list[str]: The statements recreating them, for restore_schema
+    """
+    constraints = list(session.run("SHOW CONSTRAINTS YIELD name, createStatement"))
+    indexes = list(session.run(
+        "SHOW INDEXES YIELD name, type, owningConstraint, createStatement "
+        "WHERE type <> 'LOOKUP' AND owningConstraint IS NULL"
+    ))
+    statements = [record["createStatement"] for record in constraints + indexes]
+    for statement in statements:
+        logger.info(f"Dropping schema, will restore with: {statement}")
+    for record in constraints:
+        session.run(f"DROP CONSTRAINT `{record['name']}` IF EXISTS").consume()
+    for record in indexes:
+        session.run(f"DROP INDEX `{record['name']}` IF EXISTS").consume()
+    return statements
+
+def restore_schema(session, statements, timeout=600):
+    """Recreates the constraints and indexes dropped by drop_schema and waits for them to come online."""
+    for statement in statements:
+        session.run(statement).consume()
+    session.run("CALL db.awaitIndexes($timeout)", {"timeout": timeout}).consume()
+    logger.info(f"Restored {len(statements)} constraints and indexes")
+
+def reset_graph(session, batch_size=10000, rebuild_indexes=False, label=None):
+    """
+    Deletes every node and relationship (except the graph version stamp), or only
+    `label` nodes and their relationships, in bounded transactions.
+
+    Relationships are deleted first, so no single transaction has to detach a
+    densely connected node; every transaction touches at most `batch_size`
+    rows, which keeps heap use flat however large the graph is.
+
+    Args:
+        session: Neo4j session (the deletes run as auto-commit statements,
+            which CALL ... IN TRANSACTIONS requires)
+        batch_size (int): Rows deleted per transaction
+        rebuild_indexes (bool): Drop constraints and indexes before deleting
+            and recreate them afterwards, so the deletes do not pay for
+            index maintenance
+        label (str, optional): Only delete nodes with this label and their
+            relationships
+
+    Returns:
+        dict: Deleted node and relationship counts and elapsed seconds
+    """
+    started = time.monotonic()
+    statements = drop_schema(session) if rebuild_indexes else None
+    deleted = {"relationships": 0, "nodes": 0}
+    params = {"batch_size": batch_size, "chunk": batch_size * RESET_BATCHES_PER_STATEMENT}
+    try:
+        for kind, query in zip(("relationships", "nodes"), _reset_queries(label)):
+            while True:
+                counters = session.run(query, params).consume().counters
+                count = counters.relationships_deleted if kind == "relationships" else counters.nodes_deleted
+                if not count:
+                    break
+                deleted[kind] += count
+                elapsed = time.monotonic() - started
+                logger.info(f"Deleted {deleted[kind]:,} {kind} ({deleted[kind] / elapsed:,.0f}/s)")
+    finally:
+        if statements is not None:
+            restore_schema(session, statements)
+    summary = dict(deleted, elapsed_s=round(time.monotonic() - started, 1))
+    logger.info(f"Graph reset complete: {summary}")
+    return summary
+
+def load_sample_data(driver, embedder=None):
+    """Loads sample data into Neo4j, optionally embedding each concept with `embedder`."""
     with driver.session() as session:
-        # Clear existing data
+        # Clear existing data (the version stamp is kept so it keeps increasing)
         logger.info("Clearing existing Neo4j data")
-        session.run("MATCH (n) DETACH DELETE n")
+        reset_graph(session)
         
         # Create sample nodes and relationships
         logger.info("Loading DSPy and RAG patterns data")
@@ -81,6 +376,12 @@ def load_sample_data(driver):
         result = session.run(rel_query).single()
         rel_count = result["count"]
         logger.info(f"Created {rel_count} relationships")
+
+        create_fulltext_index(session)
+        if embedder is not None:
+            store_concept_embeddings(session, embedder)
+        refresh_passages(session)
+        bump_graph_version(session)
         
         # Test specific query about DSPy vs Traditional RAG
         test_query = """
@@ -111,8 +412,17 @@ def load_sample_data(driver):
         for record in test_results:
             logger.debug(f"Result: {record['result']}")
 
-def main():
-    """Connects to Neo4j and loads data."""
+def main(embedder_spec=None, passages_only=False, reset_only=False, batch_size=10000, rebuild_indexes=False):
+    """
+    Connects to Neo4j and loads data (or, with passages_only, only re-materializes
+    passages; with reset_only, only deletes the graph).
+
+    Loading and refreshing passages finish by bootstrapping the schema (see
+    schema.ensure_schema) and logging which retrieval queries use which index.
+    """
+    # Imported here: schema plans rag_pipeline's queries, and rag_pipeline imports this module
+    from src.dspy_graph_rag.schema import ensure_schema, index_usage, log_index_usage
+
     load_dotenv()
     uri = os.getenv("NEO4J_URI")
     user = os.getenv("NEO4J_USERNAME")
@@ -126,11 +436,56 @@ def main():
         driver = GraphDatabase.driver(uri, auth=(user, password))
         driver.verify_connectivity()
         logger.info("Successfully connected to Neo4j")
-        load_sample_data(driver)
+        if reset_only:
+            with driver.session() as session:
+                reset_graph(session, batch_size=batch_size, rebuild_indexes=rebuild_indexes)
+                bump_graph_version(session)
+        elif passages_only:
+            with driver.session() as session:
+                refresh_passages(session)
+                bump_graph_version(session)
+        else:
+            embedder = get_embedder(embedder_spec) if embedder_spec else None
+            load_sample_data(driver, embedder=embedder)
+        if not reset_only:
+            with driver.session() as session:
+                ensure_schema(session)
+                log_index_usage(index_usage(session))
         driver.close()
         logger.info("Neo4j connection closed")
     except Exception as e:
         logger.error(f"Failed to connect or load data: {e}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Load the sample DSPy/RAG knowledge graph into Neo4j.")
+    parser.add_argument(
+        "--embedder",
+        type=str,
+        default=None,
+        help="Also store Concept embeddings, e.g. 'openai:text-embedding-3-small' or 'hashing' (offline)."
+    )
+    parser.add_argument(
+        "--refresh-passages",
+        action="store_true",
+        help="Do not load data; re-materialize the stored passages of the existing graph."
+    )
+    parser.add_argument(
+        "--reset",
+        action="store_true",
+        help="Do not load data; delete every concept and relationship in bounded batches."
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=10000,
+        help="Rows deleted per transaction by --reset."
+    )
+    parser.add_argument(
+        "--rebuild-indexes",
+        action="store_true",
+        help="With --reset, drop constraints and indexes before deleting and recreate them afterwards."
+    )
+    args = parser.parse_args()
+
+    main(args.embedder, passages_only=args.refresh_passages, reset_only=args.reset, batch_size=args.batch_size,
+         rebuild_indexes=args.rebuild_indexes) 
\ No newline at end of file
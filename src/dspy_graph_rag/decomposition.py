@@ -0,0 +1,112 @@
+import re
+
+import dspy
+
+from src.dspy_graph_rag.logging_utils import setup_logger
+
+logger = setup_logger('decomposition')
+
+# Comparative phrasings and the group holding the compared items
+COMPARISON_PATTERNS = [
+    # "differences between A and B", "compare A, B and C", "similarities among ..."
+    re.compile(r"\b(?:differences?|similarities|similarity|comparison|compare|contrast)\s+"
+               r"(?:between|among|of)?\s*(?P<items>.+?)\s*[?.!]*$", re.IGNORECASE),
+    # "how does A differ from B", "how is A compared to B"
+    re.compile(r"\bhow\s+(?:does|do|is|are)\s+(?P<first>.+?)\s+(?:differ|compare[sd]?|contrast)\s+"
+               r"(?:from|to|with|against)\s+(?P<second>.+?)\s*[?.!]*$", re.IGNORECASE),
+    # "A vs B", "A versus B"
+    re.compile(r"^(?:what\s+(?:is|are)\s+)?(?P<first>.+?)\s+(?:vs\.?|versus)\s+(?P<second>.+?)\s*[?.!]*$",
+               re.IGNORECASE),
+]
+
+ITEM_SEPARATOR = re.compile(r"\s*,\s*(?:and\s+|or\s+)?|\s+(?:and|or|with|to|vs\.?|versus)\s+", re.IGNORECASE)
+LEADING_ARTICLE = re.compile(r"^(?:a|an|the)\s+", re.IGNORECASE)
+
+class RuleDecomposer:
+    """
+    Splits comparative questions into one sub-query per compared item.
+
+    Runs locally with regular expressions, so it adds no LM call. The
+    original question is always kept as the first sub-query, so a question
+    without a recognized comparison is retrieved exactly as before.
+    """
+
+    def __init__(self, max_sub_queries=5):
+        self._max_sub_queries = max_sub_queries
+
+    def __call__(self, question):
+        sub_queries = [question]
+        for pattern in COMPARISON_PATTERNS:
+            match = pattern.search(question.strip())
+            if match is None:
+                continue
+            groups = match.groupdict()
+            if groups.get("items"):
+                items = ITEM_SEPARATOR.split(groups["items"])
+            else:
+                items = [groups["first"], groups["second"]]
+            items = [LEADING_ARTICLE.sub("", item.strip(" ?.!")) for item in items if item and item.strip(" ?.!")]
+            if len(items) >= 2:
+                sub_queries.extend(items)
+                break
+        sub_queries = list(dict.fromkeys(sub_queries))[:self._max_sub_queries]
+        logger.debug(f"Decomposed question into {sub_queries}")
+        return sub_queries
+
+class DecomposeQuestion(dspy.Signature):
+    """Break a question into the simpler, self-contained search queries needed to answer it."""
+    question = dspy.InputField(desc="The question to answer")
+    sub_queries: list[str] = dspy.OutputField(
+        desc="Short search queries, one per concept or hop; just the question itself if it is already simple"
+    )
+
+class LMDecomposer(dspy.Module):
+    """Decomposes multi-hop questions with the configured LM (one extra LM call per question)."""
+
+    def __init__(self, max_sub_queries=5):
+        super().__init__()
+        self._max_sub_queries = max_sub_queries
+        self.decompose = dspy.Predict(DecomposeQuestion)
+
+    def _sub_queries(self, question, prediction):
+        sub_queries = [question] + [q.strip() for q in prediction.sub_queries if q and q.strip()]
+        sub_queries = list(dict.fromkeys(sub_queries))[:self._max_sub_queries]
+        logger.debug(f"Decomposed question into {sub_queries}")
+        return sub_queries
+
+    def forward(self, question):
+        return self._sub_queries(question, self.decompose(question=question))
+
+    async def aforward(self, question):
+        return self._sub_queries(question, await self.decompose.acall(question=question))
+
+def get_decomposer(kind):
+    """Builds a decomposer: "rules" (local, no LM call) or "lm"."""
+    if kind == "rules":
+        return RuleDecomposer()
+    if kind == "lm":
+        return LMDecomposer()
+    raise ValueError(f"Unknown decomposer '{kind}', expected 'rules' or 'lm'")
+
+def merge_passages(results):
+    """
+    Merges the passages retrieved for each sub-query.
+
+    Passages are interleaved by rank (every sub-query's best passage first,
+    then every second-best, ...) so each sub-query is represented before the
+    context is trimmed, and duplicates keep their best position.
+
+    Args:
+        results (list[list[dict]]): Passages per sub-query, best first
+
+    Returns:
+        list[dict]: Merged passages
+    """
+    merged = []
+    seen = set()
+    for rank in range(max((len(passages) for passages in results), default=0)):
+        for passages in results:
+            if rank < len(passages) and passages[rank]["text"] not in seen:
+                seen.add(passages[rank]["text"])
+                merged.append(passages[rank])
+    return merged
@@ -0,0 +1,175 @@
+import hashlib
+import os
+import re
+
+import numpy as np
+
+from src.dspy_graph_rag.logging_utils import setup_logger
+
+logger = setup_logger('embeddings')
+
+# Below this many vectors the local index just scans everything
+IVF_MIN_SIZE = 10000
+
+def _normalize(vectors):
+    """L2-normalizes the rows of a 2-D array (zero rows are left as zeros)."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+# --- Embedders ---
+
+class HashingEmbedder:
+    """
+    Deterministic, dependency-free embedder based on feature hashing.
+
+    Word unigrams and bigrams are hashed into a fixed number of signed buckets.
+    It needs no network or model download, so it is suited to tests and local
+    experiments; it captures lexical overlap rather than real semantics.
+    """
+
+    def __init__(self, dimensions=256):
+        self.dimensions = dimensions
+        self.name = f"hashing-{dimensions}"
+
+    def _features(self, text):
+        tokens = re.findall(r"\w+", text.lower())
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def embed(self, texts):
+        """
+        Embeds a list of texts.
+
+        Args:
+            texts (list[str]): Texts to embed
+
+        Returns:
+            np.ndarray: float32 array of shape (len(texts), dimensions), L2-normalized
+        """
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                sign = 1.0 if value & 1 else -1.0
+                vectors[row, (value >> 1) % self.dimensions] += sign
+        return _normalize(vectors)
+
+class OpenAIEmbedder:
+    """Embedder backed by the OpenAI embeddings API."""
+
+    def __init__(self, model="text-embedding-3-small", dimensions=1536, api_key=None, api_base=None, batch_size=256):
+        from openai import OpenAI
+
+        self.dimensions = dimensions
+        self.name = f"openai-{model}-{dimensions}"
+        self._model = model
+        self._batch_size = batch_size
+        self._client = OpenAI(
+            api_key=api_key or os.getenv("OPENAI_API_KEY"),
+            base_url=api_base or os.getenv("OPENAI_API_BASE"),
+        )
+
+    def embed(self, texts):
+        """Embeds texts in API-sized batches; see HashingEmbedder.embed."""
+        vectors = []
+        for start in range(0, len(texts), self._batch_size):
+            batch = texts[start:start + self._batch_size]
+            logger.debug(f"Requesting embeddings for {len(batch)} texts from {self._model}")
+            response = self._client.embeddings.create(model=self._model, input=batch, dimensions=self.dimensions)
+            vectors.extend(item.embedding for item in response.data)
+        if not vectors:
+            return np.zeros((0, self.dimensions), dtype=np.float32)
+        return _normalize(np.asarray(vectors, dtype=np.float32))
+
+def get_embedder(spec):
+    """
+    Builds an embedder from a short spec string.
+
+    Args:
+        spec (str): "hashing", "hashing:<dimensions>", "openai" or "openai:<model>"
+
+    Returns:
+        An object with `name`, `dimensions` and `embed(texts)`
+    """
+    kind, _, option = spec.partition(":")
+    if kind == "hashing":
+        return HashingEmbedder(dimensions=int(option) if option else 256)
+    if kind == "openai":
+        return OpenAIEmbedder(model=option or "text-embedding-3-small")
+    raise ValueError(f"Unknown embedder '{spec}', expected 'hashing[:dims]' or 'openai[:model]'")
+
+# --- Local Vector Index ---
+
+class LocalVectorIndex:
+    """
+    In-memory cosine-similarity index used when Neo4j has no vector index.
+
+    Small collections are searched by brute force. Larger ones get an IVF
+    (inverted file) index: vectors are clustered with k-means and a search only
+    scores the members of the `n_probe` clusters closest to the query.
+    """
+
+    def __init__(self, ids, vectors, n_lists=None, n_probe=8, seed=0):
+        self._ids = list(ids)
+        self._vectors = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(self._ids), -1))
+        self._n_probe = n_probe
+        self._centroids = None
+        if n_lists is None:
+            n_lists = int(np.sqrt(len(self._ids))) if len(self._ids) >= IVF_MIN_SIZE else 0
+        if n_lists > 1:
+            self._train_ivf(n_lists, seed)
+        logger.info(f"Built local vector index over {len(self._ids)} vectors "
+                    f"({'IVF with ' + str(n_lists) + ' lists' if self._centroids is not None else 'brute force'})")
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _assign(self, vectors, chunk_size=65536):
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), chunk_size):
+            chunk = vectors[start:start + chunk_size]
+            assignments[start:start + chunk_size] = np.argmax(chunk @ self._centroids.T, axis=1)
+        return assignments
+
+    def _train_ivf(self, n_lists, seed, iterations=10, sample_per_list=64):
+        rng = np.random.default_rng(seed)
+        n = len(self._vectors)
+        sample = self._vectors[rng.choice(n, size=min(n, n_lists * sample_per_list), replace=False)]
+        self._centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = self._assign(sample)
+            sums = np.zeros_like(self._centroids)
+            np.add.at(sums, assignments, sample)
+            empty = np.bincount(assignments, minlength=n_lists) == 0
+            sums[empty] = self._centroids[empty]
+            self._centroids = _normalize(sums)
+
+        assignments = self._assign(self._vectors)
+        self._list_members = np.argsort(assignments, kind="stable")
+        self._list_offsets = np.searchsorted(assignments[self._list_members], np.arange(n_lists + 1))
+
+    def search(self, query_vector, k):
+        """
+        Finds the k most similar vectors.
+
+        Returns:
+            list[tuple]: (id, cosine similarity) pairs, best first
+        """
+        if not self._ids:
+            return []
+        query = _normalize(np.asarray(query_vector, dtype=np.float32).reshape(1, -1))[0]
+        if self._centroids is None:
+            candidates = np.arange(len(self._ids))
+        else:
+            probe = np.argsort(-(self._centroids @ query))[:self._n_probe]
+            candidates = np.concatenate([
+                self._list_members[self._list_offsets[j]:self._list_offsets[j + 1]] for j in probe
+            ])
+        scores = self._vectors[candidates] @ query
+        k = min(k, len(candidates))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self._ids[candidates[i]], float(scores[i])) for i in top]
@@ -0,0 +1,223 @@
+import argparse
+import csv
+import gzip
+import json
+import os
+import shlex
+import sys
+import time
+
+from src.dspy_graph_rag.bulk_loader import (
+    concept_hash, read_concepts, read_relationships, relationship_hash
+)
+from src.dspy_graph_rag.logging_utils import setup_logger
+
+logger = setup_logger('import_files')
+
+# Headers in the neo4j-admin import format. The Concept ID space resolves
+# relationship endpoints by name; content_hash matches what BulkLoader stores,
+# so a later `bulk_loader --incremental` sync sees imported records as unchanged
+CONCEPT_HEADER = ["name:ID(Concept)", "text", "content_hash"]
+RELATIONSHIP_HEADER = [":START_ID(Concept)", ":END_ID(Concept)", ":TYPE", "content_hash"]
+
+CONCEPT_HEADER_FILE = "concepts_header.csv"
+RELATIONSHIP_HEADER_FILE = "relationships_header.csv"
+MANIFEST_FILE = "manifest.json"
+
+class ShardWriter:
+    """
+    Writes CSV rows to numbered shard files of at most `shard_size` rows.
+
+    Only the open shard is held, so memory stays flat however many rows are
+    written. Shards are named `<prefix>-00000.csv` (`.csv.gz` with compress).
+    """
+
+    def __init__(self, output_dir, prefix, shard_size=1_000_000, compress=False):
+        self._output_dir = output_dir
+        self._prefix = prefix
+        self._shard_size = shard_size
+        self._compress = compress
+        self._file = None
+        self._writer = None
+        self._rows_in_shard = 0
+        self.rows = 0
+        self.paths = []
+        # neo4j-admin must be told when quoted fields span lines
+        self.multiline = False
+
+    def _open_next(self):
+        self.close()
+        path = os.path.join(
+            self._output_dir, f"{self._prefix}-{len(self.paths):05d}.csv" + (".gz" if self._compress else "")
+        )
+        if self._compress:
+            self._file = gzip.open(path, "wt", encoding="utf-8", newline="", compresslevel=1)
+        else:
+            self._file = open(path, "w", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file)
+        self._rows_in_shard = 0
+        self.paths.append(path)
+
+    def write(self, row):
+        if self._writer is None or self._rows_in_shard >= self._shard_size:
+            self._open_next()
+        if not self.multiline:
+            self.multiline = any("\n" in field or "\r" in field for field in row)
+        self._writer.writerow(row)
+        self._rows_in_shard += 1
+        self.rows += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+
+def _write_header(output_dir, filename, header):
+    path = os.path.join(output_dir, filename)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerow(header)
+    return path
+
+def import_command(manifest, database="neo4j"):
+    """Returns the neo4j-admin argument list importing the files described by `manifest`."""
+    args = [
+        "neo4j-admin", "database", "import", "full",
+        "--nodes=Concept=" + ",".join([manifest["concept_header"]] + manifest["concept_files"]),
+    ]
+    if manifest["relationship_files"]:
+        args.append("--relationships=" + ",".join([manifest["relationship_header"]] + manifest["relationship_files"]))
+    # Inputs are streamed without deduplication: repeated concept names are
+    # skipped and relationships to unknown concepts are dropped, as the
+    # transactional loader does. Repeated relationship rows are imported as
+    # parallel relationships, unlike the loader's MERGE
+    args += ["--skip-duplicate-nodes=true", "--skip-bad-relationships=true"]
+    if manifest["multiline_fields"]:
+        args.append("--multiline-fields=true")
+    args += ["--overwrite-destination=true", database]
+    return args
+
+def write_import_files(concepts, relationships=(), output_dir="output/import", shard_size=1_000_000,
+                       compress=False, database="neo4j"):
+    """
+    Writes concepts and relationships as neo4j-admin import CSV files.
+
+    Takes the same Concept and Relationship streams as BulkLoader.load and
+    writes them out while reading, split into shards of `shard_size` rows
+    with the headers in separate files. The importer builds the store
+    offline, bypassing the transaction layer, so it is meant for first-time
+    builds of an empty database. Afterwards start the database and run
+    `data_loader --refresh-passages` to materialize passages and stamp the
+    graph version (the full-text index and embeddings are set up as after a
+    bulk load).
+
+    Args:
+        concepts (Iterable[Concept]): Concepts to write
+        relationships (Iterable[Relationship]): Relationships to write
+        output_dir (str): Directory to write the files to (created if missing)
+        shard_size (int): Rows per data file
+        compress (bool): gzip the data files (neo4j-admin reads .gz directly)
+        database (str): Database name used in the suggested import command
+
+    Returns:
+        dict: The manifest, with file lists, row counts and the import command
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    started = time.monotonic()
+    concept_header = _write_header(output_dir, CONCEPT_HEADER_FILE, CONCEPT_HEADER)
+    relationship_header = _write_header(output_dir, RELATIONSHIP_HEADER_FILE, RELATIONSHIP_HEADER)
+
+    concept_writer = ShardWriter(output_dir, "concepts", shard_size, compress)
+    try:
+        for concept in concepts:
+            concept_writer.write((concept.name, concept.text, concept_hash(concept)))
+            if concept_writer.rows % shard_size == 0:
+                logger.info(f"Wrote {concept_writer.rows:,} concepts")
+    finally:
+        concept_writer.close()
+    logger.info(f"Wrote {concept_writer.rows:,} concepts in {len(concept_writer.paths)} files")
+
+    relationship_writer = ShardWriter(output_dir, "relationships", shard_size, compress)
+    try:
+        for relationship in relationships:
+            relationship_writer.write(
+                (relationship.source, relationship.target, relationship.type, relationship_hash(relationship))
+            )
+            if relationship_writer.rows % shard_size == 0:
+                logger.info(f"Wrote {relationship_writer.rows:,} relationships")
+    finally:
+        relationship_writer.close()
+    logger.info(f"Wrote {relationship_writer.rows:,} relationships in {len(relationship_writer.paths)} files")
+
+    manifest = {
+        "concepts": concept_writer.rows,
+        "relationships": relationship_writer.rows,
+        "concept_header": concept_header,
+        "concept_files": concept_writer.paths,
+        "relationship_header": relationship_header,
+        "relationship_files": relationship_writer.paths,
+        "multiline_fields": concept_writer.multiline or relationship_writer.multiline,
+        "elapsed_s": round(time.monotonic() - started, 1),
+    }
+    manifest["command"] = shlex.join(import_command(manifest, database))
+    with open(os.path.join(output_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def main(concepts_path, relationships_path=None, output_dir="output/import", shard_size=1_000_000, compress=False,
+         database="neo4j"):
+    """Converts concept and relationship files into neo4j-admin import files."""
+    try:
+        manifest = write_import_files(
+            read_concepts(concepts_path),
+            read_relationships(relationships_path) if relationships_path else (),
+            output_dir, shard_size=shard_size, compress=compress, database=database,
+        )
+    except (OSError, ValueError) as e:
+        logger.error(f"Writing import files failed: {e}")
+        return 1
+    print(json.dumps({key: value for key, value in manifest.items() if not isinstance(value, list)}, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Write a Concept graph as neo4j-admin import files for an offline first-time build."
+    )
+    parser.add_argument(
+        "concepts",
+        type=str,
+        help="Concepts file: JSONL with name/text per line or CSV with a name,text header (.gz allowed, '-' for stdin)."
+    )
+    parser.add_argument(
+        "--relationships",
+        type=str,
+        default=None,
+        help="Relationships file: JSONL or CSV with source, type and target (.gz allowed)."
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default="output/import",
+        help="Directory to write the header, data and manifest files to."
+    )
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        default=1_000_000,
+        help="Rows per data file."
+    )
+    parser.add_argument(
+        "--compress",
+        action="store_true",
+        help="gzip the data files."
+    )
+    parser.add_argument(
+        "--database",
+        type=str,
+        default="neo4j",
+        help="Database name used in the suggested neo4j-admin command."
+    )
+    args = parser.parse_args()
+
+    sys.exit(main(args.concepts, args.relationships, args.output, args.shard_size, args.compress, args.database))
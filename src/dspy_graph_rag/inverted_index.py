@@ -0,0 +1,251 @@
+import math
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+
+from src.dspy_graph_rag.data_loader import content_hash, get_graph_version
+from src.dspy_graph_rag.logging_utils import setup_logger
+
+logger = setup_logger('inverted_index')
+
+# Question words and glue that would otherwise match most concepts
+STOPWORDS = frozenset("""
+a an and are as at be between by difference differences do does for from how in is it key of on or the
+to vs what when where which who why with
+""".split())
+
+# Lists every concept with the content hash the loaders store, without its text
+CONCEPT_HASHES_QUERY = "MATCH (c:Concept) RETURN c.name AS name, c.content_hash AS hash"
+
+# Reads the documents of the given concepts
+CONCEPT_TEXTS_QUERY = "UNWIND $names AS name MATCH (c:Concept {name: name}) RETURN c.name AS name, c.text AS text"
+
+# Doc ids are compacted once tombstones make up more than this fraction of them
+COMPACT_FRACTION = 0.25
+
+# Name tokens count this many times more than text tokens
+NAME_WEIGHT = 2
+
+def tokenize(text):
+    """Lowercased word tokens without stopwords."""
+    return [token for token in re.findall(r"\w+", text.lower()) if token not in STOPWORDS]
+
+def document_hash(name, text):
+    """Hash of a concept's indexed content; equals the `content_hash` the loaders store on the Concept."""
+    return content_hash(name, text)
+
+class InvertedIndex:
+    """
+    In-process inverted index over Concept name and text.
+
+    Each token maps to a posting list held as two arrays: document ids (int32)
+    and term frequencies (float32). Searches score documents with sublinear
+    TF-IDF normalized by document length, so the database is only asked to
+    expand the neighborhoods of the top candidates.
+
+    Documents are keyed by Concept name. On a graph version change, refresh()
+    lists the concepts' stored content hashes, reads the text of only those
+    that are new or changed (or carry no hash), and tombstones removed ones.
+    Doc ids are compacted once tombstones pass COMPACT_FRACTION of them.
+    """
+
+    def __init__(self):
+        self._names = []            # doc id -> concept name
+        self._doc_ids = {}          # concept name -> doc id (live docs only)
+        self._hashes = []           # doc id -> content hash
+        self._doc_terms = []        # doc id -> Counter of token frequencies
+        self._norms = np.zeros(0, dtype=np.float32)
+        self._postings = {}         # token -> (doc ids, term frequencies)
+        self._lock = threading.Lock()
+        self.graph_version = None
+
+    @classmethod
+    def build(cls, driver):
+        """Builds an index over every Concept in the graph."""
+        index = cls()
+        index.refresh(driver)
+        return index
+
+    def __len__(self):
+        return len(self._doc_ids)
+
+    def refresh(self, driver, graph_version=None):
+        """
+        Brings the index up to date with the graph.
+
+        Args:
+            driver: Neo4j driver
+            graph_version (int, optional): Known current version; when it equals
+                the indexed version nothing is read
+
+        Returns:
+            dict: Counts of added, updated and removed documents
+        """
+        if graph_version is not None and graph_version == self.graph_version:
+            return {"added": 0, "updated": 0, "removed": 0}
+        with driver.session() as session:
+            graph_version = get_graph_version(session)
+            records = session.run(CONCEPT_HASHES_QUERY)
+            changed, removed = self.diff({record["name"]: record["hash"] for record in records})
+            concepts = {}
+            if changed:
+                records = session.run(CONCEPT_TEXTS_QUERY, names=changed)
+                concepts = {record["name"]: record["text"] or "" for record in records}
+        return self.sync(graph_version, concepts, removed)
+
+    def diff(self, hashes):
+        """
+        Compares the graph's stored content hashes with the indexed documents.
+
+        Args:
+            hashes (dict): concept name -> stored content hash (None when the
+                loader did not store one) for every Concept
+
+        Returns:
+            tuple: (names whose text must be read, names of removed concepts)
+        """
+        with self._lock:
+            changed = [
+                name for name, stored in hashes.items()
+                if stored is None or name not in self._doc_ids or self._hashes[self._doc_ids[name]] != stored
+            ]
+            removed = [name for name in self._doc_ids if name not in hashes]
+        return changed, removed
+
+    def sync(self, graph_version, concepts, removed=()):
+        """
+        Applies the concepts read after diff() and stamps the graph version.
+
+        Args:
+            graph_version (int): Version the hashes were listed at
+            concepts (dict): concept name -> text for the names diff() returned;
+                unchanged documents among them are skipped
+            removed (iterable): names of deleted concepts
+
+        Returns:
+            dict: Counts of added, updated and removed documents
+        """
+        with self._lock:
+            upserts = {
+                name: text for name, text in concepts.items()
+                if name not in self._doc_ids or self._hashes[self._doc_ids[name]] != document_hash(name, text)
+            }
+            summary = self._apply(upserts, removed)
+            self.graph_version = graph_version
+        logger.info(f"Inverted index refreshed to graph version {graph_version}: {summary}")
+        return summary
+
+    def update(self, upserts, removed=()):
+        """
+        Applies document changes.
+
+        Args:
+            upserts (dict): concept name -> text for new or changed concepts
+            removed (iterable): names of deleted concepts
+
+        Returns:
+            dict: Counts of added, updated and removed documents
+        """
+        with self._lock:
+            return self._apply(upserts, removed)
+
+    def _apply(self, upserts, removed):
+        # Caller must hold the lock
+        stale = {}      # token -> doc ids to drop from its posting list
+        fresh = {}      # token -> list of (doc id, tf) to append
+        summary = {"added": 0, "updated": 0, "removed": 0}
+
+        def retire(name):
+            doc_id = self._doc_ids.pop(name)
+            for token in self._doc_terms[doc_id]:
+                stale.setdefault(token, []).append(doc_id)
+            self._doc_terms[doc_id] = Counter()
+
+        for name in removed:
+            if name in self._doc_ids:
+                retire(name)
+                summary["removed"] += 1
+
+        new_norms = []
+        for name, text in upserts.items():
+            if name in self._doc_ids:
+                retire(name)
+                summary["updated"] += 1
+            else:
+                summary["added"] += 1
+            terms = Counter(tokenize(text))
+            for token in tokenize(name):
+                terms[token] += NAME_WEIGHT
+            doc_id = len(self._names)
+            self._names.append(name)
+            self._doc_ids[name] = doc_id
+            self._hashes.append(document_hash(name, text))
+            self._doc_terms.append(terms)
+            new_norms.append(math.sqrt(sum(terms.values())) or 1.0)
+            for token, tf in terms.items():
+                fresh.setdefault(token, []).append((doc_id, tf))
+
+        self._norms = np.concatenate([self._norms, np.asarray(new_norms, dtype=np.float32)])
+        for token in set(stale) | set(fresh):
+            doc_ids, tfs = self._postings.get(token, (np.zeros(0, np.int32), np.zeros(0, np.float32)))
+            if token in stale:
+                keep = ~np.isin(doc_ids, stale[token])
+                doc_ids, tfs = doc_ids[keep], tfs[keep]
+            if token in fresh:
+                added_ids, added_tfs = zip(*fresh[token])
+                doc_ids = np.concatenate([doc_ids, np.asarray(added_ids, dtype=np.int32)])
+                tfs = np.concatenate([tfs, np.asarray(added_tfs, dtype=np.float32)])
+            if len(doc_ids):
+                self._postings[token] = (doc_ids, tfs)
+            else:
+                self._postings.pop(token, None)
+        if len(self._names) - len(self._doc_ids) > COMPACT_FRACTION * len(self._names):
+            self._compact()
+        return summary
+
+    def _compact(self):
+        # Caller must hold the lock. Renumbers live documents densely and drops
+        # the tombstones' names, hashes, terms and norms
+        live = np.asarray(sorted(self._doc_ids.values()), dtype=np.int32)
+        remap = np.full(len(self._names), -1, dtype=np.int32)
+        remap[live] = np.arange(len(live), dtype=np.int32)
+        self._names = [self._names[doc_id] for doc_id in live]
+        self._hashes = [self._hashes[doc_id] for doc_id in live]
+        self._doc_terms = [self._doc_terms[doc_id] for doc_id in live]
+        self._norms = self._norms[live]
+        self._doc_ids = {name: doc_id for doc_id, name in enumerate(self._names)}
+        # Posting lists only hold live documents, so every id has a new one
+        self._postings = {token: (remap[doc_ids], tfs) for token, (doc_ids, tfs) in self._postings.items()}
+        logger.debug(f"Compacted inverted index to {len(live)} documents")
+
+    def search(self, query, k):
+        """
+        Scores concepts against the query.
+
+        Returns:
+            list[tuple]: (concept name, TF-IDF score) pairs, best first
+        """
+        tokens = tokenize(query)
+        with self._lock:
+            live = len(self._doc_ids)
+            if not tokens or not live:
+                return []
+            scores = np.zeros(len(self._names), dtype=np.float32)
+            for token, query_tf in Counter(tokens).items():
+                posting = self._postings.get(token)
+                if posting is None:
+                    continue
+                doc_ids, tfs = posting
+                idf = math.log((live + 1) / (len(doc_ids) + 1)) + 1.0
+                # Posting lists hold each doc at most once, so fancy-index addition is safe
+                scores[doc_ids] += query_tf * (1.0 + np.log(tfs)) * idf
+            scores /= self._norms
+            hits = np.flatnonzero(scores)
+            if not len(hits):
+                return []
+            k = min(k, len(hits))
+            top = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return [(self._names[doc_id], float(scores[doc_id])) for doc_id in top]
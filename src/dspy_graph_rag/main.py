@@ -1,16 +1,82 @@
+import asyncio
 import dspy
+import json
 import os
+import sys
 import argparse
 from dotenv import load_dotenv
 
-from src.dspy_graph_rag.rag_pipeline import GraphRAG, get_neo4j_driver
+from src.dspy_graph_rag.answer_cache import SemanticAnswerCache
+from src.dspy_graph_rag.batch import answer_questions, read_questions
+from src.dspy_graph_rag.cache import RetrievalCache
+from src.dspy_graph_rag.compile import COMPILED_PROGRAM_PATH, load_compiled
+from src.dspy_graph_rag.context_packer import ContextPacker
+from src.dspy_graph_rag.rag_pipeline import GraphRAG, RETRIEVAL_MODES, get_async_neo4j_driver, get_neo4j_driver
+from src.dspy_graph_rag.decomposition import get_decomposer
 from src.dspy_graph_rag.data_loader import load_sample_data  # Optional: For loading data if needed
+from src.dspy_graph_rag.embeddings import get_embedder
+from src.dspy_graph_rag.inverted_index import InvertedIndex
+from src.dspy_graph_rag.single_flight import SingleFlight
 from src.dspy_graph_rag.logging_utils import setup_logger
+from src.dspy_graph_rag.routing import ModelRouter
+from src.dspy_graph_rag.schema import check_schema, ensure_schema, index_usage, schema_status
+from src.dspy_graph_rag.snapshot import SnapshotRetriever
+from src.dspy_graph_rag.tracing import Tracer
 
 logger = setup_logger('main')
 
-def main(question, load_data):
-    """Sets up DSPy, connects to Neo4j, runs the RAG pipeline, and prints the answer."""
+async def run_batch(pipeline_kwargs, batch_input, batch_output=None, concurrency=8, rate=None, use_neo4j=True,
+                    compiled_path=None):
+    """
+    Answers a JSONL file of questions (or stdin for "-") and writes JSONL results.
+
+    The async Neo4j driver is bound to the running event loop, so it and the
+    pipeline using it are created here rather than in main.
+    """
+    async_driver = await get_async_neo4j_driver() if use_neo4j else None
+    input_stream = output_stream = None
+    try:
+        # Duplicate questions in flight at the same time share one computation
+        single_flight = SingleFlight()
+        rag_pipeline = GraphRAG(async_driver=async_driver, single_flight=single_flight, **pipeline_kwargs)
+        try:
+            load_compiled(rag_pipeline, compiled_path)
+        except Exception as e:
+            logger.error(f"Failed to load compiled program from {compiled_path}, using the uncompiled one: {e}")
+        input_stream = sys.stdin if batch_input == "-" else open(batch_input, encoding="utf-8")
+        output_stream = open(batch_output, "w", encoding="utf-8") if batch_output else sys.stdout
+        summary = await answer_questions(
+            rag_pipeline, read_questions(input_stream), output_stream, concurrency=concurrency, rate=rate
+        )
+    finally:
+        if input_stream is not None and input_stream is not sys.stdin:
+            input_stream.close()
+        if output_stream is not None and output_stream is not sys.stdout:
+            output_stream.close()
+        if async_driver:
+            await async_driver.close()
+    # The summary goes to stderr so stdout stays valid JSONL
+    print(f"Answered {summary['questions']} questions ({summary['errors']} errors, {summary['invalid']} invalid lines) "
+          f"in {summary['elapsed_s']}s, {summary['questions_per_s']} questions/s", file=sys.stderr)
+    logger.info(f"Request coalescing: {single_flight.stats()}")
+    return summary
+
+def main(question, load_data, retrieval_mode="contains", embedder_spec=None, snapshot_dir=None,
+         use_inverted_index=False, context_budget=None, answer_cache_path=None, answer_cache_threshold=0.92,
+         batch_input=None, batch_output=None, concurrency=8, rate=None, stream=False, trace_path=None,
+         trace_format="json", decompose=None, compiled_path=COMPILED_PROGRAM_PATH, fast_model=None,
+         route_threshold=0.5, verify_schema=False, retrieval_cache_size=None, retrieval_cache_ttl=300.0):
+    """
+    Sets up DSPy, connects to Neo4j, runs the RAG pipeline, and prints the answer.
+
+    With batch_input, answers every question of a JSONL file (or stdin for "-")
+    instead of `question`; see run_batch. The demos and instructions saved by
+    compile.py are loaded from compiled_path when it exists. Missing
+    constraints and indexes are logged at startup; with verify_schema the
+    schema and the index each retrieval query uses are printed, and the run
+    stops if a required one is missing. With retrieval_cache_size, retrieval
+    results are cached in memory for retrieval_cache_ttl seconds.
+    """
     logger.info("Starting RAG pipeline application")
     
     # Load environment variables
@@ -55,42 +121,173 @@ def main(question, load_data):
         logger.debug(f"Failed configuration details - model: {llm_model}, api_base: {openai_api_base}")
         return
 
-    # 2. Initialize Neo4j Driver
-    logger.info("Initializing Neo4j connection")
-    neo4j_driver = None
-    try:
-        neo4j_driver = get_neo4j_driver()
-    except ValueError as e:
-        logger.error(str(e))
-        return
-    except Exception as e:
-        logger.error(f"An unexpected error occurred connecting to Neo4j: {e}")
+    embedder = None
+    if embedder_spec:
+        try:
+            embedder = get_embedder(embedder_spec)
+            logger.info(f"Using embedder: {embedder.name}")
+        except Exception as e:
+            logger.error(f"Failed to initialize embedder '{embedder_spec}': {e}")
+            return
+    elif retrieval_mode == "vector":
+        logger.error("Retrieval mode 'vector' requires --embedder")
         return
 
+    # 2. Initialize Neo4j Driver (answering from a snapshot needs no database)
+    neo4j_driver = None
+    if snapshot_dir and not load_data:
+        logger.info(f"Answering from graph snapshot {snapshot_dir}, skipping Neo4j connection")
+    else:
+        logger.info("Initializing Neo4j connection")
+        try:
+            neo4j_driver = get_neo4j_driver()
+        except ValueError as e:
+            logger.error(str(e))
+            return
+        except Exception as e:
+            logger.error(f"An unexpected error occurred connecting to Neo4j: {e}")
+            return
+
     # 3. Load Sample Data (Optional)
     if load_data:
         logger.info("Loading sample data into Neo4j")
         try:
-            load_sample_data(neo4j_driver)
+            load_sample_data(neo4j_driver, embedder=embedder)
+            with neo4j_driver.session() as session:
+                ensure_schema(session)
             logger.info("Sample data loaded successfully")
-            print("\nℹ️  Knowledge graph data loaded successfully. Ready to answer questions about DSPy and RAG approaches.")
+            if not batch_input:
+                print("\nℹ️  Knowledge graph data loaded successfully. Ready to answer questions about DSPy and RAG approaches.")
         except Exception as e:
             logger.error(f"Error loading sample data: {e}")
     else:
         logger.info("Running without loading data (use --load-data flag to load/refresh knowledge graph data)")
-        print("\n⚠️  Running without loading data. If you get no results, try running with --load-data flag.")
+        if not batch_input:
+            print("\n⚠️  Running without loading data. If you get no results, try running with --load-data flag.")
+
+    # Check the constraints and indexes retrieval relies on
+    if neo4j_driver:
+        try:
+            with neo4j_driver.session() as session:
+                schema_healthy = check_schema(session)
+                if verify_schema:
+                    report = {"schema": schema_status(session), "queries": index_usage(session)}
+                    print(json.dumps(report, indent=2))
+        except Exception as e:
+            logger.warning(f"Could not check the Neo4j schema: {e}")
+            schema_healthy = not verify_schema
+        if not schema_healthy and verify_schema:
+            logger.error("Required constraints or indexes are missing; run data_loader or schema --create")
+            neo4j_driver.close()
+            return
 
     # 4. Initialize and Run the RAG Pipeline
     logger.info("Initializing RAG pipeline")
-    rag_pipeline = GraphRAG(neo4j_driver=neo4j_driver, k=3) # k=3 context nodes
+    inverted_index = None
+    if neo4j_driver and (use_inverted_index or retrieval_mode == "inverted"):
+        logger.info("Building in-process inverted index over Concept text")
+        try:
+            inverted_index = InvertedIndex.build(neo4j_driver)
+        except Exception as e:
+            logger.error(f"Failed to build inverted index: {e}")
+            return
+    retriever = None
+    if snapshot_dir:
+        try:
+            retriever = SnapshotRetriever(snapshot_dir, k=3)
+        except Exception as e:
+            logger.error(f"Failed to open graph snapshot {snapshot_dir}: {e}")
+            return
+    context_packer = ContextPacker(max_tokens=context_budget, model=llm_model) if context_budget else None
+    answer_cache = None
+    if answer_cache_path:
+        try:
+            # Question similarity only needs lexical overlap, so fall back to the offline embedder
+            answer_cache = SemanticAnswerCache(answer_cache_path, embedder or get_embedder("hashing"),
+                                               similarity_threshold=answer_cache_threshold)
+        except Exception as e:
+            logger.error(f"Failed to open answer cache {answer_cache_path}: {e}")
+            return
+    retrieval_cache = RetrievalCache(retrieval_cache_size, retrieval_cache_ttl) if retrieval_cache_size else None
+    tracer = Tracer() if trace_path else None
+    router = None
+    if fast_model:
+        # LLM_MODEL stays the strong model; simple questions go to the fast one
+        router = ModelRouter(dspy.LM("openai/" + fast_model, **openai_kwargs), strong_lm=lm, threshold=route_threshold)
+        logger.info(f"Routing simple questions to {fast_model}, complex ones to {llm_model}")
+    pipeline_kwargs = dict(neo4j_driver=neo4j_driver, k=3, retrieval_mode=retrieval_mode, embedder=embedder,
+                           retriever=retriever, inverted_index=inverted_index, retrieval_cache=retrieval_cache,
+                           context_packer=context_packer, answer_cache=answer_cache,
+                           tracer=tracer, decomposer=get_decomposer(decompose) if decompose else None,
+                           router=router) # k=3 context nodes
+
+    if batch_input:
+        try:
+            asyncio.run(run_batch(pipeline_kwargs, batch_input, batch_output, concurrency=concurrency, rate=rate,
+                                  use_neo4j=neo4j_driver is not None and retriever is None,
+                                  compiled_path=compiled_path))
+        except Exception as e:
+            logger.error(f"Error during batch execution: {e}")
+    else:
+        rag_pipeline = GraphRAG(**pipeline_kwargs)
+        try:
+            load_compiled(rag_pipeline, compiled_path)
+        except Exception as e:
+            logger.error(f"Failed to load compiled program from {compiled_path}, using the uncompiled one: {e}")
+        answer_question(rag_pipeline, question, lm, context_packer, stream=stream)
+
+    if retrieval_cache:
+        logger.info(f"Retrieval cache stats: {retrieval_cache.stats()}")
+
+    if answer_cache:
+        logger.info(f"Answer cache stats: {answer_cache.stats()}")
+        answer_cache.close()
+
+    if router:
+        logger.info(f"Model routing stats: {router.stats()}")
+
+    if tracer:
+        try:
+            tracer.export(trace_path, trace_format)
+        except Exception as e:
+            logger.error(f"Failed to write latency trace to {trace_path}: {e}")
 
+    # 5. Close Neo4j connection
+    if neo4j_driver:
+        neo4j_driver.close()
+        logger.info("Neo4j connection closed")
+
+def stream_answer(rag_pipeline, question):
+    """Prints the answer to a question token by token as it is generated."""
+    print(f"\nQuestion: {question}")
+    streamed = False
+    for event in rag_pipeline.stream(question):
+        if event["type"] == "retrieval":
+            logger.info(f"Retrieved {len(event['context'])} passages")
+            if event["packing"]:
+                logger.info(f"Context packing: {event['packing']}")
+            print("\nAnswer:")
+        elif event["type"] == "token":
+            print(event["text"], end="", flush=True)
+            streamed = True
+        elif event["type"] == "answer":
+            # Nothing was streamed for cached answers (or when the LM returned a cached completion)
+            print("" if streamed else event["answer"])
+
+def answer_question(rag_pipeline, question, lm, context_packer=None, stream=False):
+    """Answers a single question and prints it."""
     logger.info(f"Processing question: {question}")
     try:
+        if stream:
+            stream_answer(rag_pipeline, question)
+            return
         response = rag_pipeline(question)
         logger.info("Successfully generated response")
         logger.debug(f"Full response: {response}")
         print(f"\nQuestion: {question}")
         print(f"\nAnswer:\n{response.answer}")
+        if context_packer:
+            logger.info(f"Context packing: {response.get('packing')}")
 
     except Exception as e:
         logger.error(f"Error during RAG pipeline execution: {e}")
@@ -100,11 +297,6 @@ def main(question, load_data):
         except Exception as inspect_e:
             logger.error(f"Could not inspect history: {inspect_e}")
 
-    # 5. Close Neo4j connection
-    if neo4j_driver:
-        neo4j_driver.close()
-        logger.info("Neo4j connection closed")
-
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run a DSPy Graph RAG pipeline with Neo4j.")
     parser.add_argument(
@@ -119,6 +311,139 @@ if __name__ == "__main__":
         action="store_true",
         help="Clear existing Neo4j data and load sample data before running."
     )
+    parser.add_argument(
+        "--retrieval-mode",
+        choices=RETRIEVAL_MODES,
+        default="contains",
+        help="How concepts are matched: substring CONTAINS scan, the Concept full-text index, embedding similarity, hybrid (fused lexical, vector and graph ranking) or the in-process inverted index."
+    )
+    parser.add_argument(
+        "--embedder",
+        type=str,
+        default=None,
+        help="Embedder for vector retrieval (and for --load-data), e.g. 'openai:text-embedding-3-small' or 'hashing'."
+    )
+    parser.add_argument(
+        "--snapshot",
+        type=str,
+        default=None,
+        help="Answer from a graph snapshot directory (see snapshot.py) instead of querying Neo4j."
+    )
+    parser.add_argument(
+        "--inverted-index",
+        action="store_true",
+        help="Build an in-process inverted index at startup and use it instead of the CONTAINS fallback scan."
+    )
+    parser.add_argument(
+        "--context-budget",
+        type=int,
+        default=None,
+        help="Deduplicate retrieved passages and trim them to this many prompt tokens before generation."
+    )
+    parser.add_argument(
+        "--answer-cache",
+        type=str,
+        nargs="?",
+        const="output/answer_cache.sqlite3",
+        default=None,
+        help="Reuse answers to similar questions over the same context from this SQLite file (kept across runs)."
+    )
+    parser.add_argument(
+        "--retrieval-cache",
+        type=int,
+        default=None,
+        metavar="SIZE",
+        help="Cache up to SIZE retrieval results in memory; entries are dropped when the graph version changes."
+    )
+    parser.add_argument(
+        "--retrieval-cache-ttl",
+        type=float,
+        default=300.0,
+        help="Seconds a cached retrieval result stays valid."
+    )
+    parser.add_argument(
+        "--answer-cache-threshold",
+        type=float,
+        default=0.92,
+        help="Minimum question embedding cosine similarity for an answer cache hit."
+    )
+    parser.add_argument(
+        "--batch",
+        type=str,
+        default=None,
+        metavar="JSONL",
+        help="Answer every question in this JSONL file ('-' for stdin) instead of --question; "
+             "lines are {\"question\": ...} objects, results are written as JSONL in completion order."
+    )
+    parser.add_argument(
+        "--batch-output",
+        type=str,
+        default=None,
+        help="Write batch results to this file instead of stdout."
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Maximum questions answered at once in batch mode."
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=None,
+        help="Maximum questions started per second in batch mode (token bucket)."
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Print the answer token by token as it is generated."
+    )
+    parser.add_argument(
+        "--trace",
+        type=str,
+        default=None,
+        metavar="PATH",
+        help="Record per-stage latency spans (retrieval, each Cypher query, packing, generation) and write them here."
+    )
+    parser.add_argument(
+        "--trace-format",
+        choices=("json", "otlp"),
+        default="json",
+        help="Trace file format: per-stage latency percentiles, or OTLP/JSON spans and histograms."
+    )
+    parser.add_argument(
+        "--decompose",
+        choices=("rules", "lm"),
+        default=None,
+        help="Split questions into sub-queries retrieved in one batch: comparison rules (no LM call) or the LM."
+    )
+    parser.add_argument(
+        "--compiled",
+        type=str,
+        default=COMPILED_PROGRAM_PATH,
+        help="Compiled program (demos and instructions) saved by compile.py; loaded if the file exists, '' to skip."
+    )
+    parser.add_argument(
+        "--fast-model",
+        type=str,
+        default=None,
+        help="Route simple questions to this model (e.g. 'gpt-4o-mini'); LLM_MODEL answers the complex ones."
+    )
+    parser.add_argument(
+        "--route-threshold",
+        type=float,
+        default=0.5,
+        help="Complexity score (0-1) from which questions go to the strong model."
+    )
+    parser.add_argument(
+        "--check-schema",
+        action="store_true",
+        help="Print the Neo4j constraints and indexes and the index each retrieval query uses; stop if one is missing."
+    )
     args = parser.parse_args()
 
-    main(args.question, args.load_data) 
\ No newline at end of file
+    main(args.question, args.load_data, args.retrieval_mode, args.embedder, args.snapshot, args.inverted_index,
+         args.context_budget, args.answer_cache, args.answer_cache_threshold,
+         args.batch, args.batch_output, args.concurrency, args.rate, args.stream, args.trace, args.trace_format,
+         args.decompose, args.compiled, args.fast_model, args.route_threshold, args.check_schema,
+         args.retrieval_cache, args.retrieval_cache_ttl) 
\ No newline at end of file
@@ -1,124 +1,866 @@
+import asyncio
 import dspy
 import os
-from neo4j import GraphDatabase
+import re
+import threading
+import time
+from collections import defaultdict, namedtuple
+from functools import lru_cache
+from neo4j import AsyncGraphDatabase, GraphDatabase
+from neo4j.exceptions import ClientError
 from dotenv import load_dotenv
+from src.dspy_graph_rag.decomposition import merge_passages
+from src.dspy_graph_rag.data_loader import (
+    FULLTEXT_INDEX_NAME, GRAPH_VERSION_QUERY, PASSAGE_EXPRESSION as RENDERED_PASSAGE, RELATED_TYPES, VECTOR_INDEX_NAME
+)
+from src.dspy_graph_rag.embeddings import LocalVectorIndex
+from src.dspy_graph_rag.inverted_index import CONCEPT_HASHES_QUERY, CONCEPT_TEXTS_QUERY
 from src.dspy_graph_rag.logging_utils import setup_logger
+from src.dspy_graph_rag.ranking import PROXIMITY_TYPES, HybridRanker
+from src.dspy_graph_rag.routing import token_usage
+from src.dspy_graph_rag.tracing import NULL_TRACER
 
 logger = setup_logger('rag_pipeline')
 
+# --- Cypher Queries ---
+
+RETRIEVAL_MODES = ("contains", "fulltext", "vector", "hybrid", "inverted")
+
+# The passage the data loader materialized on `c`, rendered from
+# `related_concepts` only for concepts that have none stored yet
+PASSAGE_EXPRESSION = f"coalesce(c.passage, {RENDERED_PASSAGE})"
+
+# More sophisticated matching with multiple strategies. Expects `query_text`
+# and `clean_query` to be bound, so it can be used per row of a batch.
+CONTAINS_MATCH = """
+MATCH (c:Concept)
+WHERE 
+    // Direct matches in name or text
+    toLower(c.name) CONTAINS toLower(query_text)
+    OR toLower(c.text) CONTAINS toLower(query_text)
+    // Matches with cleaned query
+    OR toLower(c.name) CONTAINS toLower(clean_query)
+    OR toLower(c.text) CONTAINS toLower(clean_query)
+    // Additional matches for specific keywords
+    OR (
+        toLower(query_text) CONTAINS 'dspy' AND 
+        (toLower(c.name) CONTAINS 'dspy' OR toLower(c.text) CONTAINS 'dspy')
+    )
+    OR (
+        toLower(query_text) CONTAINS 'rag' AND 
+        (toLower(c.name) CONTAINS 'rag' OR toLower(c.text) CONTAINS 'rag')
+    )
+WITH c, 
+    // Calculate relevance score based on matches
+    CASE 
+        WHEN toLower(c.name) CONTAINS toLower(query_text) THEN 3
+        WHEN toLower(c.text) CONTAINS toLower(query_text) THEN 2
+        WHEN toLower(c.name) CONTAINS toLower(clean_query) THEN 2
+        WHEN toLower(c.text) CONTAINS toLower(clean_query) THEN 1
+        ELSE 0
+    END as relevance
+"""
+
+# Full-text index lookup; `relevance` is the Lucene (BM25) score of the hit.
+# Expects `lucene_query` to be bound.
+FULLTEXT_MATCH = """
+CALL db.index.fulltext.queryNodes($index_name, lucene_query, {limit: $limit})
+YIELD node AS c, score AS relevance
+"""
+
+# Vector index lookup; `relevance` is the cosine similarity of the hit.
+# Expects `embedding` to be bound.
+VECTOR_MATCH = """
+CALL db.index.vector.queryNodes($vector_index_name, $limit, embedding)
+YIELD node AS c, score AS relevance
+"""
+
+# Candidates ranked in-process (e.g. by the local vector index); the database
+# only resolves them and expands their neighborhood. Expects `candidates`, a
+# list of {name, score} maps, to be bound.
+CANDIDATE_MATCH = """
+UNWIND candidates AS candidate
+MATCH (c:Concept {name: candidate.name})
+WITH c, candidate.score AS relevance
+"""
+
+# Optional: Also get connected nodes for more context. Concepts with a
+# materialized passage are filtered out before the expansion, so they cost no
+# relationship traversal; the subquery aggregates, keeping one row per `c`.
+NEIGHBORHOOD_LOOKUP = """
+CALL {
+    WITH c
+    WITH c WHERE c.passage IS NULL
+    OPTIONAL MATCH (c)-[r]-(related:Concept)
+    WHERE type(r) IN $related_types
+    RETURN collect(DISTINCT related.name) AS related_concepts
+}
+"""
+NEIGHBORHOOD_EXPANSION = NEIGHBORHOOD_LOOKUP + "WITH c, relevance, related_concepts\n"
+
+# Primary matching strategies: name -> (bindings for a single query, bindings
+# for one row of a batch, match clause producing `c` and `relevance`)
+PRIMARY_MATCHES = {
+    "contains": (
+        "WITH $query_text AS query_text, $clean_query AS clean_query",
+        "WITH q, q.query_text AS query_text, q.clean_query AS clean_query",
+        CONTAINS_MATCH,
+    ),
+    "fulltext": (
+        "WITH $lucene_query AS lucene_query",
+        "WITH q, q.lucene_query AS lucene_query WHERE lucene_query IS NOT NULL",
+        FULLTEXT_MATCH,
+    ),
+    "vector": (
+        "WITH $embedding AS embedding",
+        "WITH q, q.embedding AS embedding WHERE embedding IS NOT NULL",
+        VECTOR_MATCH,
+    ),
+    "candidates": (
+        "WITH $candidates AS candidates",
+        "WITH q, q.candidates AS candidates",
+        CANDIDATE_MATCH,
+    ),
+}
+
+PRIMARY_QUERIES = {
+    name: (
+        bindings + match + "WITH c, relevance\nORDER BY relevance DESC\nLIMIT $limit\n" + NEIGHBORHOOD_EXPANSION
+        + "RETURN " + PASSAGE_EXPRESSION + " as result, relevance\nORDER BY relevance DESC"
+    )
+    for name, (bindings, _, match) in PRIMARY_MATCHES.items()
+}
+
+# Fallback query to find any remotely related concepts
+FALLBACK_QUERY = """
+MATCH (c:Concept)
+WHERE ANY(word IN split(toLower($clean_query), ' ')
+    WHERE toLower(c.name) CONTAINS word
+    OR toLower(c.text) CONTAINS word)
+RETURN c.name + ': ' + c.text as result
+LIMIT $limit
+"""
+
+# Fallback for candidates ranked by an in-process inverted index
+INDEXED_FALLBACK_QUERY = """
+UNWIND $candidates AS candidate
+MATCH (c:Concept {name: candidate.name})
+RETURN c.name + ': ' + c.text as result
+ORDER BY candidate.score DESC
+"""
+
+# Batched retrieval: one statement for all queries. The fallback subquery only
+# matches for rows whose primary subquery found nothing, so a miss no longer
+# costs an extra round trip. Each subquery aggregates, so every input row
+# produces exactly one output row, even when nothing matches.
+BATCH_QUERY_TEMPLATE = """
+UNWIND $queries AS q
+CALL {{
+    WITH q
+    {primary_bindings}
+    {primary_match}
+    WITH c, relevance
+    ORDER BY relevance DESC
+    LIMIT $limit
+    {neighborhood_expansion}
+    ORDER BY relevance DESC
+    RETURN collect({passage_expression}) AS primary_results
+}}
+CALL {{
+    WITH q, primary_results
+    WITH q WHERE size(primary_results) = 0
+    {fallback_match}
+    RETURN collect(c.name + ': ' + c.text) AS fallback_results
+}}
+RETURN q.idx AS idx,
+    CASE WHEN size(primary_results) > 0 THEN primary_results ELSE fallback_results END AS results,
+    size(primary_results) = 0 AS used_fallback
+ORDER BY idx
+"""
+
+# Fallback matching per batch row: "scan" is the word-by-word CONTAINS scan,
+# "indexed" resolves candidates an in-process inverted index already ranked
+FALLBACK_MATCHES = {
+    "scan": """
+    MATCH (c:Concept)
+    WHERE ANY(word IN split(toLower(q.clean_query), ' ')
+        WHERE toLower(c.name) CONTAINS word
+        OR toLower(c.text) CONTAINS word)
+    WITH c LIMIT $limit
+    """,
+    "indexed": """
+    UNWIND q.fallback_candidates AS candidate
+    MATCH (c:Concept {name: candidate.name})
+    WITH c, candidate.score AS score
+    ORDER BY score DESC
+    """,
+}
+
+@lru_cache(maxsize=None)
+def batch_query(strategy, fallback="scan"):
+    """Builds the batched statement for a primary matching strategy and fallback kind."""
+    _, row_bindings, match = PRIMARY_MATCHES[strategy]
+    return BATCH_QUERY_TEMPLATE.format(
+        primary_bindings=row_bindings,
+        primary_match=match,
+        neighborhood_expansion=NEIGHBORHOOD_EXPANSION,
+        passage_expression=PASSAGE_EXPRESSION,
+        fallback_match=FALLBACK_MATCHES[fallback],
+    )
+
+# Fallback matching for a batch of queries that had no primary results
+BATCH_FALLBACK_TEMPLATE = """
+UNWIND $queries AS q
+CALL {{
+    WITH q
+    {fallback_match}
+    RETURN collect(c.name + ': ' + c.text) AS results
+}}
+RETURN q.idx AS idx, results
+"""
+
+BATCH_FALLBACK_QUERIES = {
+    fallback: BATCH_FALLBACK_TEMPLATE.format(fallback_match=match)
+    for fallback, match in FALLBACK_MATCHES.items()
+}
+
+# Hybrid candidate generation: lexical hits, optionally unioned with vector
+# hits, returned with everything the in-process ranker needs (stored
+# embedding, proximity neighbors, rendered passage) so that re-ranking costs
+# no further round trips. Single queries are sent as a batch of one.
+HYBRID_QUERY_TEMPLATE = """
+UNWIND $queries AS q
+CALL {{
+    WITH q
+    {lexical_bindings}
+    {lexical_match}
+    WITH c, relevance
+    ORDER BY relevance DESC
+    LIMIT $limit
+    RETURN c, relevance AS lexical_score
+{vector_branch}}}
+WITH q, c, max(lexical_score) AS lexical_score
+{neighborhood_lookup}
+OPTIONAL MATCH (c)-[p]-(neighbor:Concept)
+WHERE type(p) IN $proximity_types
+WITH q, c, lexical_score, related_concepts, collect(DISTINCT neighbor.name) AS proximity_neighbors
+RETURN q.idx AS idx, c.name AS name, {passage_expression} AS result,
+    lexical_score, c.embedding AS embedding, proximity_neighbors
+"""
+
+HYBRID_VECTOR_BRANCH = """    UNION ALL
+    WITH q
+    {vector_bindings}
+    {vector_match}
+    WITH c, relevance
+    ORDER BY relevance DESC
+    LIMIT $limit
+    RETURN c, null AS lexical_score
+"""
+
+@lru_cache(maxsize=None)
+def hybrid_query(lexical, vector=None):
+    """
+    Builds the hybrid candidate statement.
+
+    Args:
+        lexical (str): "fulltext" or "contains"
+        vector (str, optional): "vector" (Neo4j index), "candidates" (local
+            index results passed per row) or None for lexical candidates only
+    """
+    vector_branch = ""
+    if vector is not None:
+        vector_branch = HYBRID_VECTOR_BRANCH.format(
+            vector_bindings=PRIMARY_MATCHES[vector][1],
+            vector_match=PRIMARY_MATCHES[vector][2],
+        )
+    return HYBRID_QUERY_TEMPLATE.format(
+        lexical_bindings=PRIMARY_MATCHES[lexical][1],
+        lexical_match=PRIMARY_MATCHES[lexical][2],
+        vector_branch=vector_branch,
+        neighborhood_lookup=NEIGHBORHOOD_LOOKUP,
+        passage_expression=PASSAGE_EXPRESSION,
+    )
+
+def clean_query_text(query):
+    """Lowercases the query and removes common question words and punctuation."""
+    return query.lower().replace("what is", "").replace("what are", "").replace("how does", "").replace("?", "").strip()
+
+def to_lucene_query(clean_query):
+    """
+    Builds a Lucene query string for the full-text index from a cleaned query.
+
+    Only word characters are kept, so no Lucene syntax needs escaping. The
+    whole phrase is boosted so that exact phrase hits rank above term hits.
+    """
+    terms = re.findall(r"\w+", clean_query.lower())
+    if not terms:
+        return None
+    clauses = [f'"{" ".join(terms)}"^2'] if len(terms) > 1 else []
+    clauses.extend(dict.fromkeys(terms))
+    return " OR ".join(clauses)
+
 # --- Neo4j Retriever Module ---
 
+# Error codes a missing index is reported with. ProcedureCallFailed also covers
+# e.g. unparsable Lucene queries, so there the message has to confirm it
+INDEX_NOT_FOUND_CODE = "Neo.ClientError.Schema.IndexNotFound"
+PROCEDURE_CALL_FAILED_CODE = "Neo.ClientError.Procedure.ProcedureCallFailed"
+
+def is_missing_index(error):
+    """Whether a ClientError says the queried index does not exist, as opposed to a failure of this query."""
+    if error.code == INDEX_NOT_FOUND_CODE:
+        return True
+    message = (error.message or "").lower()
+    return error.code == PROCEDURE_CALL_FAILED_CODE and ("no such" in message or "does not exist" in message)
+
+# A retrieval plan is a generator that yields the work it needs done and is
+# sent the outcome: a Statement is answered with its list of records (or has
+# the driver's ClientError thrown into the plan), an Embed request with the
+# query embeddings. Neo4jRetriever keeps all retrieval logic in plans so that
+# the sync and async APIs drive exactly the same code.
+Statement = namedtuple("Statement", ["label", "query", "params"])
+Embed = namedtuple("Embed", ["texts"])
+
 class Neo4jRetriever(dspy.Retrieve):
-    def __init__(self, neo4j_driver, k=3):
-        logger.info(f"Initializing Neo4jRetriever with k={k}")
+    def __init__(self, neo4j_driver, k=3, mode="contains", cache=None, version_check_interval=5.0, embedder=None,
+                 ranker=None, candidate_multiplier=5, inverted_index=None, async_driver=None, tracer=None):
+        """
+        Args:
+            neo4j_driver: Neo4j driver used for retrieval queries
+            k (int): Default number of passages per query
+            mode (str): One of RETRIEVAL_MODES
+            cache (RetrievalCache, optional): Cache for retrieval results
+            version_check_interval (float): Seconds between graph version checks
+                when a cache or local vector index is in use
+            embedder: Query embedder for "vector" mode (optional in "hybrid");
+                must match the one the data loader used for Concept embeddings
+            ranker (HybridRanker, optional): Ranker for "hybrid" mode
+            candidate_multiplier (int): In "hybrid" mode, candidates fetched per
+                source for every passage returned
+            inverted_index (InvertedIndex, optional): In-process index used for
+                "inverted" mode candidates, and in the other modes in place of
+                the word-by-word CONTAINS fallback scan. It is refreshed when
+                the graph version changes.
+            async_driver: neo4j AsyncDriver used by aforward / aforward_batch
+            tracer (Tracer, optional): Records spans for normalization, each
+                Cypher execution, record fetching and query embedding
+        """
+        logger.info(f"Initializing Neo4jRetriever with k={k}, mode={mode}, cache={'on' if cache else 'off'}")
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode '{mode}', expected one of {RETRIEVAL_MODES}")
+        if mode == "vector" and embedder is None:
+            raise ValueError("Retrieval mode 'vector' requires an embedder")
+        if mode == "inverted" and inverted_index is None:
+            raise ValueError("Retrieval mode 'inverted' requires an inverted_index")
         self._neo4j_driver = neo4j_driver
+        self._async_driver = async_driver
         self._k = k
+        self._mode = mode
+        self._cache = cache
+        self._embedder = embedder
+        self._version_check_interval = version_check_interval
+        self._graph_version = None
+        self._version_checked_at = None
+        # "neo4j" until the database turns out to have no vector index, then "local"
+        self._vector_backend = "neo4j"
+        # Guards the permanent switches of the mode and vector backend
+        self._downgrade_lock = threading.Lock()
+        self._local_index = None
+        self._local_index_version = None
+        self._ranker = ranker or HybridRanker()
+        self._candidate_multiplier = candidate_multiplier
+        self._indexes = None
+        self._indexes_version = None
+        self._inverted_index = inverted_index
+        self._tracer = tracer or NULL_TRACER
         super().__init__()
 
+    # --- Public API ---
+
     def forward(self, query_or_queries, k=None):
         """Search Neo4j for relevant nodes based on the query."""
         logger.info(f"Starting retrieval for query: {query_or_queries}")
         k = k if k is not None else self._k
-        queries = [
-            query_or_queries
-        ] if isinstance(query_or_queries, str) else query_or_queries
-        logger.debug(f"Processing {len(queries)} queries with k={k}")
 
-        results = []
+        if not isinstance(query_or_queries, str):
+            # Lists go through the single round-trip batched path
+            grouped = self.forward_batch(query_or_queries, k=k)
+            results = [result for query_results in grouped for result in query_results]
+            logger.info(f"Retrieval complete. Total results: {len(results)}")
+            return results
+
+        results = self._drive(self._single_plan(query_or_queries, k))
+        logger.info(f"Retrieval complete. Total results: {len(results)}")
+        return results
+
+    def forward_batch(self, queries, k=None):
+        """
+        Retrieve passages for several queries in a single Cypher round trip.
+
+        Args:
+            queries (list[str]): Queries to search for
+            k (int, optional): Passages per query, defaults to the retriever's k
+
+        Returns:
+            list[list[dict]]: Passages for each query, in the order of `queries`
+        """
+        k = k if k is not None else self._k
+        queries = list(queries)
+        if not queries:
+            return []
+        return self._drive(self._batch_plan(queries, k))
+
+    async def aforward(self, query_or_queries, k=None):
+        """Async version of forward, using the async driver."""
+        logger.info(f"Starting async retrieval for query: {query_or_queries}")
+        k = k if k is not None else self._k
+
+        if not isinstance(query_or_queries, str):
+            grouped = await self.aforward_batch(query_or_queries, k=k)
+            results = [result for query_results in grouped for result in query_results]
+            logger.info(f"Retrieval complete. Total results: {len(results)}")
+            return results
+
+        results = await self._adrive(self._single_plan(query_or_queries, k))
+        logger.info(f"Retrieval complete. Total results: {len(results)}")
+        return results
+
+    async def aforward_batch(self, queries, k=None):
+        """Async version of forward_batch, using the async driver."""
+        k = k if k is not None else self._k
+        queries = list(queries)
+        if not queries:
+            return []
+        return await self._adrive(self._batch_plan(queries, k))
+
+    def graph_version(self):
+        """Returns the graph version stamp the retriever currently answers from."""
+        return self._drive(self._graph_version_plan())
+
+    async def agraph_version(self):
+        """Async version of graph_version."""
+        return await self._adrive(self._graph_version_plan())
+
+    # --- Plan drivers ---
+
+    def _log_statement(self, statement):
+        # Log the full query and parameters
+        logger.debug(f"Executing {statement.label} Cypher query:")
+        logger.debug(f"Query:\n{statement.query}")
+        logger.debug(f"Parameters: {statement.params}")
+
+    def _drive(self, plan):
+        """Runs a retrieval plan on a session of the sync driver and returns its result."""
         with self._neo4j_driver.session() as session:
-            for idx, query in enumerate(queries, 1):
-                # Clean the query - remove common question words and punctuation
-                clean_query = query.lower().replace("what is", "").replace("what are", "").replace("how does", "").replace("?", "").strip()
-                logger.debug(f"Processing query {idx}/{len(queries)}: {query}")
-                logger.debug(f"Cleaned query: {clean_query}")
-                
-                # More sophisticated Cypher query with multiple matching strategies
-                cypher_query = """
-                MATCH (c:Concept)
-                WHERE 
-                    // Direct matches in name or text
-                    toLower(c.name) CONTAINS toLower($query_text)
-                    OR toLower(c.text) CONTAINS toLower($query_text)
-                    // Matches with cleaned query
-                    OR toLower(c.name) CONTAINS toLower($clean_query)
-                    OR toLower(c.text) CONTAINS toLower($clean_query)
-                    // Additional matches for specific keywords
-                    OR (
-                        toLower($query_text) CONTAINS 'dspy' AND 
-                        (toLower(c.name) CONTAINS 'dspy' OR toLower(c.text) CONTAINS 'dspy')
-                    )
-                    OR (
-                        toLower($query_text) CONTAINS 'rag' AND 
-                        (toLower(c.name) CONTAINS 'rag' OR toLower(c.text) CONTAINS 'rag')
+            try:
+                request = next(plan)
+                while True:
+                    if isinstance(request, Embed):
+                        with self._tracer.span("embed", texts=len(request.texts)):
+                            outcome = self._embed(request.texts)
+                    else:
+                        self._log_statement(request)
+                        try:
+                            with self._tracer.span(f"cypher:{request.label}"):
+                                result = session.run(request.query, request.params)
+                            with self._tracer.span(f"records:{request.label}") as span:
+                                outcome = list(result)
+                                if span is not None:
+                                    span.attributes["records"] = len(outcome)
+                        except ClientError as e:
+                            request = plan.throw(e)
+                            continue
+                    request = plan.send(outcome)
+            except StopIteration as stop:
+                return stop.value
+
+    async def _adrive(self, plan):
+        """Runs a retrieval plan on a session of the async driver and returns its result."""
+        if self._async_driver is None:
+            raise ValueError("Async retrieval requires an async_driver")
+        async with self._async_driver.session() as session:
+            try:
+                request = next(plan)
+                while True:
+                    if isinstance(request, Embed):
+                        with self._tracer.span("embed", texts=len(request.texts)):
+                            # Embedders are blocking (e.g. an HTTP call); keep them off the event loop
+                            outcome = await asyncio.to_thread(self._embed, request.texts)
+                    else:
+                        self._log_statement(request)
+                        try:
+                            with self._tracer.span(f"cypher:{request.label}"):
+                                result = await session.run(request.query, request.params)
+                            with self._tracer.span(f"records:{request.label}") as span:
+                                outcome = [record async for record in result]
+                                if span is not None:
+                                    span.attributes["records"] = len(outcome)
+                        except ClientError as e:
+                            request = plan.throw(e)
+                            continue
+                    request = plan.send(outcome)
+            except StopIteration as stop:
+                return stop.value
+
+    # --- Retrieval plans ---
+
+    def _single_plan(self, query, k):
+        """Plan for one query: primary match, then the fallback on a miss."""
+        graph_version = None
+        if self._cache is not None:
+            graph_version = yield from self._graph_version_plan()
+            cached = self._cache.get(query, k, graph_version, namespace=self._mode)
+            if cached is not None:
+                logger.info(f"Retrieval cache hit. Total results: {len(cached)}")
+                return cached
+
+        with self._tracer.span("normalize"):
+            clean_query = clean_query_text(query)
+        logger.debug(f"Processing query with k={k}: {query}")
+        logger.debug(f"Cleaned query: {clean_query}")
+        params = {
+            "query_text": query,
+            "clean_query": clean_query,
+            "related_types": RELATED_TYPES,
+            "limit": k
+        }
+        if self._uses_embeddings():
+            params["embedding"] = (yield Embed([query]))[0]
+
+        try:
+            results = yield from self._primary_plan(params)
+            logger.debug(f"Found {len(results)} results for query: {query}")
+            if results:
+                logger.debug("Retrieved passages:")
+                for i, result in enumerate(results, 1):
+                    logger.debug(f"  {i}. {result['text']}")
+            else:
+                logger.warning(f"No results found for query: {query}")
+                logger.debug("Trying fallback query for broader matches...")
+                if self._indexed_fallback():
+                    candidates = yield from self._inverted_candidates_plan(query, k)
+                    fallback_results = yield Statement(
+                        "indexed fallback", INDEXED_FALLBACK_QUERY, dict(params, candidates=candidates)
                     )
-                WITH c, 
-                    // Calculate relevance score based on matches
-                    CASE 
-                        WHEN toLower(c.name) CONTAINS toLower($query_text) THEN 3
-                        WHEN toLower(c.text) CONTAINS toLower($query_text) THEN 2
-                        WHEN toLower(c.name) CONTAINS toLower($clean_query) THEN 2
-                        WHEN toLower(c.text) CONTAINS toLower($clean_query) THEN 1
-                        ELSE 0
-                    END as relevance
-                // Optional: Also get connected nodes for more context
-                OPTIONAL MATCH (c)-[r]-(related:Concept)
-                WHERE type(r) IN ['DIFFERS_FROM', 'IMPROVES_UPON', 'PROVIDES', 'IMPLEMENTS']
-                WITH c, relevance, collect(DISTINCT related.name) as related_concepts
-                RETURN 
-                    CASE
-                        WHEN size(related_concepts) > 0
-                        THEN c.name + ' (related: ' + substring(reduce(s = '', n IN related_concepts | s + ', ' + n), 2) + '): ' + c.text
-                        ELSE c.name + ': ' + c.text
-                    END as result,
-                    relevance
-                ORDER BY relevance DESC
-                LIMIT $limit
-                """
-                params = {
+                else:
+                    fallback_results = yield Statement("fallback", FALLBACK_QUERY, params)
+                results = [{"text": record["result"]} for record in fallback_results]
+                if results:
+                    logger.debug(f"Found {len(results)} results with fallback query")
+                    for i, result in enumerate(results, 1):
+                        logger.debug(f"  {i}. {result['text']}")
+        except Exception as e:
+            logger.error(f"Error executing Neo4j query: {e}")
+            raise
+
+        if self._cache is not None:
+            self._cache.put(query, k, results, graph_version, namespace=self._mode)
+        return results
+
+    def _batch_plan(self, queries, k):
+        """Plan for a list of queries, answered by one batched statement where possible."""
+        logger.debug(f"Processing batch of {len(queries)} queries with k={k}")
+
+        grouped = [[] for _ in queries]
+        pending = list(range(len(queries)))
+        graph_version = None
+        if self._cache is not None:
+            graph_version = yield from self._graph_version_plan()
+            pending = []
+            for idx, query in enumerate(queries):
+                cached = self._cache.get(query, k, graph_version, namespace=self._mode)
+                if cached is None:
+                    pending.append(idx)
+                else:
+                    grouped[idx] = cached
+            logger.debug(f"Retrieval cache answered {len(queries) - len(pending)}/{len(queries)} queries")
+            if not pending:
+                return grouped
+
+        rows = []
+        with self._tracer.span("normalize", queries=len(pending)):
+            for idx in pending:
+                query = queries[idx]
+                clean_query = clean_query_text(query)
+                rows.append({
+                    "idx": idx,
                     "query_text": query,
                     "clean_query": clean_query,
-                    "limit": k
-                }
-                
-                # Log the full query and parameters
-                logger.debug("Executing Cypher query:")
-                logger.debug(f"Query:\n{cypher_query}")
-                logger.debug(f"Parameters: {params}")
-                
+                    "lucene_query": to_lucene_query(clean_query),
+                })
+        if self._mode == "inverted":
+            for row in rows:
+                row["candidates"] = yield from self._inverted_candidates_plan(row["query_text"], k)
+        elif self._indexed_fallback():
+            for row in rows:
+                row["fallback_candidates"] = yield from self._inverted_candidates_plan(row["query_text"], k)
+        if self._uses_embeddings():
+            # One embedding call for the whole batch
+            embeddings = yield Embed([row["query_text"] for row in rows])
+            for row, embedding in zip(rows, embeddings):
+                row["embedding"] = embedding
+        params = {
+            "queries": rows,
+            "related_types": RELATED_TYPES,
+            "index_name": FULLTEXT_INDEX_NAME,
+            "vector_index_name": VECTOR_INDEX_NAME,
+            "limit": k
+        }
+
+        try:
+            batch_results = yield from self._batch_primary_plan(params)
+        except Exception as e:
+            logger.error(f"Error executing batched Neo4j query: {e}")
+            raise
+
+        for idx, texts, used_fallback in batch_results:
+            query_results = [{"text": text} for text in texts]
+            grouped[idx] = query_results
+            query = queries[idx]
+            if self._cache is not None:
+                self._cache.put(query, k, query_results, graph_version, namespace=self._mode)
+            if used_fallback:
+                logger.warning(f"No primary results for query: {query}")
+                logger.debug(f"Found {len(query_results)} results with fallback matching")
+            else:
+                logger.debug(f"Found {len(query_results)} results for query: {query}")
+            for i, result in enumerate(query_results, 1):
+                logger.debug(f"  {i}. {result['text']}")
+        return grouped
+
+    def _graph_version_plan(self):
+        """Returns the graph version stamp, re-reading it at most every version_check_interval seconds."""
+        now = time.monotonic()
+        if self._version_checked_at is None or now - self._version_checked_at >= self._version_check_interval:
+            records = yield Statement("graph version", GRAPH_VERSION_QUERY, {})
+            self._graph_version = records[0]["version"] if records else 0
+            self._version_checked_at = now
+            logger.debug(f"Current graph version: {self._graph_version}")
+        return self._graph_version
+
+    def _available_indexes_plan(self):
+        """Returns the names of online indexes, re-read whenever the graph version changes."""
+        graph_version = yield from self._graph_version_plan()
+        if self._indexes is None or self._indexes_version != graph_version:
+            records = yield Statement(
+                "index listing", "SHOW INDEXES YIELD name, state WHERE state = 'ONLINE' RETURN name", {}
+            )
+            self._indexes = {record["name"] for record in records}
+            self._indexes_version = graph_version
+            logger.debug(f"Online indexes: {sorted(self._indexes)}")
+        return self._indexes
+
+    def _inverted_candidates_plan(self, query, k):
+        """Ranks concepts with the inverted index, refreshing it first if the graph changed."""
+        graph_version = yield from self._graph_version_plan()
+        if self._inverted_index.graph_version != graph_version:
+            records = yield Statement("inverted index hashes", CONCEPT_HASHES_QUERY, {})
+            changed, removed = self._inverted_index.diff({record["name"]: record["hash"] for record in records})
+            concepts = {}
+            if changed:
+                records = yield Statement("inverted index changes", CONCEPT_TEXTS_QUERY, {"names": changed})
+                concepts = {record["name"]: record["text"] or "" for record in records}
+            self._inverted_index.sync(graph_version, concepts, removed)
+        candidates = [{"name": name, "score": score} for name, score in self._inverted_index.search(query, k)]
+        logger.debug(f"Inverted index candidates: {candidates}")
+        return candidates
+
+    def _local_vector_candidates_plan(self, embedding, k):
+        """Ranks concepts against the embedding with the local index, (re)building it for new graph versions."""
+        graph_version = yield from self._graph_version_plan()
+        if self._local_index is None or self._local_index_version != graph_version:
+            logger.info("Building local vector index from stored Concept embeddings")
+            records = yield Statement(
+                "embedding listing",
+                "MATCH (c:Concept) WHERE c.embedding IS NOT NULL RETURN c.name AS name, c.embedding AS embedding",
+                {}
+            )
+            if not records:
+                logger.warning("No Concept embeddings found; run the data loader with --embedder")
+            self._local_index = LocalVectorIndex(
+                [record["name"] for record in records],
+                [record["embedding"] for record in records],
+            )
+            self._local_index_version = graph_version
+        return [{"name": name, "score": score} for name, score in self._local_index.search(embedding, k)]
+
+    def _hybrid_plan(self, rows, k):
+        """
+        Generates candidates in one round trip and re-ranks them with the hybrid ranker.
+
+        Returns:
+            dict: query idx -> list of passages (missing when nothing matched)
+        """
+        indexes = yield from self._available_indexes_plan()
+        candidate_limit = k * self._candidate_multiplier
+        lexical = "fulltext" if FULLTEXT_INDEX_NAME in indexes else "contains"
+        vector = None
+        if self._embedder is not None:
+            vector = "vector" if VECTOR_INDEX_NAME in indexes else "candidates"
+            if vector == "candidates":
+                for i, row in enumerate(rows):
+                    candidates = yield from self._local_vector_candidates_plan(row["embedding"], candidate_limit)
+                    rows[i] = dict(row, candidates=candidates)
+        params = {
+            "queries": rows,
+            "related_types": RELATED_TYPES,
+            "proximity_types": PROXIMITY_TYPES,
+            "index_name": FULLTEXT_INDEX_NAME,
+            "vector_index_name": VECTOR_INDEX_NAME,
+            "limit": candidate_limit
+        }
+        records = yield Statement(f"hybrid ({lexical}, {vector})", hybrid_query(lexical, vector), params)
+
+        candidates = defaultdict(list)
+        for record in records:
+            candidates[record["idx"]].append(record.data())
+        grouped = {}
+        for row in rows:
+            if candidates[row["idx"]]:
+                ranked = self._ranker.rank(candidates[row["idx"]], row.get("embedding"), k)
+                logger.debug(f"Hybrid scores for query {row['idx']}: {[round(score, 4) for _, score in ranked]}")
+                grouped[row["idx"]] = [{"text": candidate["result"], "score": score} for candidate, score in ranked]
+        return grouped
+
+    def _batch_primary_plan(self, params):
+        """
+        Runs the batched query for the configured mode.
+
+        Returns:
+            list[tuple]: (query idx, passage texts, whether the fallback was used)
+        """
+        if self._mode == "hybrid":
+            grouped = yield from self._hybrid_plan(list(params["queries"]), params["limit"])
+            misses = [row for row in params["queries"] if row["idx"] not in grouped]
+            results = [(idx, [passage["text"] for passage in passages], False) for idx, passages in grouped.items()]
+            if misses:
+                fallback = "indexed" if self._indexed_fallback() else "scan"
+                records = yield Statement(
+                    f"batched {fallback} fallback", BATCH_FALLBACK_QUERIES[fallback], dict(params, queries=misses)
+                )
+                results.extend((record["idx"], record["results"], True) for record in records)
+            return results
+
+        mode = self._mode
+        if mode == "fulltext":
+            try:
+                records = yield self._query_statement("fulltext", params, batch=True)
+                return [(record["idx"], record["results"], record["used_fallback"]) for record in records]
+            except ClientError as e:
+                self._fulltext_failed(e)
+                mode = "contains"
+
+        if mode == "vector":
+            records = None
+            if self._vector_backend == "neo4j":
                 try:
-                    records = session.run(cypher_query, params)
-                    # Create passages using text field instead of Passage class
-                    query_results = [{"text": record["result"]} for record in records]
-                    logger.debug(f"Found {len(query_results)} results for query: {query}")
-                    if query_results:
-                        logger.debug("Retrieved passages:")
-                        for i, result in enumerate(query_results, 1):
-                            logger.debug(f"  {i}. {result['text']}")
-                    else:
-                        logger.warning(f"No results found for query: {query}")
-                        logger.debug("Trying fallback query for broader matches...")
-                        # Fallback query to find any remotely related concepts
-                        fallback_query = """
-                        MATCH (c:Concept)
-                        WHERE ANY(word IN split(toLower($clean_query), ' ')
-                            WHERE toLower(c.name) CONTAINS word
-                            OR toLower(c.text) CONTAINS word)
-                        RETURN c.name + ': ' + c.text as result
-                        LIMIT $limit
-                        """
-                        fallback_results = session.run(fallback_query, params)
-                        query_results = [{"text": record["result"]} for record in fallback_results]
-                        if query_results:
-                            logger.debug(f"Found {len(query_results)} results with fallback query")
-                            for i, result in enumerate(query_results, 1):
-                                logger.debug(f"  {i}. {result['text']}")
-                    results.extend(query_results)
-                except Exception as e:
-                    logger.error(f"Error executing Neo4j query: {e}")
-                    raise
+                    records = yield self._query_statement("vector", params, batch=True)
+                except ClientError as e:
+                    self._vector_index_failed(e)
+            if records is None:
+                rows = []
+                for row in params["queries"]:
+                    candidates = yield from self._local_vector_candidates_plan(row["embedding"], params["limit"])
+                    rows.append(dict(row, candidates=candidates))
+                records = yield self._query_statement("candidates", dict(params, queries=rows), batch=True)
+            return [(record["idx"], record["results"], record["used_fallback"]) for record in records]
 
-        logger.info(f"Retrieval complete. Total results: {len(results)}")
-        return results
+        strategy = "candidates" if mode == "inverted" else "contains"
+        records = yield self._query_statement(strategy, params, batch=True)
+        return [(record["idx"], record["results"], record["used_fallback"]) for record in records]
+
+    def _primary_plan(self, params):
+        """Runs the primary matching query for the configured mode."""
+        if self._mode == "hybrid":
+            row = dict(params, idx=0, lucene_query=to_lucene_query(params["clean_query"]))
+            grouped = yield from self._hybrid_plan([row], params["limit"])
+            return grouped.get(0, [])
+
+        mode = self._mode
+        if mode == "fulltext":
+            lucene_query = to_lucene_query(params["clean_query"])
+            if lucene_query is None:
+                logger.debug("Cleaned query has no searchable terms, skipping full-text lookup")
+                return []
+            fulltext_params = dict(params, index_name=FULLTEXT_INDEX_NAME, lucene_query=lucene_query)
+            try:
+                records = yield self._query_statement("fulltext", fulltext_params)
+                return [{"text": record["result"], "score": record["relevance"]} for record in records]
+            except ClientError as e:
+                self._fulltext_failed(e)
+                mode = "contains"
+
+        if mode == "vector":
+            if self._vector_backend == "neo4j":
+                vector_params = dict(params, vector_index_name=VECTOR_INDEX_NAME)
+                try:
+                    records = yield self._query_statement("vector", vector_params)
+                    return [{"text": record["result"], "score": record["relevance"]} for record in records]
+                except ClientError as e:
+                    self._vector_index_failed(e)
+            candidates = yield from self._local_vector_candidates_plan(params["embedding"], params["limit"])
+            records = yield self._query_statement("candidates", dict(params, candidates=candidates))
+            return [{"text": record["result"], "score": record["relevance"]} for record in records]
+
+        if mode == "inverted":
+            candidates = yield from self._inverted_candidates_plan(params["query_text"], params["limit"])
+            records = yield self._query_statement("candidates", dict(params, candidates=candidates))
+            return [{"text": record["result"], "score": record["relevance"]} for record in records]
+
+        records = yield self._query_statement("contains", params)
+        # Passages carry the match score, e.g. for routing on the score distribution
+        return [{"text": record["result"], "score": record["relevance"]} for record in records]
+
+    # --- Helpers ---
+
+    def _fulltext_failed(self, error):
+        """
+        Handles a failed full-text query, which the caller answers with CONTAINS matching.
+
+        Only a missing index (run the data loader) switches the retriever to
+        CONTAINS for good; other errors affect the failed query alone.
+        """
+        if not is_missing_index(error):
+            logger.warning(f"Full-text query failed, falling back to CONTAINS matching for this query: {error}")
+            return
+        with self._downgrade_lock:
+            if self._mode == "fulltext":
+                logger.warning(f"Full-text index is missing, using CONTAINS matching from now on: {error}")
+                self._mode = "contains"
+
+    def _vector_index_failed(self, error):
+        """
+        Handles a failed vector index query, which the caller answers with the local vector index.
+
+        Only a missing index switches the retriever to the local index for
+        good; other errors affect the failed query alone.
+        """
+        if not is_missing_index(error):
+            logger.warning(f"Vector index query failed, falling back to a local vector index for this query: {error}")
+            return
+        with self._downgrade_lock:
+            if self._vector_backend == "neo4j":
+                logger.warning(f"Vector index is missing, using a local vector index from now on: {error}")
+                self._vector_backend = "local"
+
+    def _query_statement(self, strategy, params, batch=False):
+        """Builds the single or batched statement for a primary matching strategy."""
+        if batch:
+            fallback = "indexed" if self._indexed_fallback() else "scan"
+            return Statement(f"batched {strategy}", batch_query(strategy, fallback), params)
+        return Statement(strategy, PRIMARY_QUERIES[strategy], params)
+
+    def _indexed_fallback(self):
+        """Whether misses are resolved with the inverted index instead of the CONTAINS scan."""
+        return self._inverted_index is not None and self._mode != "inverted"
+
+    def _uses_embeddings(self):
+        return self._mode == "vector" or (self._mode == "hybrid" and self._embedder is not None)
+
+    def _embed(self, texts):
+        """Embeds query texts as plain lists so they can be sent as Cypher parameters."""
+        return [vector.tolist() for vector in self._embedder.embed(texts)]
 
 # --- DSPy Signature and Module ---
 
@@ -129,46 +871,330 @@ class GraphQA(dspy.Signature):
     answer = dspy.OutputField(desc="Detailed, graph-informed response based on the provided context")
 
 class GraphRAG(dspy.Module):
-    def __init__(self, neo4j_driver, k=3):
-        logger.info(f"Initializing GraphRAG with k={k}")
+    def __init__(self, neo4j_driver, k=3, retrieval_mode="contains", retrieval_cache=None, embedder=None,
+                 retriever=None, inverted_index=None, async_driver=None, context_packer=None, answer_cache=None,
+                 tracer=None, decomposer=None, single_flight=None, router=None):
+        logger.info(f"Initializing GraphRAG with k={k}, retrieval_mode={retrieval_mode}")
         super().__init__()
-        self.retrieve = Neo4jRetriever(neo4j_driver=neo4j_driver, k=k)
+        # Any dspy.Retrieve returning [{"text": ...}] passages can stand in, e.g. a SnapshotRetriever
+        # Optional Tracer recording per-stage latency spans
+        self.tracer = tracer or NULL_TRACER
+        self.retrieve = retriever or Neo4jRetriever(
+            neo4j_driver=neo4j_driver, k=k, mode=retrieval_mode, cache=retrieval_cache, embedder=embedder,
+            inverted_index=inverted_index, async_driver=async_driver, tracer=tracer
+        )
+        # Optional ContextPacker applied between retrieval and generation
+        self.context_packer = context_packer
+        # Optional SemanticAnswerCache consulted before generation
+        self.answer_cache = answer_cache
+        # Optional decomposer (see decomposition.py) splitting questions into sub-queries
+        # that are retrieved together and merged
+        self.decomposer = decomposer
+        # Optional SingleFlight sharing one computation between concurrent identical questions
+        self.single_flight = single_flight
+        # Optional ModelRouter choosing a fast or strong LM per question
+        self.router = router
         self.generate = dspy.ChainOfThought(GraphQA)
         logger.debug("GraphRAG initialization complete")
 
-    def forward(self, question):
-        logger.info(f"Processing question: {question}")
-        
+    def dump_state(self, json_mode=True):
+        # Only the predictors (demos and instructions) are tuned by compilation; the
+        # retriever is configured at runtime from the command line
+        return {name: predictor.dump_state(json_mode=json_mode) for name, predictor in self.named_predictors()}
+
+    def load_state(self, state, *, allow_unsafe_lm_state=False):
+        for name, predictor in self.named_predictors():
+            if name in state:
+                predictor.load_state(state[name], allow_unsafe_lm_state=allow_unsafe_lm_state)
+            else:
+                logger.warning(f"No saved state for predictor '{name}', keeping its defaults")
+        return self
+
+    def _pack(self, context):
+        """Packs the context into the packer's token budget; returns it with the packing report (or None)."""
+        if self.context_packer is None or not context:
+            return context, None
+        with self.tracer.span("pack", passages=len(context)):
+            return self.context_packer.pack(context)
+
+    def _retrieve(self, question):
+        """Retrieves passages, for all sub-queries in one batch when a decomposer is set."""
+        if self.decomposer is None:
+            return self.retrieve(question)
+        with self.tracer.span("decompose"):
+            sub_queries = self.decomposer(question)
+        if len(sub_queries) == 1:
+            return self.retrieve(sub_queries[0])
+        logger.info(f"Retrieving {len(sub_queries)} sub-queries: {sub_queries}")
+        if hasattr(self.retrieve, "forward_batch"):
+            # One session and one Cypher round trip for all sub-queries
+            return merge_passages(self.retrieve.forward_batch(sub_queries))
+        return merge_passages([self.retrieve(sub_query) for sub_query in sub_queries])
+
+    async def _aretrieve_one(self, question):
+        if hasattr(self.retrieve, "aforward"):
+            return await self.retrieve.aforward(question)
+        # Retrievers without an async path (e.g. SnapshotRetriever) run in a worker thread
+        return await asyncio.to_thread(self.retrieve, question)
+
+    async def _aretrieve(self, question):
+        """Async version of _retrieve; retrievers without a batch path get their sub-queries concurrently."""
+        if self.decomposer is None:
+            return await self._aretrieve_one(question)
+        with self.tracer.span("decompose"):
+            if hasattr(self.decomposer, "acall"):
+                sub_queries = await self.decomposer.acall(question)
+            else:
+                sub_queries = self.decomposer(question)
+        if len(sub_queries) == 1:
+            return await self._aretrieve_one(sub_queries[0])
+        logger.info(f"Retrieving {len(sub_queries)} sub-queries: {sub_queries}")
+        if hasattr(self.retrieve, "aforward_batch"):
+            return merge_passages(await self.retrieve.aforward_batch(sub_queries))
+        results = await asyncio.gather(*(self._aretrieve_one(sub_query) for sub_query in sub_queries))
+        return merge_passages(results)
+
+    def _graph_version(self):
+        graph_version = getattr(self.retrieve, "graph_version", None)
+        return graph_version() if callable(graph_version) else None
+
+    async def _agraph_version(self):
+        if hasattr(self.retrieve, "agraph_version"):
+            return await self.retrieve.agraph_version()
+        return await asyncio.to_thread(self._graph_version)
+
+    def _cached_prediction(self, question, context, graph_version):
+        """Returns a prediction from the answer cache, or None on a miss."""
+        with self.tracer.span("answer_cache.get"):
+            fields = self.answer_cache.get(question, context, graph_version)
+        if fields is None:
+            return None
+        logger.info("Answered from the answer cache")
+        return dspy.Prediction(**fields)
+
+    def _cache_prediction(self, question, context, prediction, graph_version):
+        fields = {key: value for key, value in prediction.items() if isinstance(value, (str, int, float, bool))}
+        with self.tracer.span("answer_cache.put"):
+            self.answer_cache.put(question, context, fields, graph_version)
+
+    def _no_context_prediction(self, question):
+        logger.warning("No context found in knowledge graph")
+        return dspy.Prediction(
+            context=[],
+            question=question,
+            answer="I apologize, but I couldn't find any relevant information in the knowledge graph to answer your question. "
+                  "Please make sure the knowledge graph has been loaded with data (use --load-data flag) and try asking about DSPy, "
+                  "traditional RAG approaches, or their comparisons."
+        )
+
+    def _route(self, question, context):
+        # Routed on the retrieved passages, whose scores the packer does not keep
+        return self.router.route(question, context) if self.router is not None and context else None
+
+    def _generate(self, question, context, route):
+        if route is None:
+            return self.generate(context=context, question=question)
+        return self.router.generate(self.generate, route, context=context, question=question)
+
+    async def _agenerate(self, question, context, route):
+        if route is None:
+            return await self.generate.acall(context=context, question=question)
+        return await self.router.agenerate(self.generate, route, context=context, question=question)
+
+    def _prepare(self, question):
+        """
+        Retrieves and packs the context, picks the generation route and consults the answer cache.
+
+        Returns:
+            tuple: (context, packing report, graph version, prediction when no
+                generation is needed, i.e. no context or an answer cache hit,
+                Route or None)
+        """
         # Retrieve relevant passages
         logger.debug("Starting context retrieval")
-        context = self.retrieve(question)
+        with self.tracer.span("retrieve"):
+            context = self._retrieve(question)
         logger.debug(f"Retrieved {len(context)} passages for context")
         
         if not context:
-            logger.warning("No context found in knowledge graph")
-            return dspy.Prediction(
-                context=[],
-                question=question,
-                answer="I apologize, but I couldn't find any relevant information in the knowledge graph to answer your question. "
-                      "Please make sure the knowledge graph has been loaded with data (use --load-data flag) and try asking about DSPy, "
-                      "traditional RAG approaches, or their comparisons."
-            )
-        
-        # Generate answer
-        logger.debug("Generating answer using ChainOfThought")
+            return context, None, None, self._no_context_prediction(question), None
+        route = self._route(question, context)
+        context, packing = self._pack(context)
+
+        graph_version = None
+        prediction = None
+        if self.answer_cache is not None:
+            graph_version = self._graph_version()
+            prediction = self._cached_prediction(question, context, graph_version)
+        return context, packing, graph_version, prediction, route
+
+    async def _aprepare(self, question):
+        """Async version of _prepare."""
+        logger.debug("Starting async context retrieval")
+        with self.tracer.span("retrieve"):
+            context = await self._aretrieve(question)
+        logger.debug(f"Retrieved {len(context)} passages for context")
+
+        if not context:
+            return context, None, None, self._no_context_prediction(question), None
+        route = self._route(question, context)
+        context, packing = self._pack(context)
+
+        graph_version = None
+        prediction = None
+        if self.answer_cache is not None:
+            graph_version = await self._agraph_version()
+            # SQLite lookups block, keep them off the event loop
+            prediction = await asyncio.to_thread(self._cached_prediction, question, context, graph_version)
+        return context, packing, graph_version, prediction, route
+
+    def _finish(self, question, context, packing, graph_version, prediction):
+        """Caches a freshly generated prediction and attaches the packing report."""
+        logger.info("Successfully generated answer")
+        logger.debug(f"Generated answer: {prediction.answer}")
+        if self.answer_cache is not None:
+            self._cache_prediction(question, context, prediction, graph_version)
+        if packing is not None:
+            prediction.packing = packing
+        return prediction
+
+    def forward(self, question):
+        if self.single_flight is not None:
+            return self.single_flight.do(question, self._forward, question)
+        return self._forward(question)
+
+    def _forward(self, question):
+        logger.info(f"Processing question: {question}")
+        with self.tracer.span("graphrag"):
+            context, packing, graph_version, prediction, route = self._prepare(question)
+            if prediction is not None:
+                if packing is not None:
+                    prediction.packing = packing
+                return prediction
+            
+            # Generate answer
+            logger.debug("Generating answer using ChainOfThought")
+            try:
+                with self.tracer.span("generate"):
+                    prediction = self._generate(question, context, route)
+            except Exception as e:
+                logger.error(f"Error during answer generation: {e}")
+                raise
+            return self._finish(question, context, packing, graph_version, prediction)
+
+    async def aforward(self, question):
+        """Async version of forward; call it through `await graph_rag.acall(question)`."""
+        if self.single_flight is not None:
+            return await self.single_flight.ado(question, self._aforward, question)
+        return await self._aforward(question)
+
+    async def _aforward(self, question):
+        logger.info(f"Processing question asynchronously: {question}")
+        with self.tracer.span("graphrag"):
+            context, packing, graph_version, prediction, route = await self._aprepare(question)
+            if prediction is not None:
+                if packing is not None:
+                    prediction.packing = packing
+                return prediction
+
+            logger.debug("Generating answer using ChainOfThought (async)")
+            try:
+                with self.tracer.span("generate"):
+                    prediction = await self._agenerate(question, context, route)
+            except Exception as e:
+                logger.error(f"Error during answer generation: {e}")
+                raise
+            return await self._afinish(question, context, packing, graph_version, prediction)
+
+    async def _afinish(self, question, context, packing, graph_version, prediction):
+        if self.answer_cache is None:
+            return self._finish(question, context, packing, graph_version, prediction)
+        # SQLite writes block, keep them off the event loop
+        return await asyncio.to_thread(self._finish, question, context, packing, graph_version, prediction)
+
+    # --- Streaming ---
+    #
+    # stream() / astream() yield JSON-serializable events, so they can be
+    # forwarded as-is by a web endpoint (e.g. as server-sent events):
+    #   {"type": "retrieval", "question", "context", "packing"}  first
+    #   {"type": "token", "text"}                                 answer chunks as the LM produces them
+    #   {"type": "answer", "answer", "reasoning", "cached"}       last, with the complete prediction
+
+    def _retrieval_event(self, question, context, packing):
+        return {"type": "retrieval", "question": question, "context": [p["text"] for p in context], "packing": packing}
+
+    def _answer_event(self, prediction, cached):
+        return {"type": "answer", "answer": prediction.answer, "reasoning": prediction.get("reasoning"), "cached": cached}
+
+    async def _astream_answer(self, question, context, packing, graph_version, route=None):
+        """Streams the ChainOfThought answer field, then yields the final answer event."""
+        stream_generate = dspy.streamify(
+            self.generate,
+            stream_listeners=[dspy.streaming.StreamListener(signature_field_name="answer")],
+        )
+        prediction = None
+        # Generation time excludes the time consumers spend between tokens
+        generating = 0.0
+        lm_kwargs = {"lm": route.lm} if route is not None and route.lm is not None else {}
+        chunks = stream_generate(context=context, question=question, **lm_kwargs)
         try:
-            prediction = self.generate(context=context, question=question)
-            logger.info("Successfully generated answer")
-            logger.debug(f"Generated answer: {prediction.answer}")
-            return prediction
+            # The generation task starts on the first chunk and inherits usage tracking from here
+            with dspy.context(track_usage=True):
+                while True:
+                    started = time.perf_counter()
+                    try:
+                        chunk = await chunks.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    finally:
+                        generating += time.perf_counter() - started
+                    if isinstance(chunk, dspy.streaming.StreamResponse):
+                        yield {"type": "token", "text": chunk.chunk}
+                    elif isinstance(chunk, dspy.Prediction):
+                        prediction = chunk
         except Exception as e:
             logger.error(f"Error during answer generation: {e}")
             raise
+        # A span cannot stay open across the yields above, so the duration is recorded afterwards
+        self.tracer.record("generate", generating, streamed=True, **token_usage(prediction))
+        if route is not None:
+            self.router.record(route, generating, prediction)
+        prediction = await self._afinish(question, context, packing, graph_version, prediction)
+        # LM cache hits are not streamed; the answer event still carries the full text
+        yield self._answer_event(prediction, cached=False)
+
+    def stream(self, question):
+        """
+        Answers the question as a generator of events (see above).
+
+        Retrieval runs in the caller's thread; generation is streamed from a
+        background event loop.
+        """
+        logger.info(f"Streaming answer to question: {question}")
+        context, packing, graph_version, prediction, route = self._prepare(question)
+        yield self._retrieval_event(question, context, packing)
+        if prediction is not None:
+            yield self._answer_event(prediction, cached=bool(context))
+            return
+        yield from dspy.streaming.apply_sync_streaming(
+            self._astream_answer(question, context, packing, graph_version, route)
+        )
+
+    async def astream(self, question):
+        """Async version of stream."""
+        logger.info(f"Streaming answer to question asynchronously: {question}")
+        context, packing, graph_version, prediction, route = await self._aprepare(question)
+        yield self._retrieval_event(question, context, packing)
+        if prediction is not None:
+            yield self._answer_event(prediction, cached=bool(context))
+            return
+        async for event in self._astream_answer(question, context, packing, graph_version, route):
+            yield event
 
 # --- Helper function to initialize Neo4j Driver ---
 
-def get_neo4j_driver():
-    """Initializes and returns the Neo4j driver."""
+def get_neo4j_driver(**config):
+    """Initializes and returns the Neo4j driver; `config` is passed on, e.g. max_connection_pool_size."""
     logger.info("Initializing Neo4j driver")
     load_dotenv()
     uri = os.getenv("NEO4J_URI")
@@ -180,10 +1206,31 @@ def get_neo4j_driver():
         raise ValueError("Neo4j credentials not found in .env file.")
 
     try:
-        driver = GraphDatabase.driver(uri, auth=(user, password))
+        driver = GraphDatabase.driver(uri, auth=(user, password), **config)
         driver.verify_connectivity()
         logger.info("Successfully connected to Neo4j for RAG pipeline")
         return driver
     except Exception as e:
         logger.error(f"Failed to connect to Neo4j: {e}")
-        raise 
\ No newline at end of file
+        raise 
+
+async def get_async_neo4j_driver():
+    """Initializes and returns an async Neo4j driver for GraphRAG.aforward."""
+    logger.info("Initializing async Neo4j driver")
+    load_dotenv()
+    uri = os.getenv("NEO4J_URI")
+    user = os.getenv("NEO4J_USERNAME")
+    password = os.getenv("NEO4J_PASSWORD")
+
+    if not all([uri, user, password]):
+        logger.error("Neo4j credentials not found in .env file")
+        raise ValueError("Neo4j credentials not found in .env file.")
+
+    try:
+        driver = AsyncGraphDatabase.driver(uri, auth=(user, password))
+        await driver.verify_connectivity()
+        logger.info("Successfully connected to Neo4j for async RAG pipeline")
+        return driver
+    except Exception as e:
+        logger.error(f"Failed to connect to Neo4j: {e}")
+        raise
@@ -0,0 +1,167 @@
+import numpy as np
+
+from src.dspy_graph_rag.logging_utils import setup_logger
+
+logger = setup_logger('ranking')
+
+# Relationship types that signal two concepts are about the same comparison
+PROXIMITY_TYPES = ['DIFFERS_FROM', 'IMPROVES_UPON']
+
+def rank_descending(scores):
+    """
+    Ranks scores from best (1) to worst; equal scores share the best rank.
+
+    Args:
+        scores (np.ndarray): 1-D scores, NaN meaning "not ranked by this signal"
+
+    Returns:
+        np.ndarray: float ranks, NaN where the score is NaN
+    """
+    ranks = np.full(scores.shape, np.nan)
+    valid = ~np.isnan(scores)
+    if valid.any():
+        sorted_negated = np.sort(-scores[valid])
+        ranks[valid] = np.searchsorted(sorted_negated, -scores[valid], side="left") + 1
+    return ranks
+
+def reciprocal_rank_fusion(signals, weights=None, rrf_k=60):
+    """
+    Fuses several rankings of the same candidates with reciprocal rank fusion.
+
+    Each signal contributes weight / (rrf_k + rank) for the candidates it ranks;
+    candidates a signal does not rank (NaN) get nothing from it.
+
+    Args:
+        signals (np.ndarray): (n_signals, n_candidates) scores, higher is better
+        weights (sequence, optional): Per-signal weights, defaults to all ones
+        rrf_k (int): Damping constant; larger values flatten rank differences
+
+    Returns:
+        np.ndarray: fused score per candidate
+    """
+    signals = np.atleast_2d(np.asarray(signals, dtype=np.float64))
+    weights = np.ones(len(signals)) if weights is None else np.asarray(weights, dtype=np.float64)
+    ranks = np.vstack([rank_descending(row) for row in signals])
+    contributions = weights[:, None] / (rrf_k + ranks)
+    return np.nansum(contributions, axis=0)
+
+def personalized_pagerank(num_nodes, sources, targets, seed_weights, alpha=0.85, iterations=20):
+    """
+    Personalized PageRank over an undirected edge list.
+
+    Args:
+        num_nodes (int): Number of nodes, ids are 0..num_nodes-1
+        sources, targets (np.ndarray): Edge endpoints (each edge is used both ways)
+        seed_weights (np.ndarray): Non-negative restart distribution over nodes
+        alpha (float): Probability of following an edge instead of restarting
+        iterations (int): Power iterations
+
+    Returns:
+        np.ndarray: stationary probability per node
+    """
+    seed = np.asarray(seed_weights, dtype=np.float64)
+    seed = seed / seed.sum() if seed.sum() > 0 else np.full(num_nodes, 1.0 / max(num_nodes, 1))
+    src = np.concatenate([sources, targets]).astype(np.int64)
+    dst = np.concatenate([targets, sources]).astype(np.int64)
+    out_degree = np.bincount(src, minlength=num_nodes).astype(np.float64)
+    dangling = out_degree == 0
+    scores = seed.copy()
+    for _ in range(iterations):
+        spread = np.zeros(num_nodes)
+        if len(src):
+            np.add.at(spread, dst, scores[src] / out_degree[src])
+        # Mass on nodes without edges restarts at the seeds
+        spread += scores[dangling].sum() * seed
+        scores = (1 - alpha) * seed + alpha * spread
+    return scores
+
+def _normalize_scores(scores):
+    """Scales scores to [0, 1], keeping NaN; a constant row becomes all ones."""
+    valid = ~np.isnan(scores)
+    if not valid.any():
+        return scores
+    low, high = np.nanmin(scores), np.nanmax(scores)
+    if high == low:
+        return np.where(valid, 1.0, np.nan)
+    return (scores - low) / (high - low)
+
+class HybridRanker:
+    """
+    Re-ranks retrieval candidates by fusing lexical, vector and graph signals.
+
+    The lexical signal is the score of the matching query (BM25 or CONTAINS
+    relevance). The vector signal is the cosine similarity between the query
+    embedding and the stored Concept embedding. The graph signal is the mass
+    a candidate receives from the other candidates under personalized PageRank
+    over PROXIMITY_TYPES edges. The three rankings are combined with
+    reciprocal rank fusion.
+    """
+
+    def __init__(self, weights=(1.0, 1.0, 0.5), rrf_k=60, alpha=0.85, iterations=20):
+        self._weights = np.asarray(weights, dtype=np.float64)
+        self._rrf_k = rrf_k
+        self._alpha = alpha
+        self._iterations = iterations
+
+    def rank(self, candidates, query_embedding=None, k=3):
+        """
+        Ranks candidates for one query.
+
+        Args:
+            candidates (list[dict]): Rows with name, lexical_score (may be None),
+                embedding (may be None) and proximity_neighbors
+            query_embedding (sequence, optional): Embedding of the query
+            k (int): Number of candidates to keep
+
+        Returns:
+            list[tuple]: (candidate, fused score) pairs, best first
+        """
+        n = len(candidates)
+        if n == 0:
+            return []
+
+        lexical = np.array([
+            np.nan if c["lexical_score"] is None else c["lexical_score"] for c in candidates
+        ], dtype=np.float64)
+
+        vector = np.full(n, np.nan)
+        if query_embedding is not None:
+            query = np.asarray(query_embedding, dtype=np.float64)
+            query = query / (np.linalg.norm(query) or 1.0)
+            rows = [i for i, c in enumerate(candidates) if c["embedding"] is not None]
+            if rows:
+                matrix = np.asarray([candidates[i]["embedding"] for i in rows], dtype=np.float64)
+                norms = np.linalg.norm(matrix, axis=1)
+                norms[norms == 0] = 1.0
+                vector[rows] = (matrix @ query) / norms
+
+        proximity = self._graph_proximity(candidates, lexical, vector)
+
+        fused = reciprocal_rank_fusion(np.vstack([lexical, vector, proximity]), self._weights, self._rrf_k)
+        order = np.argsort(-fused, kind="stable")[:k]
+        logger.debug(f"Hybrid ranking kept {len(order)} of {n} candidates")
+        return [(candidates[i], float(fused[i])) for i in order]
+
+    def _graph_proximity(self, candidates, lexical, vector):
+        """Mass each candidate receives from the other seed hits under personalized PageRank."""
+        node_ids = {c["name"]: i for i, c in enumerate(candidates)}
+        sources, targets = [], []
+        for i, c in enumerate(candidates):
+            for neighbor in c["proximity_neighbors"]:
+                # Neighbors outside the candidate set still act as bridges
+                j = node_ids.setdefault(neighbor, len(node_ids))
+                sources.append(i)
+                targets.append(j)
+        n = len(candidates)
+        if not sources:
+            return np.full(n, np.nan)
+
+        seed_scores = np.fmax(_normalize_scores(lexical), _normalize_scores(vector))
+        seed = np.zeros(len(node_ids))
+        seed[:n] = np.nan_to_num(seed_scores, nan=0.0) + 1e-3
+        scores = personalized_pagerank(
+            len(node_ids), np.asarray(sources), np.asarray(targets), seed, self._alpha, self._iterations
+        )
+        # Remove each seed's own restart mass so only support from neighbors counts
+        seed = seed / seed.sum()
+        return scores[:n] - (1 - self._alpha) * seed[:n]
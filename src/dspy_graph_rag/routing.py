@@ -0,0 +1,158 @@
+import threading
+import time
+from collections import namedtuple
+
+import dspy
+
+from src.dspy_graph_rag.logging_utils import setup_logger
+from src.dspy_graph_rag.tracing import LatencyHistogram
+
+logger = setup_logger('routing')
+
+def token_usage(prediction):
+    """Returns prompt and completion token totals over all LMs of a prediction made with usage tracking."""
+    usage = (prediction.get_lm_usage() if prediction is not None else None) or {}
+    totals = {"prompt_tokens": 0, "completion_tokens": 0}
+    for model_usage in usage.values():
+        for key in totals:
+            totals[key] += model_usage.get(key) or 0
+    return totals
+
+# A routing decision: route name ("fast" or "strong"), the LM to generate
+# with (None for the configured default) and the complexity score behind it
+Route = namedtuple("Route", ["name", "lm", "complexity"])
+
+class ComplexityClassifier:
+    """
+    Scores question complexity in [0, 1] from features that cost nothing to compute.
+
+    The score is a weighted sum of
+      - question length: long questions tend to ask for more than one fact,
+      - score spread: how evenly the retrieval scores are spread over the
+        passages, 0 when one passage dominates (a lookup) and 1 when all
+        score alike (the answer must be synthesized from several). When a
+        passage has no score (fallback matches) the feature is left out and
+        the other weights are rescaled to sum to the same total,
+      - passage count: more passages (e.g. from decomposition) mean more to
+        reconcile.
+    It is plain arithmetic over a handful of numbers, a few microseconds per
+    question.
+    """
+
+    def __init__(self, long_question_words=25, many_passages=6, weights=(0.35, 0.4, 0.25)):
+        self._long_question_words = long_question_words
+        self._many_passages = many_passages
+        self._weights = weights
+
+    def features(self, question, context):
+        """Returns (question words, passage count, score spread); the spread is None when a score is missing."""
+        words = len(question.split())
+        scores = [passage.get("score") for passage in context]
+        if not scores:
+            spread = 0.0
+        elif any(score is None for score in scores):
+            spread = None
+        elif len(scores) == 1:
+            spread = 0.0
+        else:
+            # Scores are compared within one retrieval mode only, so shifting
+            # them to be non-negative keeps the ordering that matters
+            low = min(scores)
+            shifted = [score - low for score in scores] if low < 0 else scores
+            total = sum(shifted)
+            top_share = max(shifted) / total if total > 0 else 1 / len(scores)
+            # 1 - top share, rescaled so equal scores give 1 for any passage count
+            spread = (1 - top_share) / (1 - 1 / len(scores))
+        return words, len(context), spread
+
+    def __call__(self, question, context):
+        words, passages, spread = self.features(question, context)
+        length_weight, spread_weight, passages_weight = self._weights
+        scale = 1.0
+        if spread is None:
+            total = length_weight + spread_weight + passages_weight
+            scale = total / (length_weight + passages_weight)
+            spread, spread_weight = 0.0, 0.0
+        return scale * (
+            length_weight * min(words / self._long_question_words, 1.0)
+            + spread_weight * spread
+            + passages_weight * min(passages / self._many_passages, 1.0)
+        )
+
+class ModelRouter:
+    """
+    Routes GraphQA generation to a fast or a strong LM by question complexity.
+
+    Questions scoring below `threshold` go to `fast_lm`, the others to
+    `strong_lm` (the configured default LM when None). Latency, LM calls and
+    token usage are tracked per route.
+    """
+
+    def __init__(self, fast_lm, strong_lm=None, threshold=0.5, classifier=None):
+        self._routes = {"fast": fast_lm, "strong": strong_lm}
+        self._threshold = threshold
+        self._classifier = classifier or ComplexityClassifier()
+        self._lock = threading.Lock()
+        self._latency = {name: LatencyHistogram() for name in self._routes}
+        self._tokens = {name: {"prompt_tokens": 0, "completion_tokens": 0} for name in self._routes}
+        # Nanoseconds, recorded into a microsecond histogram so percentiles keep sub-microsecond detail
+        self._classify_ns = LatencyHistogram()
+
+    def route(self, question, context):
+        """Classifies the question and returns its Route."""
+        started = time.perf_counter_ns()
+        complexity = self._classifier(question, context)
+        elapsed = time.perf_counter_ns() - started
+        name = "fast" if complexity < self._threshold else "strong"
+        with self._lock:
+            self._classify_ns.record(elapsed)
+        logger.debug(f"Routing question to the {name} model (complexity {complexity:.3f})")
+        return Route(name, self._routes[name], complexity)
+
+    def _lm_kwargs(self, route):
+        return {} if route.lm is None else {"lm": route.lm}
+
+    def generate(self, program, route, **kwargs):
+        """Calls `program` (e.g. the GraphQA ChainOfThought) with the route's LM and records its usage."""
+        started = time.perf_counter()
+        with dspy.context(track_usage=True):
+            prediction = program(**kwargs, **self._lm_kwargs(route))
+        self.record(route, time.perf_counter() - started, prediction)
+        return prediction
+
+    async def agenerate(self, program, route, **kwargs):
+        """Async version of generate."""
+        started = time.perf_counter()
+        with dspy.context(track_usage=True):
+            prediction = await program.acall(**kwargs, **self._lm_kwargs(route))
+        self.record(route, time.perf_counter() - started, prediction)
+        return prediction
+
+    def record(self, route, seconds, prediction=None):
+        """Records one generation on `route`; token usage is read from the prediction when tracked."""
+        usage = token_usage(prediction)
+        with self._lock:
+            self._latency[route.name].record(seconds * 1e6)
+            for key, tokens in usage.items():
+                self._tokens[route.name][key] += tokens
+
+    def stats(self):
+        """Returns per-route request counts, latency percentiles and token totals, and classifier cost."""
+        with self._lock:
+            routes = {}
+            for name, histogram in self._latency.items():
+                lm = self._routes[name]
+                routes[name] = {
+                    "model": getattr(lm, "model", None) or "default",
+                    **histogram.summary(),
+                    **self._tokens[name],
+                }
+            return {
+                "threshold": self._threshold,
+                "routes": routes,
+                "classify_us": {
+                    "count": self._classify_ns.count,
+                    "p50": self._classify_ns.percentile(50) / 1000,
+                    "p99": self._classify_ns.percentile(99) / 1000,
+                },
+            }
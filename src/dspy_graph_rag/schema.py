@@ -0,0 +1,330 @@
+import argparse
+import json
+import re
+import sys
+import time
+from collections import namedtuple
+
+from dotenv import load_dotenv
+from neo4j.exceptions import Neo4jError
+
+from src.dspy_graph_rag.data_loader import (
+    FULLTEXT_INDEX_NAME, GRAPH_META_LABEL, GRAPH_VERSION_QUERY, RELATED_TYPES, VECTOR_INDEX_NAME,
+    create_fulltext_index
+)
+from src.dspy_graph_rag.logging_utils import setup_logger
+from src.dspy_graph_rag.rag_pipeline import (
+    FALLBACK_QUERY, INDEXED_FALLBACK_QUERY, PRIMARY_QUERIES, batch_query, get_neo4j_driver, hybrid_query
+)
+from src.dspy_graph_rag.ranking import PROXIMITY_TYPES
+
+logger = setup_logger('schema')
+
+# --- Declarations ---
+
+# Unique Concept names: every MERGE in the loaders, every lookup by name and
+# the keyset pagination over names (c.name > $after ORDER BY c.name) use the
+# range index backing this constraint
+CONCEPT_NAME_CONSTRAINT = "concept_name_unique"
+# Plain range index on Concept.name, used only when the constraint cannot be
+# created because stored names are not unique
+CONCEPT_NAME_INDEX = "concept_name"
+# The graph version stamp is read on every retrieval plan
+GRAPH_META_CONSTRAINT = "graph_meta_key"
+
+SchemaItem = namedtuple("SchemaItem", ["name", "kind", "required"])
+
+# What the retriever and loaders rely on; the vector index exists only once
+# embeddings are stored (see data_loader.store_concept_embeddings)
+SCHEMA = (
+    SchemaItem(CONCEPT_NAME_CONSTRAINT, "constraint", True),
+    SchemaItem(GRAPH_META_CONSTRAINT, "constraint", True),
+    SchemaItem(FULLTEXT_INDEX_NAME, "fulltext index", True),
+    SchemaItem(VECTOR_INDEX_NAME, "vector index", False),
+)
+
+CONSTRAINT_STATEMENTS = {
+    CONCEPT_NAME_CONSTRAINT:
+        f"CREATE CONSTRAINT {CONCEPT_NAME_CONSTRAINT} IF NOT EXISTS FOR (c:Concept) REQUIRE c.name IS UNIQUE",
+    GRAPH_META_CONSTRAINT:
+        f"CREATE CONSTRAINT {GRAPH_META_CONSTRAINT} IF NOT EXISTS FOR (m:{GRAPH_META_LABEL}) REQUIRE m.key IS UNIQUE",
+}
+
+# Range indexes on Concept.name not owned by a constraint; the constraint
+# cannot be created while one exists
+STANDALONE_NAME_INDEXES = """
+SHOW INDEXES YIELD name, type, labelsOrTypes, properties, owningConstraint
+WHERE type = 'RANGE' AND labelsOrTypes = ['Concept'] AND properties = ['name'] AND owningConstraint IS NULL
+RETURN name
+"""
+
+# Any repeated Concept name, which would make the uniqueness constraint fail
+DUPLICATE_CONCEPT_NAME = """
+MATCH (c:Concept)
+WITH c.name AS name, count(*) AS copies WHERE copies > 1
+RETURN name LIMIT 1
+"""
+
+# --- Bootstrap ---
+
+def ensure_constraints(session, timeout=300):
+    """
+    Creates the Concept name and graph version constraints and waits for their indexes.
+
+    A standalone index on Concept.name (as older loaders created) is
+    replaced by the uniqueness constraint. Neo4j refuses the constraint
+    while that index exists, so stored names are checked for duplicates
+    before it is dropped, and it is recreated if the constraint still
+    fails. Without a constraint a plain range index is kept, so lookups by
+    name stay index seeks, and a warning is logged.
+
+    Args:
+        session: Neo4j session
+        timeout (int): Seconds to wait for index population
+
+    Returns:
+        bool: Whether Concept names are unique-constrained, which makes
+            concurrent MERGEs on them safe
+    """
+    unique_names = True
+    constraints = {record["name"] for record in session.run("SHOW CONSTRAINTS YIELD name")}
+    if CONCEPT_NAME_CONSTRAINT not in constraints:
+        duplicate = session.run(DUPLICATE_CONCEPT_NAME).single()
+        if duplicate is not None:
+            logger.warning(f"Concept name {duplicate['name']!r} is not unique, "
+                           f"indexing names instead of creating constraint '{CONCEPT_NAME_CONSTRAINT}'")
+            unique_names = False
+        else:
+            for record in list(session.run(STANDALONE_NAME_INDEXES)):
+                logger.info(f"Replacing index '{record['name']}' with constraint '{CONCEPT_NAME_CONSTRAINT}'")
+                session.run(f"DROP INDEX `{record['name']}` IF EXISTS").consume()
+            try:
+                session.run(CONSTRAINT_STATEMENTS[CONCEPT_NAME_CONSTRAINT]).consume()
+                logger.info(f"Created constraint '{CONCEPT_NAME_CONSTRAINT}'")
+            except Neo4jError as e:
+                # Duplicates written since the check surface as a DatabaseError
+                # (ConstraintCreationFailed), not a ClientError
+                logger.warning(f"Could not create constraint '{CONCEPT_NAME_CONSTRAINT}', indexing names instead: {e}")
+                unique_names = False
+        if not unique_names and not list(session.run(STANDALONE_NAME_INDEXES)):
+            session.run(f"CREATE INDEX {CONCEPT_NAME_INDEX} IF NOT EXISTS FOR (c:Concept) ON (c.name)").consume()
+    if GRAPH_META_CONSTRAINT not in constraints:
+        try:
+            session.run(CONSTRAINT_STATEMENTS[GRAPH_META_CONSTRAINT]).consume()
+            logger.info(f"Created constraint '{GRAPH_META_CONSTRAINT}'")
+        except Neo4jError as e:
+            logger.warning(f"Could not create constraint '{GRAPH_META_CONSTRAINT}': {e}")
+    wait_for_indexes(session, timeout=timeout)
+    return unique_names
+
+def ensure_schema(session, timeout=300):
+    """
+    Creates the constraints and the full-text index the retriever and loaders rely on and waits until they are online.
+
+    Loaders writing many concepts call ensure_constraints before writing
+    and create the full-text index afterwards instead, so the writes do not
+    pay for full-text index maintenance.
+
+    Returns:
+        bool: Whether Concept names are unique-constrained
+    """
+    unique_names = ensure_constraints(session, timeout=timeout)
+    create_fulltext_index(session, timeout=timeout)
+    wait_for_indexes(session, timeout=timeout)
+    return unique_names
+
+def wait_for_indexes(session, timeout=300, poll_interval=1.0):
+    """
+    Waits until every index is online, logging population progress.
+
+    Raises:
+        RuntimeError: If an index failed to populate
+        TimeoutError: If indexes are still populating after `timeout` seconds
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        records = list(session.run(
+            "SHOW INDEXES YIELD name, type, state, populationPercent WHERE type <> 'LOOKUP' "
+            "RETURN name, state, populationPercent"
+        ))
+        failed = [record["name"] for record in records if record["state"] == "FAILED"]
+        if failed:
+            raise RuntimeError(f"Index population failed for {', '.join(failed)}; see SHOW INDEXES for the reason")
+        populating = [record for record in records if record["state"] != "ONLINE"]
+        if not populating:
+            logger.info(f"All {len(records)} indexes are online")
+            return
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"Indexes still populating after {timeout}s: "
+                               + ", ".join(record["name"] for record in populating))
+        logger.info("Populating indexes: " + ", ".join(
+            f"{record['name']} {record['populationPercent'] or 0:.0f}%" for record in populating
+        ))
+        time.sleep(poll_interval)
+
+def schema_status(session):
+    """
+    Returns the state of every SCHEMA item.
+
+    Returns:
+        list[dict]: name, kind, required and state ("ONLINE", "POPULATING",
+            "FAILED" or "missing"; a constraint reports its backing index)
+    """
+    states = {record["name"]: record["state"] for record in session.run("SHOW INDEXES YIELD name, state")}
+    owners = {
+        record["name"]: states.get(record["ownedIndex"], "missing")
+        for record in session.run("SHOW CONSTRAINTS YIELD name, ownedIndex")
+    }
+    return [
+        {
+            "name": item.name,
+            "kind": item.kind,
+            "required": item.required,
+            "state": (owners if item.kind == "constraint" else states).get(item.name, "missing"),
+        }
+        for item in SCHEMA
+    ]
+
+def check_schema(session):
+    """
+    Logs missing or offline schema items.
+
+    Returns:
+        bool: Whether every required item is online
+    """
+    healthy = True
+    for item in schema_status(session):
+        if item["state"] == "ONLINE":
+            continue
+        if item["required"]:
+            healthy = False
+            logger.warning(f"{item['kind'].capitalize()} '{item['name']}' is {item['state']}; "
+                           "run data_loader to create the schema")
+        else:
+            logger.info(f"Optional {item['kind']} '{item['name']}' is {item['state']}")
+    return healthy
+
+# --- Query plans ---
+
+# Retrieval statements of rag_pipeline and the indexes they are meant to use.
+# The CONTAINS strategies match on toLower(c.name) and toLower(c.text), which
+# no index can serve, so they scan every Concept; full-text retrieval is the
+# indexed alternative.
+RETRIEVAL_QUERIES = {
+    "contains": (PRIMARY_QUERIES["contains"], ()),
+    "fulltext": (PRIMARY_QUERIES["fulltext"], (FULLTEXT_INDEX_NAME,)),
+    "vector": (PRIMARY_QUERIES["vector"], (VECTOR_INDEX_NAME,)),
+    "candidates": (PRIMARY_QUERIES["candidates"], (CONCEPT_NAME_CONSTRAINT,)),
+    "fallback": (FALLBACK_QUERY, ()),
+    "indexed fallback": (INDEXED_FALLBACK_QUERY, (CONCEPT_NAME_CONSTRAINT,)),
+    "batch contains": (batch_query("contains"), ()),
+    "batch fulltext": (batch_query("fulltext"), (FULLTEXT_INDEX_NAME,)),
+    "batch candidates": (batch_query("candidates", "indexed"), (CONCEPT_NAME_CONSTRAINT,)),
+    "hybrid": (hybrid_query("fulltext", "vector"), (FULLTEXT_INDEX_NAME, VECTOR_INDEX_NAME)),
+    "graph version": (GRAPH_VERSION_QUERY, (GRAPH_META_CONSTRAINT,)),
+}
+
+# Placeholder parameters; EXPLAIN only plans the statement
+EXPLAIN_PARAMS = {
+    "query_text": "", "clean_query": "", "lucene_query": "", "embedding": [0.0], "candidates": [], "queries": [],
+    "limit": 3, "related_types": RELATED_TYPES, "proximity_types": list(PROXIMITY_TYPES),
+    "index_name": FULLTEXT_INDEX_NAME, "vector_index_name": VECTOR_INDEX_NAME,
+}
+
+# Label and property in the details of an index operator, e.g. "UNIQUE c:Concept(name) WHERE ..."
+INDEX_TARGET_PATTERN = re.compile(r":`?(\w+)`?\(`?(\w+)`?\)")
+
+def _plan_operators(plan):
+    """Yields (operator type, details) for every operator of an EXPLAIN plan."""
+    yield plan["operatorType"].split("@")[0], str(plan.get("args", {}).get("Details", ""))
+    for child in plan.get("children", ()):
+        yield from _plan_operators(child)
+
+def index_usage(session):
+    """
+    Plans every retrieval statement with EXPLAIN and reports the indexes and scans it uses.
+
+    Returns:
+        list[dict]: Per statement its name, the indexes it uses and is
+            expected to use, its label and all-node scans, and `ok` when
+            every expected index is used
+    """
+    indexes = {
+        (tuple(record["labelsOrTypes"] or ()), tuple(record["properties"] or ())): record["name"]
+        for record in session.run("SHOW INDEXES YIELD name, labelsOrTypes, properties")
+    }
+    report = []
+    for name, (query, expected) in RETRIEVAL_QUERIES.items():
+        used, scans = [], []
+        plan = session.run("EXPLAIN " + query, EXPLAIN_PARAMS).consume().plan
+        for operator, details in _plan_operators(plan):
+            if operator == "ProcedureCall":
+                if "db.index.fulltext.queryNodes" in details:
+                    used.append(FULLTEXT_INDEX_NAME)
+                elif "db.index.vector.queryNodes" in details:
+                    used.append(VECTOR_INDEX_NAME)
+            elif "Index" in operator:
+                target = INDEX_TARGET_PATTERN.search(details)
+                key = ((target.group(1),), (target.group(2),)) if target else None
+                used.append(indexes.get(key, details))
+            elif operator in ("NodeByLabelScan", "AllNodesScan"):
+                scans.append(f"{operator} {details}".strip())
+        used = list(dict.fromkeys(used))
+        report.append({
+            "query": name,
+            "indexes": used,
+            "expected": list(expected),
+            "scans": scans,
+            "ok": set(expected) <= set(used),
+        })
+    return report
+
+def log_index_usage(report):
+    for entry in report:
+        uses = ", ".join(entry["indexes"]) or "no index"
+        scans = f"; scans: {', '.join(entry['scans'])}" if entry["scans"] else ""
+        if entry["ok"]:
+            logger.info(f"Query '{entry['query']}' uses {uses}{scans}")
+        else:
+            logger.warning(f"Query '{entry['query']}' uses {uses}{scans}, expected {', '.join(entry['expected'])}")
+
+def main(create=False, timeout=300):
+    """Checks (or with create, bootstraps) the schema and prints which retrieval queries use which index."""
+    load_dotenv()
+    try:
+        driver = get_neo4j_driver()
+    except Exception as e:
+        logger.error(f"Failed to connect to Neo4j: {e}")
+        return 1
+    try:
+        with driver.session() as session:
+            if create:
+                ensure_schema(session, timeout=timeout)
+            healthy = check_schema(session)
+            report = {"schema": schema_status(session), "queries": index_usage(session)}
+    except Exception as e:
+        logger.error(f"Schema check failed: {e}")
+        return 1
+    finally:
+        driver.close()
+    print(json.dumps(report, indent=2))
+    return 0 if healthy else 1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check the Neo4j constraints and indexes and report which retrieval queries use them."
+    )
+    parser.add_argument(
+        "--create",
+        action="store_true",
+        help="Create missing constraints and indexes first and wait for them to come online."
+    )
+    parser.add_argument(
+        "--timeout",
+        type=int,
+        default=300,
+        help="Seconds to wait for index population."
+    )
+    args = parser.parse_args()
+
+    sys.exit(main(args.create, args.timeout))
@@ -0,0 +1,365 @@
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+
+import dspy
+from dotenv import load_dotenv
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+from src.dspy_graph_rag.answer_cache import SemanticAnswerCache
+from src.dspy_graph_rag.cache import RetrievalCache
+from src.dspy_graph_rag.compile import COMPILED_PROGRAM_PATH, load_compiled
+from src.dspy_graph_rag.context_packer import ContextPacker
+from src.dspy_graph_rag.decomposition import get_decomposer
+from src.dspy_graph_rag.embeddings import get_embedder
+from src.dspy_graph_rag.logging_utils import setup_logger
+from src.dspy_graph_rag.rag_pipeline import RETRIEVAL_MODES, GraphRAG, get_neo4j_driver
+from src.dspy_graph_rag.routing import ModelRouter
+from src.dspy_graph_rag.single_flight import SingleFlight
+from src.dspy_graph_rag.tracing import Tracer
+
+logger = setup_logger('server')
+
+class ServiceUnavailable(Exception):
+    """The service cannot take the question right now (starting, draining or saturated)."""
+
+class GraphRAGService:
+    """
+    Keeps the LM, one pooled Neo4j driver and a GraphRAG program warm between requests.
+
+    The service moves through the states "starting" -> "ready" -> "draining"
+    -> "stopped". Questions are only accepted while ready; at most
+    `max_concurrency` are answered at once, further requests wait up to
+    `queue_timeout` seconds for a slot. With `coalesce`, concurrent requests
+    for the same question share one retrieval and LM call.
+    """
+
+    def __init__(self, retrieval_mode="contains", embedder_spec=None, context_budget=None, answer_cache_path=None,
+                 compiled_path=COMPILED_PROGRAM_PATH, decompose=None, max_concurrency=16, queue_timeout=30.0,
+                 coalesce=True, fast_model=None, route_threshold=0.5, retrieval_cache_size=None,
+                 retrieval_cache_ttl=300.0):
+        self._retrieval_mode = retrieval_mode
+        self._embedder_spec = embedder_spec
+        self._context_budget = context_budget
+        self._answer_cache_path = answer_cache_path
+        self._compiled_path = compiled_path
+        self._decompose = decompose
+        self._fast_model = fast_model
+        self._route_threshold = route_threshold
+        self._max_concurrency = max_concurrency
+        self._queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._served = 0
+        self._failed = 0
+        self.state = "starting"
+        self.lm = None
+        self.driver = None
+        self.answer_cache = None
+        self.retrieval_cache = (
+            RetrievalCache(retrieval_cache_size, retrieval_cache_ttl) if retrieval_cache_size else None
+        )
+        self.router = None
+        self.pipeline = None
+        self.tracer = Tracer()
+        self.single_flight = SingleFlight() if coalesce else None
+
+    def start(self):
+        """Configures the LM, connects to Neo4j and builds the pipeline; raises if any of them fails."""
+        load_dotenv(override=True)
+        openai_api_key = os.getenv("OPENAI_API_KEY")
+        if not openai_api_key:
+            raise ValueError("OpenAI API key not found in .env file")
+        llm_model = os.environ.get("LLM_MODEL") or "gpt-3.5-turbo"
+        openai_kwargs = {"api_key": openai_api_key}
+        if os.getenv("OPENAI_API_BASE"):
+            openai_kwargs["api_base"] = os.getenv("OPENAI_API_BASE")
+        self.lm = dspy.LM("openai/" + llm_model, **openai_kwargs)
+        dspy.configure(lm=self.lm)
+        logger.info(f"DSPy configured with OpenAI model: {llm_model}")
+        if self._fast_model:
+            self.router = ModelRouter(dspy.LM("openai/" + self._fast_model, **openai_kwargs), strong_lm=self.lm,
+                                      threshold=self._route_threshold)
+            logger.info(f"Routing simple questions to {self._fast_model}")
+
+        embedder = get_embedder(self._embedder_spec) if self._embedder_spec else None
+        # One connection per concurrent request, plus headroom for version checks
+        self.driver = get_neo4j_driver(max_connection_pool_size=self._max_concurrency + 4)
+        if self._answer_cache_path:
+            self.answer_cache = SemanticAnswerCache(self._answer_cache_path, embedder or get_embedder("hashing"))
+        context_packer = ContextPacker(max_tokens=self._context_budget, model=llm_model) if self._context_budget else None
+        self.pipeline = GraphRAG(
+            self.driver, k=3, retrieval_mode=self._retrieval_mode, embedder=embedder, context_packer=context_packer,
+            answer_cache=self.answer_cache, retrieval_cache=self.retrieval_cache, tracer=self.tracer, single_flight=self.single_flight,
+            router=self.router, decomposer=get_decomposer(self._decompose) if self._decompose else None,
+        )
+        load_compiled(self.pipeline, self._compiled_path)
+        self.state = "ready"
+        logger.info("GraphRAG service ready")
+
+    def ask(self, question):
+        """
+        Answers a question.
+
+        Returns:
+            dict: The answer, reasoning and latency in milliseconds
+
+        Raises:
+            ServiceUnavailable: When the service is not ready or stays saturated
+                for longer than the queue timeout
+        """
+        if self.state != "ready":
+            raise ServiceUnavailable(f"Service is {self.state}")
+        if not self._slots.acquire(timeout=self._queue_timeout):
+            raise ServiceUnavailable("Too many questions in flight, try again later")
+        # Re-checked after the wait, under the lock drain() sets its state with: a
+        # question either counts as in flight before draining starts or is refused
+        with self._condition:
+            if self.state != "ready":
+                self._slots.release()
+                raise ServiceUnavailable(f"Service is {self.state}")
+            self._in_flight += 1
+        started = time.perf_counter()
+        failed = True
+        try:
+            prediction = self.pipeline(question)
+            failed = False
+        finally:
+            self._slots.release()
+            with self._condition:
+                self._in_flight -= 1
+                if failed:
+                    self._failed += 1
+                else:
+                    self._served += 1
+                self._condition.notify_all()
+        return {
+            "question": question,
+            "answer": prediction.answer,
+            "reasoning": prediction.get("reasoning"),
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+
+    def drain(self, timeout=30.0):
+        """Stops accepting questions and waits up to `timeout` seconds for in-flight ones to finish."""
+        with self._condition:
+            self.state = "draining"
+            logger.info(f"Draining {self._in_flight} in-flight questions")
+            drained = self._condition.wait_for(lambda: self._in_flight == 0, timeout=timeout)
+        if not drained:
+            logger.warning(f"Drain timed out with {self._in_flight} questions still in flight")
+        return drained
+
+    def close(self):
+        """Releases the driver and answer cache."""
+        self.state = "stopped"
+        if self.answer_cache:
+            self.answer_cache.close()
+        if self.driver:
+            self.driver.close()
+            logger.info("Neo4j connection closed")
+
+    def readiness(self):
+        """Returns (ready, details); ready only while accepting questions and Neo4j is reachable."""
+        details = {"state": self.state, "in_flight": self._in_flight}
+        if self.state != "ready":
+            return False, details
+        try:
+            self.driver.verify_connectivity()
+        except Exception as e:
+            details["neo4j"] = str(e)
+            return False, details
+        return True, details
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "in_flight": self._in_flight,
+            "max_concurrency": self._max_concurrency,
+            "served": self._served,
+            "failed": self._failed,
+            "retrieval_cache": self.retrieval_cache.stats() if self.retrieval_cache else None,
+            "coalescing": self.single_flight.stats() if self.single_flight else None,
+            "routing": self.router.stats() if self.router else None,
+            "latency": self.tracer.to_json(),
+        }
+
+def create_app(service):
+    """Builds the Flask app serving a GraphRAGService."""
+    app = Flask(__name__)
+    app.config['JSON_SORT_KEYS'] = False
+
+    @app.route('/ask', methods=['POST'])
+    def ask():
+        payload = request.get_json(silent=True) or {}
+        question = payload.get("question")
+        if not isinstance(question, str) or not question.strip():
+            return jsonify({'error': "Expected a JSON body with a non-empty 'question' string"}), 400
+        try:
+            return jsonify(service.ask(question))
+        except ServiceUnavailable as e:
+            return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
+        except Exception as e:
+            logger.error(f"Failed to answer {question!r}: {e}")
+            return jsonify({'error': 'Failed to answer the question'}), 500
+
+    @app.route('/healthz')
+    def health():
+        # Liveness: the process is up and serving HTTP
+        return jsonify({'status': 'ok', 'state': service.state})
+
+    @app.route('/readyz')
+    def ready():
+        is_ready, details = service.readiness()
+        return jsonify({'ready': is_ready, **details}), 200 if is_ready else 503
+
+    @app.route('/stats')
+    def stats():
+        return jsonify(service.stats())
+
+    @app.errorhandler(404)
+    def not_found_error(error):
+        return jsonify({'error': 'Not found'}), 404
+
+    return app
+
+def serve(service, host="0.0.0.0", port=5002, drain_timeout=30.0):
+    """
+    Serves the app on a threaded WSGI server until SIGTERM or SIGINT.
+
+    On a signal the service stops accepting questions (readiness turns 503
+    so a load balancer stops routing to it), in-flight questions are given
+    `drain_timeout` seconds to finish, then the server and driver shut down.
+    """
+    server = make_server(host, port, create_app(service), threaded=True)
+
+    def shutdown(signum, frame):
+        logger.info(f"Received signal {signum}, shutting down gracefully")
+
+        def drain_and_stop():
+            service.drain(drain_timeout)
+            server.shutdown()
+
+        # server.shutdown() waits for serve_forever to return, so it cannot run on the serving thread
+        threading.Thread(target=drain_and_stop, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    logger.info(f"Serving GraphRAG on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    finally:
+        service.close()
+
+def main(host, port, retrieval_mode="contains", embedder_spec=None, context_budget=None, answer_cache_path=None,
+         compiled_path=COMPILED_PROGRAM_PATH, decompose=None, max_concurrency=16, drain_timeout=30.0, coalesce=True,
+         fast_model=None, route_threshold=0.5, retrieval_cache_size=None, retrieval_cache_ttl=300.0):
+    service = GraphRAGService(retrieval_mode=retrieval_mode, embedder_spec=embedder_spec,
+                              context_budget=context_budget, answer_cache_path=answer_cache_path,
+                              compiled_path=compiled_path, decompose=decompose, max_concurrency=max_concurrency,
+                              coalesce=coalesce, fast_model=fast_model, route_threshold=route_threshold,
+                              retrieval_cache_size=retrieval_cache_size, retrieval_cache_ttl=retrieval_cache_ttl)
+    try:
+        service.start()
+    except Exception as e:
+        logger.error(f"Failed to start GraphRAG service: {e}")
+        service.close()
+        return 1
+    serve(service, host, port, drain_timeout=drain_timeout)
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the DSPy Graph RAG pipeline over HTTP.")
+    parser.add_argument("--host", type=str, default="0.0.0.0", help="Interface to listen on.")
+    parser.add_argument("--port", type=int, default=5002, help="Port to listen on.")
+    parser.add_argument(
+        "--retrieval-mode",
+        choices=RETRIEVAL_MODES,
+        default="contains",
+        help="How concepts are matched (see main.py)."
+    )
+    parser.add_argument(
+        "--embedder",
+        type=str,
+        default=None,
+        help="Embedder for vector or hybrid retrieval, e.g. 'hashing'."
+    )
+    parser.add_argument(
+        "--context-budget",
+        type=int,
+        default=None,
+        help="Deduplicate retrieved passages and trim them to this many prompt tokens before generation."
+    )
+    parser.add_argument(
+        "--answer-cache",
+        type=str,
+        nargs="?",
+        const="output/answer_cache.sqlite3",
+        default=None,
+        help="Reuse answers to similar questions over the same context from this SQLite file."
+    )
+    parser.add_argument(
+        "--retrieval-cache",
+        type=int,
+        default=None,
+        metavar="SIZE",
+        help="Cache up to SIZE retrieval results in memory; entries are dropped when the graph version changes."
+    )
+    parser.add_argument(
+        "--retrieval-cache-ttl",
+        type=float,
+        default=300.0,
+        help="Seconds a cached retrieval result stays valid."
+    )
+    parser.add_argument(
+        "--compiled",
+        type=str,
+        default=COMPILED_PROGRAM_PATH,
+        help="Compiled program saved by compile.py; loaded if the file exists."
+    )
+    parser.add_argument(
+        "--decompose",
+        choices=("rules", "lm"),
+        default=None,
+        help="Split questions into sub-queries retrieved in one batch."
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=16,
+        help="Questions answered at once; more wait for a free slot."
+    )
+    parser.add_argument(
+        "--drain-timeout",
+        type=float,
+        default=30.0,
+        help="Seconds in-flight questions get to finish on shutdown."
+    )
+    parser.add_argument(
+        "--no-coalesce",
+        action="store_true",
+        help="Answer concurrent identical questions separately instead of sharing one computation."
+    )
+    parser.add_argument(
+        "--fast-model",
+        type=str,
+        default=None,
+        help="Route simple questions to this model; LLM_MODEL answers the complex ones."
+    )
+    parser.add_argument(
+        "--route-threshold",
+        type=float,
+        default=0.5,
+        help="Complexity score (0-1) from which questions go to the strong model."
+    )
+    args = parser.parse_args()
+
+    sys.exit(main(args.host, args.port, args.retrieval_mode, args.embedder, args.context_budget, args.answer_cache,
+                  args.compiled, args.decompose, args.max_concurrency, args.drain_timeout,
+                  not args.no_coalesce, args.fast_model, args.route_threshold, args.retrieval_cache,
+                  args.retrieval_cache_ttl))
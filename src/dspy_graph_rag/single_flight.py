@@ -0,0 +1,106 @@
+import asyncio
+import copy
+import threading
+from concurrent.futures import Future
+
+from src.dspy_graph_rag.cache import normalize_query
+from src.dspy_graph_rag.logging_utils import setup_logger
+
+logger = setup_logger('single_flight')
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same normalized question.
+
+    The first caller for a key (the leader) runs the computation; callers
+    arriving while it is in flight wait for it and receive the same result
+    (or exception) instead of computing it again. Threads and asyncio tasks
+    share one table of in-flight calls, each held as a
+    concurrent.futures.Future that threads block on and tasks await through
+    asyncio.wrap_future. Once the leader finishes the key is released, so
+    later calls compute afresh; caching results is left to the caches.
+
+    Followers receive a copy of the leader's result (made with
+    `copy_result`), so a caller mutating its Prediction does not affect the
+    others. A cancelled follower stops waiting without cancelling the shared
+    call.
+    """
+
+    def __init__(self, key=normalize_query, copy_result=copy.deepcopy):
+        self._key = key
+        self._copy_result = copy_result
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._executions = 0
+        self._coalesced = 0
+        self._max_waiters = 0
+
+    def _join(self, question):
+        """Returns (key, future, is_leader) for a call about to run or already in flight."""
+        key = self._key(question)
+        with self._lock:
+            self._requests += 1
+            call = self._calls.get(key)
+            if call is not None:
+                future, waiters = call
+                self._calls[key] = (future, waiters + 1)
+                self._coalesced += 1
+                self._max_waiters = max(self._max_waiters, waiters + 1)
+                return key, future, False
+            future = Future()
+            self._calls[key] = (future, 0)
+            self._executions += 1
+            return key, future, True
+
+    def _release(self, key, future, result=None, error=None):
+        with self._lock:
+            _, waiters = self._calls.pop(key)
+        if waiters:
+            logger.info(f"Shared one computation with {waiters} concurrent identical requests")
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, question, fn, *args, **kwargs):
+        """Returns fn(*args, **kwargs), computed once for concurrent callers with the same question."""
+        key, future, is_leader = self._join(question)
+        if not is_leader:
+            return self._copy_result(future.result())
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._release(key, future, error=e)
+            raise
+        self._release(key, future, result)
+        return result
+
+    async def ado(self, question, fn, *args, **kwargs):
+        """Async version of do: awaits fn(*args, **kwargs), which must return an awaitable."""
+        key, future, is_leader = self._join(question)
+        if not is_leader:
+            # Waits without blocking the event loop, whichever thread or loop the leader runs in.
+            # Shielded: cancelling this follower must not cancel the future the others share
+            return self._copy_result(await asyncio.shield(asyncio.wrap_future(future)))
+        try:
+            result = await fn(*args, **kwargs)
+        except BaseException as e:
+            # A cancelled leader fails its followers too rather than leaving them waiting forever
+            self._release(key, future, error=e)
+            raise
+        self._release(key, future, result)
+        return result
+
+    def stats(self):
+        """Returns request counters; `coalesced` is the number of computations saved."""
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "executions": self._executions,
+                "coalesced": self._coalesced,
+                "in_flight": len(self._calls),
+                "max_waiters": self._max_waiters,
+            }
@@ -0,0 +1,280 @@
+import argparse
+import json
+import mmap
+import os
+from array import array
+from datetime import datetime
+
+import dspy
+import numpy as np
+from dotenv import load_dotenv
+
+from src.dspy_graph_rag.data_loader import get_graph_version
+from src.dspy_graph_rag.logging_utils import setup_logger
+from src.dspy_graph_rag.rag_pipeline import RELATED_TYPES, clean_query_text, get_neo4j_driver
+
+logger = setup_logger('snapshot')
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+# Files making up a snapshot directory
+META_FILE = "meta.json"
+INDPTR_FILE = "indptr.npy"          # int64[n + 1], CSR row offsets
+INDICES_FILE = "indices.npy"        # int32[2 * edges], neighbor node ids
+REL_CODES_FILE = "rel_codes.npy"    # uint8[2 * edges], index into meta["rel_types"]
+STRINGS_FILE = "strings.bin"        # UTF-8 name/text of node i are strings 2i and 2i + 1
+STRING_OFFSETS_FILE = "string_offsets.npy"
+SEARCH_FILE = "search.bin"          # lowercased copy of the string table for matching
+SEARCH_OFFSETS_FILE = "search_offsets.npy"
+
+# Separates strings in the search table so a match can never span two strings
+SEPARATOR = b"\x00"
+
+# --- Export ---
+
+def export_snapshot(driver, output_dir):
+    """
+    Dumps the Concept graph to a snapshot directory.
+
+    Nodes and relationships are streamed from Neo4j. The string tables are
+    written while reading, so only the name -> id map and the edge arrays are
+    held in memory.
+
+    Args:
+        driver: Neo4j driver
+        output_dir (str): Directory to write the snapshot to (created if missing)
+
+    Returns:
+        dict: The snapshot metadata
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    logger.info(f"Exporting Concept graph snapshot to {output_dir}")
+
+    node_ids = {}
+    string_offsets = array("q", [0])
+    search_offsets = array("q", [0])
+    sources, targets, codes = array("i"), array("i"), array("B")
+    rel_types = []
+    rel_type_codes = {}
+
+    with driver.session() as session:
+        graph_version = get_graph_version(session)
+
+        with open(os.path.join(output_dir, STRINGS_FILE), "wb") as strings_file, \
+                open(os.path.join(output_dir, SEARCH_FILE), "wb") as search_file:
+            records = session.run("MATCH (c:Concept) RETURN c.name AS name, c.text AS text")
+            for record in records:
+                name, text = record["name"], record["text"] or ""
+                node_ids[name] = len(node_ids)
+                for value in (name, text):
+                    encoded = value.encode("utf-8")
+                    strings_file.write(encoded)
+                    string_offsets.append(string_offsets[-1] + len(encoded))
+                    lowered = value.lower().encode("utf-8") + SEPARATOR
+                    search_file.write(lowered)
+                    search_offsets.append(search_offsets[-1] + len(lowered))
+        logger.info(f"Exported {len(node_ids)} concepts")
+
+        records = session.run(
+            "MATCH (a:Concept)-[r]->(b:Concept) RETURN a.name AS source, type(r) AS type, b.name AS target"
+        )
+        for record in records:
+            rel_type = record["type"]
+            if rel_type not in rel_type_codes:
+                if len(rel_types) == 256:
+                    raise ValueError("Snapshot format supports at most 256 relationship types")
+                rel_type_codes[rel_type] = len(rel_types)
+                rel_types.append(rel_type)
+            sources.append(node_ids[record["source"]])
+            targets.append(node_ids[record["target"]])
+            codes.append(rel_type_codes[rel_type])
+        logger.info(f"Exported {len(sources)} relationships")
+
+    # Retrieval treats relationships as undirected, so store both directions
+    node_count = len(node_ids)
+    src = np.concatenate([np.frombuffer(sources, dtype=np.int32), np.frombuffer(targets, dtype=np.int32)])
+    dst = np.concatenate([np.frombuffer(targets, dtype=np.int32), np.frombuffer(sources, dtype=np.int32)])
+    rel_codes = np.concatenate([np.frombuffer(codes, dtype=np.uint8)] * 2)
+    order = np.argsort(src, kind="stable")
+    indptr = np.zeros(node_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=node_count), out=indptr[1:])
+
+    np.save(os.path.join(output_dir, INDPTR_FILE), indptr)
+    np.save(os.path.join(output_dir, INDICES_FILE), dst[order].astype(np.int32))
+    np.save(os.path.join(output_dir, REL_CODES_FILE), rel_codes[order])
+    np.save(os.path.join(output_dir, STRING_OFFSETS_FILE), np.frombuffer(string_offsets, dtype=np.int64))
+    np.save(os.path.join(output_dir, SEARCH_OFFSETS_FILE), np.frombuffer(search_offsets, dtype=np.int64))
+
+    meta = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "graph_version": graph_version,
+        "node_count": node_count,
+        "relationship_count": len(sources),
+        "rel_types": rel_types,
+        "created_at": datetime.now().isoformat(),
+    }
+    # Written last: a snapshot without meta.json is incomplete
+    with open(os.path.join(output_dir, META_FILE), "w") as f:
+        json.dump(meta, f, indent=2)
+    logger.info(f"Snapshot written: {meta}")
+    return meta
+
+# --- Snapshot Retriever ---
+
+class SnapshotRetriever(dspy.Retrieve):
+    """
+    Answers Neo4jRetriever's CONTAINS queries from a memory-mapped snapshot.
+
+    Opening a snapshot only reads meta.json and maps the other files, so
+    startup cost does not depend on graph size. Processes that map the same
+    snapshot share its pages through the OS page cache.
+    """
+
+    def __init__(self, snapshot_dir, k=3):
+        logger.info(f"Initializing SnapshotRetriever from {snapshot_dir} with k={k}")
+        with open(os.path.join(snapshot_dir, META_FILE)) as f:
+            self.meta = json.load(f)
+        if self.meta["format_version"] != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format version {self.meta['format_version']}")
+        self._k = k
+        self._node_count = self.meta["node_count"]
+        self._indptr = np.load(os.path.join(snapshot_dir, INDPTR_FILE), mmap_mode="r")
+        self._indices = np.load(os.path.join(snapshot_dir, INDICES_FILE), mmap_mode="r")
+        self._rel_codes = np.load(os.path.join(snapshot_dir, REL_CODES_FILE), mmap_mode="r")
+        self._string_offsets = np.load(os.path.join(snapshot_dir, STRING_OFFSETS_FILE), mmap_mode="r")
+        self._search_offsets = np.load(os.path.join(snapshot_dir, SEARCH_OFFSETS_FILE), mmap_mode="r")
+        self._strings = self._map(os.path.join(snapshot_dir, STRINGS_FILE))
+        self._search = self._map(os.path.join(snapshot_dir, SEARCH_FILE))
+        related_codes = [i for i, rel_type in enumerate(self.meta["rel_types"]) if rel_type in RELATED_TYPES]
+        self._related_codes = np.asarray(related_codes, dtype=np.uint8)
+        logger.info(f"Mapped snapshot of graph version {self.meta['graph_version']} "
+                    f"({self._node_count} concepts, {self.meta['relationship_count']} relationships)")
+        super().__init__()
+
+    @staticmethod
+    def _map(path):
+        with open(path, "rb") as f:
+            # mmap cannot map empty files
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _string(self, index):
+        start, end = self._string_offsets[index], self._string_offsets[index + 1]
+        return self._strings[start:end].decode("utf-8")
+
+    def _find(self, needle):
+        """
+        Finds the concepts whose lowercased name / text contain `needle`.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: boolean masks over nodes for name and text matches
+        """
+        name_hits = np.zeros(self._node_count, dtype=bool)
+        text_hits = np.zeros(self._node_count, dtype=bool)
+        if not needle:
+            # Like Cypher, every string contains the empty string
+            name_hits[:] = True
+            text_hits[:] = True
+            return name_hits, text_hits
+        pattern = needle.encode("utf-8")
+        positions = array("q")
+        position = self._search.find(pattern)
+        while position != -1:
+            positions.append(position)
+            position = self._search.find(pattern, position + 1)
+        if positions:
+            strings = np.searchsorted(self._search_offsets, np.frombuffer(positions, dtype=np.int64), side="right") - 1
+            name_hits[strings[strings % 2 == 0] // 2] = True
+            text_hits[strings[strings % 2 == 1] // 2] = True
+        return name_hits, text_hits
+
+    def _passage(self, node):
+        """Renders a node as "name (related: a, b): text", like the Cypher retriever."""
+        start, end = self._indptr[node], self._indptr[node + 1]
+        neighbors = self._indices[start:end][np.isin(self._rel_codes[start:end], self._related_codes)]
+        related = list(dict.fromkeys(self._string(2 * int(n)) for n in neighbors))
+        name, text = self._string(2 * node), self._string(2 * node + 1)
+        if related:
+            return f"{name} (related: {', '.join(related)}): {text}"
+        return f"{name}: {text}"
+
+    def _retrieve(self, query, k):
+        clean_query = clean_query_text(query)
+        name_query, text_query = self._find(query.lower())
+        name_clean, text_clean = self._find(clean_query)
+        matched = name_query | text_query | name_clean | text_clean
+        for keyword in ("dspy", "rag"):
+            if keyword in query.lower():
+                name_keyword, text_keyword = self._find(keyword)
+                matched |= name_keyword | text_keyword
+
+        # Same levels as the Cypher CASE: the first matching rule wins, which is the maximum
+        relevance = np.zeros(self._node_count, dtype=np.int8)
+        relevance[text_clean] = 1
+        relevance[name_clean | text_query] = 2
+        relevance[name_query] = 3
+        candidates = np.flatnonzero(matched)
+        if len(candidates):
+            top = candidates[np.argsort(-relevance[candidates], kind="stable")[:k]]
+            # Scored like the Cypher CONTAINS passages, e.g. for routing on the score spread
+            return [{"text": self._passage(int(node)), "score": int(relevance[node])} for node in top]
+
+        logger.warning(f"No results found for query: {query}")
+        logger.debug("Trying fallback matching for broader matches...")
+        matched = np.zeros(self._node_count, dtype=bool)
+        for word in clean_query.split(" "):
+            name_word, text_word = self._find(word)
+            matched |= name_word | text_word
+        return [
+            {"text": f"{self._string(2 * int(node))}: {self._string(2 * int(node) + 1)}"}
+            for node in np.flatnonzero(matched)[:k]
+        ]
+
+    def graph_version(self):
+        """Returns the graph version the snapshot was exported at."""
+        return self.meta["graph_version"]
+
+    def forward(self, query_or_queries, k=None):
+        """Search the snapshot for relevant nodes based on the query."""
+        logger.info(f"Starting snapshot retrieval for query: {query_or_queries}")
+        k = k if k is not None else self._k
+        queries = [query_or_queries] if isinstance(query_or_queries, str) else query_or_queries
+        results = []
+        for query in queries:
+            query_results = self._retrieve(query, k)
+            logger.debug(f"Found {len(query_results)} results for query: {query}")
+            for i, result in enumerate(query_results, 1):
+                logger.debug(f"  {i}. {result['text']}")
+            results.extend(query_results)
+        logger.info(f"Retrieval complete. Total results: {len(results)}")
+        return results
+
+def main(output_dir):
+    """Connects to Neo4j and exports a snapshot."""
+    load_dotenv()
+    try:
+        driver = get_neo4j_driver()
+    except Exception as e:
+        logger.error(f"Failed to connect to Neo4j: {e}")
+        return
+    try:
+        export_snapshot(driver, output_dir)
+    except Exception as e:
+        logger.error(f"Failed to export snapshot: {e}")
+    finally:
+        driver.close()
+        logger.info("Neo4j connection closed")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the Concept graph to a memory-mappable snapshot.")
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default="output/graph_snapshot",
+        help="Directory to write the snapshot to."
+    )
+    args = parser.parse_args()
+
+    main(args.output)
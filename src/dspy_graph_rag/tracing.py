@@ -0,0 +1,285 @@
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+from src.dspy_graph_rag.logging_utils import setup_logger
+
+logger = setup_logger('tracing')
+
+# Span the current code runs in; contextvars follow asyncio tasks and asyncio.to_thread
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+def _new_id(num_bytes):
+    return os.urandom(num_bytes).hex()
+
+class LatencyHistogram:
+    """
+    HDR-style latency histogram over microsecond values.
+
+    Values are bucketed log-linearly: each power of two is split into
+    2**(sub_bucket_bits - 1) equal sub-buckets, so any recorded value is
+    reported within a relative error of 2**(1 - sub_bucket_bits) (about 1.6%
+    with the default 7 bits) regardless of magnitude. Buckets are stored
+    sparsely, so memory grows with the spread of values, not their count.
+    """
+
+    def __init__(self, sub_bucket_bits=7):
+        self._sub_bucket_bits = sub_bucket_bits
+        self._buckets = Counter()
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _bucket(self, value):
+        shift = max(0, value.bit_length() - self._sub_bucket_bits)
+        return shift, value >> shift
+
+    def record(self, value_us):
+        value = max(0, int(value_us))
+        self._buckets[self._bucket(value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        self._buckets.update(other._buckets)
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, percentile):
+        """Returns the highest value equivalent to the bucket holding the percentile, in microseconds."""
+        if not self.count:
+            return 0
+        rank = max(1, math.ceil(percentile / 100 * self.count))
+        seen = 0
+        for (shift, sub_bucket), count in sorted(self._buckets.items(), key=lambda item: item[0][1] << item[0][0]):
+            seen += count
+            if seen >= rank:
+                return min(((sub_bucket + 1) << shift) - 1, self.max)
+        return self.max
+
+    def bucket_counts(self):
+        """Returns (upper bound in microseconds, count) pairs in ascending order."""
+        return [
+            (((sub_bucket + 1) << shift) - 1, count)
+            for (shift, sub_bucket), count in sorted(self._buckets.items(), key=lambda item: item[0][1] << item[0][0])
+        ]
+
+    def summary(self):
+        """Returns count, mean, min, max and percentiles in milliseconds."""
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count / 1000, 3),
+            "min_ms": round(self.min / 1000, 3),
+            "p50_ms": round(self.percentile(50) / 1000, 3),
+            "p90_ms": round(self.percentile(90) / 1000, 3),
+            "p95_ms": round(self.percentile(95) / 1000, 3),
+            "p99_ms": round(self.percentile(99) / 1000, 3),
+            "p999_ms": round(self.percentile(99.9) / 1000, 3),
+            "max_ms": round(self.max / 1000, 3),
+        }
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name, trace_id, parent_id, attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.error = None
+
+class Tracer:
+    """
+    Collects per-stage latency spans.
+
+    Every finished span is recorded in the histogram for its name; the most
+    recent `max_spans` spans are also kept for export with their trace and
+    parent ids. Spans opened inside another span (in the same thread, asyncio
+    task or asyncio.to_thread call) become its children.
+    """
+
+    def __init__(self, service_name="dspy_graph_rag", max_spans=10000, sub_bucket_bits=7):
+        self.service_name = service_name
+        self._sub_bucket_bits = sub_bucket_bits
+        self._histograms = {}
+        self._spans = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Times the enclosed block as a span named `name`."""
+        parent = _current_span.get()
+        span = Span(name, parent.trace_id if parent else _new_id(16), parent.span_id if parent else None, attributes)
+        token = _current_span.set(span)
+        started = time.perf_counter_ns()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            self._finish(span, time.perf_counter_ns() - started)
+
+    def record(self, name, seconds, **attributes):
+        """
+        Records an already measured duration as a span.
+
+        For code that cannot hold a span open, such as the body of a generator
+        that yields to its consumer in between.
+        """
+        parent = _current_span.get()
+        span = Span(name, parent.trace_id if parent else _new_id(16), parent.span_id if parent else None, attributes)
+        duration_ns = int(seconds * 1e9)
+        span.start_ns -= duration_ns
+        self._finish(span, duration_ns)
+
+    def _finish(self, span, duration_ns):
+        span.end_ns = span.start_ns + duration_ns
+        with self._lock:
+            histogram = self._histograms.get(span.name)
+            if histogram is None:
+                histogram = self._histograms[span.name] = LatencyHistogram(self._sub_bucket_bits)
+            histogram.record(duration_ns // 1000)
+            self._spans.append(span)
+
+    def histograms(self):
+        """Returns a copy of the histogram of every span name."""
+        with self._lock:
+            copies = {}
+            for name, histogram in self._histograms.items():
+                copies[name] = LatencyHistogram(self._sub_bucket_bits)
+                copies[name].merge(histogram)
+            return copies
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._spans.clear()
+
+    # --- Export ---
+
+    def to_json(self):
+        """Returns per-stage latency summaries keyed by span name."""
+        return {name: histogram.summary() for name, histogram in sorted(self.histograms().items())}
+
+    def _resource(self):
+        return {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]}
+
+    @staticmethod
+    def _attributes(attributes):
+        converted = []
+        for key, value in attributes.items():
+            if isinstance(value, bool):
+                converted.append({"key": key, "value": {"boolValue": value}})
+            elif isinstance(value, int):
+                converted.append({"key": key, "value": {"intValue": str(value)}})
+            elif isinstance(value, float):
+                converted.append({"key": key, "value": {"doubleValue": value}})
+            else:
+                converted.append({"key": key, "value": {"stringValue": str(value)}})
+        return converted
+
+    def to_otlp_spans(self):
+        """Returns the retained spans as an OTLP/JSON ExportTraceServiceRequest."""
+        with self._lock:
+            spans = list(self._spans)
+        otlp_spans = []
+        for span in spans:
+            otlp_span = {
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 1,  # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": self._attributes(span.attributes),
+                "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+            }
+            if span.parent_id:
+                otlp_span["parentSpanId"] = span.parent_id
+            otlp_spans.append(otlp_span)
+        return {"resourceSpans": [{
+            "resource": self._resource(),
+            "scopeSpans": [{"scope": {"name": "dspy_graph_rag.tracing"}, "spans": otlp_spans}],
+        }]}
+
+    def to_otlp_metrics(self):
+        """Returns the stage histograms as an OTLP/JSON ExportMetricsServiceRequest (milliseconds)."""
+        now = str(time.time_ns())
+        data_points = []
+        for name, histogram in sorted(self.histograms().items()):
+            buckets = histogram.bucket_counts()
+            data_points.append({
+                "attributes": [{"key": "stage", "value": {"stringValue": name}}],
+                "timeUnixNano": now,
+                "count": str(histogram.count),
+                "sum": histogram.total / 1000,
+                "min": (histogram.min or 0) / 1000,
+                "max": (histogram.max or 0) / 1000,
+                # The last bucket is the implicit +Inf bucket
+                "explicitBounds": [bound / 1000 for bound, _ in buckets[:-1]],
+                "bucketCounts": [str(count) for _, count in buckets],
+            })
+        return {"resourceMetrics": [{
+            "resource": self._resource(),
+            "scopeMetrics": [{
+                "scope": {"name": "dspy_graph_rag.tracing"},
+                "metrics": [{
+                    "name": "rag.stage.duration",
+                    "unit": "ms",
+                    "histogram": {"dataPoints": data_points, "aggregationTemporality": 2},  # CUMULATIVE
+                }],
+            }],
+        }]}
+
+    def export(self, path, format="json"):
+        """
+        Writes the collected latencies to a file.
+
+        Args:
+            path (str): Output file
+            format (str): "json" for per-stage summaries, "otlp" for OTLP/JSON
+                spans and metrics
+        """
+        if format == "json":
+            payload = self.to_json()
+        elif format == "otlp":
+            payload = {**self.to_otlp_spans(), **self.to_otlp_metrics()}
+        else:
+            raise ValueError(f"Unknown trace format '{format}', expected 'json' or 'otlp'")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(payload, f, indent=2)
+        logger.info(f"Wrote {format} latency trace to {path}")
+
+class _NullTracer:
+    """Tracer that records nothing; the default when tracing is off."""
+
+    @contextmanager
+    def span(self, name, **attributes):
+        yield None
+
+    def record(self, name, seconds, **attributes):
+        pass
+
+NULL_TRACER = _NullTracer()
@@ -0,0 +1,53 @@
+import asyncio
+
+import dspy
+
+from src.dspy_graph_rag.single_flight import SingleFlight
+
+def test_cancelled_follower_does_not_cancel_shared_call():
+    flight = SingleFlight()
+
+    async def compute(started, release):
+        started.set()
+        await release.wait()
+        return dspy.Prediction(answer="shared")
+
+    async def scenario():
+        started, release = asyncio.Event(), asyncio.Event()
+        leader = asyncio.create_task(flight.ado("What is DSPy?", compute, started, release))
+        await started.wait()
+        cancelled = asyncio.create_task(flight.ado("what is dspy", compute, started, release))
+        follower = asyncio.create_task(flight.ado("What is DSPy?", compute, started, release))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        return await leader, await follower, await asyncio.gather(cancelled, return_exceptions=True)
+
+    leader_result, follower_result, (cancelled_result,) = asyncio.run(scenario())
+    assert leader_result.answer == "shared"
+    assert follower_result.answer == "shared"
+    assert isinstance(cancelled_result, asyncio.CancelledError)
+    assert flight.stats()["executions"] == 1
+    assert flight.stats()["in_flight"] == 0
+
+def test_followers_get_their_own_copy():
+    flight = SingleFlight()
+
+    async def compute(release):
+        await release.wait()
+        return dspy.Prediction(answer="shared")
+
+    async def scenario():
+        release = asyncio.Event()
+        leader = asyncio.create_task(flight.ado("q", compute, release))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.ado("q", compute, release))
+        await asyncio.sleep(0)
+        release.set()
+        return await leader, await follower
+
+    leader_result, follower_result = asyncio.run(scenario())
+    follower_result.answer = "changed"
+    assert leader_result.answer == "shared"
+    assert flight.stats()["coalesced"] == 1